@@ -0,0 +1,399 @@
+# filename: activity_ingest.py
+
+"""
+Batch ingestion of exported activity files into daily training load.
+
+Walks a directory of TCX, GPX and CSV activity files, scores each one with
+the stream HRSS from hrss.py and rolls the scores up into daily TSS totals
+per athlete, which are then run through the CTL/ATL recurrence (see
+load_engine.py). Files are parsed incrementally, so memory stays bounded by
+a chunk of samples, and spread across a process pool. Results are cached by
+file content hash, so re-running over an archive only parses new or changed
+files.
+
+Athletes are taken from the first directory level below the root
+(root/<athlete>/.../file.tcx); files directly in the root belong to
+"default". Each athlete needs an HR profile in the --profiles JSON file:
+{"alice": {"max_hr": 190, "resting_hr": 50, "threshold_hr": 170, "gender": "female"}}.
+"""
+
+import argparse
+import csv
+import datetime
+import functools
+import hashlib
+import json
+import math
+import os
+import sys
+import xml.etree.ElementTree as ET
+import zoneinfo
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from hrss import DEFAULT_SAMPLE_INTERVAL_SECONDS, HRProfile, HRSSAccumulator
+from load_engine import DEFAULT_ATL_DAYS, DEFAULT_CTL_DAYS, LoadState
+
+SUPPORTED_EXTENSIONS = ('.tcx', '.gpx', '.csv')
+DEFAULT_ATHLETE = 'default'
+CACHE_FILENAME = '.ingest_cache.json'
+CACHE_VERSION = 2
+# Samples handed to the HRSS accumulator at a time
+CHUNK_SIZE = 4096
+# Numeric CSV times at or above this are Unix timestamps, below it elapsed seconds
+EPOCH_THRESHOLD_SECONDS = 1e8
+
+CSV_TIME_COLUMNS = ('timestamp', 'time', 'seconds', 'elapsed')
+CSV_HR_COLUMNS = ('heart_rate', 'heartrate', 'hr', 'bpm')
+
+ACTIVITY_FIELDS = ['athlete', 'date', 'path', 'hrss', 'activity_trimp', 'duration_minutes',
+                   'avg_hr', 'samples', 'error']
+DAILY_FIELDS = ['athlete', 'date', 'tss', 'activities', 'ctl', 'atl', 'tsb', 'shape']
+# Decimals of the scores in the CSV output; everything upstream keeps full precision
+DISPLAY_DIGITS = {'hrss': 2, 'activity_trimp': 2, 'duration_minutes': 2, 'avg_hr': 1, 'tss': 2}
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _parse_time(text):
+    """A datetime for ISO 8601 text, or float seconds for numeric text."""
+    text = text.strip()
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text.replace('Z', '+00:00'))
+
+def _parse_hr(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _iter_xml_points(path, point_tag, read_point):
+    """
+    Yields read_point(element) for every <point_tag> element of an XML file.
+
+    Points are detached from their parent once read, so only the element
+    being parsed is ever held in memory.
+    """
+    stack = []
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(element)
+            continue
+        stack.pop()
+        if _local_name(element.tag) == point_tag:
+            yield read_point(element)
+            if stack:
+                stack[-1].remove(element)
+
+def _read_tcx_trackpoint(element):
+    time = heart_rate = None
+    for child in element:
+        name = _local_name(child.tag)
+        if name == 'Time':
+            time = child.text
+        elif name == 'HeartRateBpm':
+            for value in child:
+                if _local_name(value.tag) == 'Value':
+                    heart_rate = value.text
+    return time, heart_rate
+
+def _read_gpx_trackpoint(element):
+    time = heart_rate = None
+    for child in element.iter():
+        name = _local_name(child.tag).lower()
+        if name == 'time':
+            time = child.text
+        elif name in ('hr', 'heartrate'):
+            heart_rate = child.text
+    return time, heart_rate
+
+def _iter_csv_points(path):
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        columns = {name.strip().lower(): name for name in reader.fieldnames or ()}
+        time_column = next((columns[c] for c in CSV_TIME_COLUMNS if c in columns), None)
+        hr_column = next((columns[c] for c in CSV_HR_COLUMNS if c in columns), None)
+        if hr_column is None:
+            raise ValueError(f"no heart rate column (expected one of {', '.join(CSV_HR_COLUMNS)})")
+        for row in reader:
+            yield (row[time_column] if time_column else None), row[hr_column]
+
+def iter_activity_samples(path):
+    """Yields (time text or None, HR text or None) for each sample of an activity file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.tcx':
+        return _iter_xml_points(path, 'Trackpoint', _read_tcx_trackpoint)
+    if extension == '.gpx':
+        return _iter_xml_points(path, 'trkpt', _read_gpx_trackpoint)
+    if extension == '.csv':
+        return _iter_csv_points(path)
+    raise ValueError(f"Unsupported activity file: {path}")
+
+def score_activity_file(path, profile, timezone=None):
+    """
+    Parses one activity file chunk by chunk and computes its stream HRSS.
+
+    Samples without a time are placed one nominal interval after the
+    previous one. The activity date is that of its first timestamp, or of
+    the file's modification time when the file only has elapsed seconds.
+    Timezone-aware and Unix timestamps are dated in `timezone` (a tzinfo;
+    None for the system's local time zone), so an evening session west of
+    UTC stays on its own day; naive timestamps are taken as local already.
+
+    Returns:
+        A dict with the date (ISO format), hrss, activity_trimp,
+        duration_minutes, avg_hr and samples, at full precision.
+    """
+    profile = HRProfile(*profile)
+    accumulator = HRSSAccumulator(profile.max_hr, profile.resting_hr, profile.threshold_hr, profile.gender)
+    start = None
+    previous_seconds = None
+    heart_rates, timestamps = [], []
+
+    for time_text, hr_text in iter_activity_samples(path):
+        moment = _parse_time(time_text) if time_text else None
+        if isinstance(moment, datetime.datetime):
+            if start is None:
+                start = moment
+            seconds = (moment - start).total_seconds()
+        elif moment is not None:
+            if start is None:
+                start = moment
+            seconds = moment - start
+        else:
+            seconds = 0.0 if previous_seconds is None else previous_seconds + DEFAULT_SAMPLE_INTERVAL_SECONDS
+        previous_seconds = seconds
+
+        heart_rates.append(_parse_hr(hr_text))
+        timestamps.append(seconds)
+        if len(heart_rates) >= CHUNK_SIZE:
+            accumulator.add(heart_rates, timestamps)
+            heart_rates, timestamps = [], []
+    if heart_rates:
+        accumulator.add(heart_rates, timestamps)
+
+    result = accumulator.result(round_digits=None)
+    if result["duration_minutes"] == 0:
+        raise ValueError("no heart rate data")
+
+    if isinstance(start, datetime.datetime):
+        date = (start if start.tzinfo is None else start.astimezone(timezone)).date()
+    elif start is not None and start >= EPOCH_THRESHOLD_SECONDS:
+        date = datetime.datetime.fromtimestamp(start, timezone).date()
+    else:
+        date = datetime.datetime.fromtimestamp(os.path.getmtime(path), timezone).date()
+    return {
+        "date": date.isoformat(),
+        "hrss": result["hrss"],
+        "activity_trimp": result["activity_trimp"],
+        "duration_minutes": result["duration_minutes"],
+        "avg_hr": result["avg_hr"],
+        "samples": result["samples"],
+    }
+
+def _score_task(task):
+    """
+    Process-pool entry point: (path, profile, timezone) -> result dict, errors included.
+    A TypeError (e.g. a file mixing naive and timezone-aware timestamps) is
+    reported for its file like any other bad input, not raised into the batch.
+    """
+    path, profile, timezone = task
+    try:
+        return score_activity_file(path, profile, timezone)
+    except (OSError, ValueError, TypeError, ET.ParseError) as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+def file_digest(path):
+    """SHA-256 of a file's content, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(functools.partial(f.read, 1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def find_activity_files(root):
+    """Yields (athlete, path) for every supported file under root, in a stable order."""
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        relative = os.path.relpath(directory, root)
+        athlete = DEFAULT_ATHLETE if relative == os.curdir else relative.split(os.sep)[0]
+        for filename in sorted(filenames):
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield athlete, os.path.join(directory, filename)
+
+def load_cache(path):
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache.get("results", {})
+
+def save_cache(path, results):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump({"version": CACHE_VERSION, "results": results}, f)
+    os.replace(temp_path, path)
+
+def ingest_directory(root, profiles, cache_path=None, workers=None, chunksize=4, timezone=None):
+    """
+    Scores every activity file under root.
+
+    Args:
+        profiles: Mapping of athlete -> HRProfile (or matching tuple/dict).
+        cache_path: JSON cache of results by content hash, HR profile and
+            time zone; None disables caching.
+        workers: Worker processes (None: CPU count, 1: in-process).
+        timezone: Time zone the activities are dated in (see
+            score_activity_file; None for the system's local time zone).
+
+    Returns:
+        A list of per-activity dicts (see ACTIVITY_FIELDS), in file order.
+        Files that fail to parse carry an "error" instead of a score.
+    """
+    def as_profile(value):
+        return HRProfile(**value) if isinstance(value, dict) else HRProfile(*value)
+    profiles = {athlete: as_profile(profile) for athlete, profile in profiles.items()}
+
+    zone_key = str(timezone or datetime.datetime.now().astimezone().tzinfo)
+    cache = load_cache(cache_path) if cache_path else {}
+    activities, tasks, task_slots = [], [], []
+    for athlete, path in find_activity_files(root):
+        activity = {"athlete": athlete, "path": path}
+        activities.append(activity)
+        profile = profiles.get(athlete, profiles.get(DEFAULT_ATHLETE))
+        if profile is None:
+            activity["error"] = "no HR profile for this athlete"
+            continue
+        # The score depends on the HR profile and the date on the time zone as well as the file
+        key = f"{file_digest(path)}:{','.join(str(value) for value in profile)}:{zone_key}"
+        activity["_key"] = key
+        if key in cache:
+            instrumentation.count("ingest.cache_hits")
+            activity.update(cache[key])
+        else:
+            tasks.append((path, tuple(profile), timezone))
+            task_slots.append(activity)
+
+    instrumentation.count("ingest.files_scored", len(tasks))
+    with instrumentation.timer("ingest.scoring"):
+        if workers == 1 or len(tasks) <= 1:
+            results = list(map(_score_task, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_score_task, tasks, chunksize=chunksize))
+    for activity, result in zip(task_slots, results):
+        activity.update(result)
+        if "error" in result:
+            instrumentation.count("ingest.errors")
+            instrumentation.event("ingest.file_error", path=activity["path"], error=result["error"])
+        else:
+            cache[activity["_key"]] = result
+
+    if cache_path:
+        save_cache(cache_path, cache)
+    for activity in activities:
+        activity.pop("_key", None)
+    return activities
+
+def daily_tss_totals(activities):
+    """
+    {athlete: {date: (total HRSS, number of activities)}} from scored
+    activities, summed at full precision.
+    """
+    totals = defaultdict(lambda: defaultdict(lambda: [0.0, 0]))
+    for activity in activities:
+        if "error" in activity:
+            continue
+        day = totals[activity["athlete"]][activity["date"]]
+        day[0] += activity["hrss"]
+        day[1] += 1
+    return {athlete: {date: tuple(day) for date, day in days.items()} for athlete, days in totals.items()}
+
+def daily_load_rows(daily_totals, ctl_days=DEFAULT_CTL_DAYS, atl_days=DEFAULT_ATL_DAYS,
+                    ctl_initial=0.0, atl_initial=0.0):
+    """
+    Runs each athlete's daily totals through the CTL/ATL recurrence, filling
+    days without activities with 0 TSS. Yields rows with DAILY_FIELDS.
+    """
+    for athlete in sorted(daily_totals):
+        days = daily_totals[athlete]
+        first = datetime.date.fromisoformat(min(days))
+        last = datetime.date.fromisoformat(max(days))
+        state = LoadState(ctl_initial, atl_initial, ctl_days, atl_days)
+        for offset in range((last - first).days + 1):
+            date = (first + datetime.timedelta(days=offset)).isoformat()
+            tss, count = days.get(date, (0.0, 0))
+            point = state.append_day(tss)
+            yield {"athlete": athlete, "date": date, "tss": tss, "activities": count,
+                   "ctl": point.ctl, "atl": point.atl, "tsb": point.tsb, "shape": point.shape}
+
+def _display_row(row):
+    """A copy of an output row with its scores rounded to DISPLAY_DIGITS."""
+    return {key: round(value, DISPLAY_DIGITS[key]) if key in DISPLAY_DIGITS and isinstance(value, float) else value
+            for key, value in row.items()}
+
+def _parse_timezone(name):
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (ValueError, zoneinfo.ZoneInfoNotFoundError):
+        raise argparse.ArgumentTypeError(f"Unknown time zone: {name!r}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Scores a directory of TCX/GPX/CSV activity files and builds daily training load."
+    )
+    parser.add_argument("root", help="Directory of activity files (one subdirectory per athlete).")
+    parser.add_argument("--profiles", required=True, metavar="FILE",
+                        help="JSON mapping athlete -> {max_hr, resting_hr, threshold_hr, gender}.")
+    parser.add_argument("--report", choices=["daily", "activities"], default="daily",
+                        help="Daily CTL/ATL table per athlete, or one row per activity.")
+    parser.add_argument("--output", metavar="FILE", default="-",
+                        help="Where to write the CSV (default: stdout).")
+    parser.add_argument("--cache", metavar="FILE",
+                        help=f"Result cache (default: {CACHE_FILENAME} in the root).")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every file again.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: CPU count; 1 runs in-process).")
+    parser.add_argument("--timezone", type=_parse_timezone, metavar="NAME",
+                        help="IANA time zone the activities are dated in (default: the system's).")
+    parser.add_argument("--ctl-days", type=int, default=DEFAULT_CTL_DAYS)
+    parser.add_argument("--atl-days", type=int, default=DEFAULT_ATL_DAYS)
+    parser.add_argument("--stats", metavar="FILE",
+                        help="Write instrumentation counters and timers to this JSON file.")
+    args = parser.parse_args(argv)
+
+    with open(args.profiles) as f:
+        profiles = json.load(f)
+    cache_path = None if args.no_cache else (args.cache or os.path.join(args.root, CACHE_FILENAME))
+    with instrumentation.record() as recorder:
+        activities = ingest_directory(args.root, profiles, cache_path, args.workers, timezone=args.timezone)
+    if args.stats:
+        recorder.write_json(args.stats)
+
+    for activity in activities:
+        if "error" in activity:
+            print(f"Skipping {activity['path']}: {activity['error']}", file=sys.stderr)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        if args.report == 'activities':
+            writer = csv.DictWriter(output, fieldnames=ACTIVITY_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(map(_display_row, activities))
+        else:
+            writer = csv.DictWriter(output, fieldnames=DAILY_FIELDS)
+            writer.writeheader()
+            writer.writerows(map(_display_row, daily_load_rows(daily_tss_totals(activities),
+                                                               args.ctl_days, args.atl_days)))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == "__main__":
+    main()
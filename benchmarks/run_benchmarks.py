@@ -0,0 +1,302 @@
+# filename: benchmarks/run_benchmarks.py
+
+"""
+Benchmark suite for the fitness scripts.
+
+Times the four calculators (days-to-target, the progression calibrator,
+the EWMA contribution table and HRSS) and their faster engines: single-call
+latency plus scaling with batch size, simulation horizon and grid/stream
+size. Inputs are generated from fixed seeds, so runs are reproducible.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+
+No baseline is committed, since timings only compare on the same machine:
+save one with --save-baseline (e.g. on the main branch) before comparing.
+With --baseline, every case that got slower than the baseline by more than
+--threshold is reported and the exit status is 1.
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contribution_analyzer
+import fitness
+import hrss
+import load_kernels
+import progression_calibrator
+
+try:
+    import numpy as np
+except ImportError:  # The vectorized cases are skipped without NumPy
+    np = None
+
+SEED = 20240601
+DEFAULT_REPEATS = 5
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_THRESHOLD = 1.25
+# Kernel backends to time against each other; Numba only where it is installed
+KERNEL_BACKENDS = ['python'] + (['numba'] if importlib.util.find_spec('numba') else [])
+
+class BenchmarkCase:
+    """
+    One timed callable.
+
+    `items` is how many units of work (scenarios, samples, rows...) a call
+    processes, so throughput is comparable across batch sizes.
+    """
+
+    def __init__(self, group, name, func, params=None, items=1, needs_numpy=False):
+        self.group = group
+        self.name = name
+        self.func = func
+        self.params = params or {}
+        self.items = items
+        self.needs_numpy = needs_numpy
+
+    @property
+    def key(self):
+        params = ",".join(f"{k}={v}" for k, v in self.params.items())
+        return f"{self.group}/{self.name}" + (f"[{params}]" if params else "")
+
+def _quiet(func):
+    """Wraps a function that prints (the interactive calculators) so it runs silently."""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return run
+
+def _uncached_calibrator_search(target_value, metric, ctl_days, atl_days, engine):
+    def run():
+        progression_calibrator._simulate_and_get_metrics.cache_clear()
+        return progression_calibrator._find_tsb_for_metric(target_value, metric, ctl_days, atl_days, engine=engine)
+    return _quiet(run)
+
+def build_cases(quick=False):
+    """All benchmark cases; quick=True trims the scaling sweeps."""
+    rng = random.Random(SEED)
+    cases = []
+
+    # --- Days to target CTL ---
+    horizons = [70, 90, 120] if quick else [70, 90, 120, 150, 200]
+    for ctl_final in horizons:
+        args = dict(ctl_initial=50, atl_initial=50, ctl_final=ctl_final, ctl_days=42, atl_days=7,
+                    mode='tsb', tsb_final_target=-10, alb_lower_bound=-25)
+        days = fitness.calculate_days_to_target_ctl(**args)[0]
+        params = {"ctl_final": ctl_final, "days": days}
+        cases.append(BenchmarkCase("days_to_target", "loop", _quiet(
+            lambda args=args: fitness.calculate_days_to_target_ctl(**args)), params))
+        cases.append(BenchmarkCase("days_to_target", "summary", lambda args=args:
+                                   fitness.summarize_days_to_target_ctl(**args), params))
+        cases.append(BenchmarkCase("days_to_target", "analytic", lambda args=args:
+                                   fitness.solve_days_to_target_ctl_analytic(**args), params))
+        for backend in KERNEL_BACKENDS:
+            # The first call compiles the kernel, so warm it up outside the timing
+            fitness.calculate_days_to_target_ctl(**args, kernel_backend=backend)
+            cases.append(BenchmarkCase("days_to_target", "loop_kernel", lambda args=args, backend=backend:
+                                       fitness.calculate_days_to_target_ctl(**args, kernel_backend=backend),
+                                       dict(params, backend=backend)))
+
+    batch_sizes = [1, 100, 1000] if quick else [1, 10, 100, 1000, 10000]
+    for size in batch_sizes:
+        tsb_targets = [rng.uniform(-20, 0) for _ in range(size)]
+        cases.append(BenchmarkCase("days_to_target", "batch", lambda tsb_targets=tsb_targets:
+                                   fitness.calculate_days_to_target_ctl_batch(
+                                       50, 50, 90, 42, 7, mode='tsb', tsb_final_target=np.array(tsb_targets),
+                                       alb_lower_bound=-25, record_history=False),
+                                   {"batch": size}, items=size, needs_numpy=True))
+
+    grid_sizes = [10, 50] if quick else [10, 50, 200]
+    for size in grid_sizes:
+        cases.append(BenchmarkCase("days_to_target", "sweep", lambda size=size:
+                                   fitness.sweep_days_to_target_ctl(
+                                       50, 50, 90, 42, 7, tsb_final_targets=np.linspace(-30, 0, size),
+                                       alb_lower_bounds=np.linspace(-40, -10, size)),
+                                   {"grid": f"{size}x{size}"}, items=size * size, needs_numpy=True))
+
+    # --- Progression calibrator ---
+    simulate = progression_calibrator._simulate_and_get_metrics.__wrapped__
+    cases.append(BenchmarkCase("calibrator", "simulate_metrics", lambda: simulate(-10.0, 42, 7)))
+    for backend in KERNEL_BACKENDS:
+        kernels = load_kernels.get_backend(backend)
+        kernels.simulate_constant_tsb(-10.0, 42, 7, 60.0, progression_calibrator.NUM_WEEKS_SIMULATED)
+        cases.append(BenchmarkCase("calibrator", "constant_tsb_kernel", lambda kernels=kernels:
+                                   kernels.simulate_constant_tsb(
+                                       -10.0, 42, 7, 60.0, progression_calibrator.NUM_WEEKS_SIMULATED),
+                                   {"backend": backend}))
+    cases.append(BenchmarkCase("calibrator", "analytic_metrics", lambda:
+                               progression_calibrator._analytic_metrics(-10.0, 42, 7)))
+    for engine in ("simulate", "analytic"):
+        cases.append(BenchmarkCase("calibrator", "find_tsb", _uncached_calibrator_search(
+            5.0, "CTL Ramp", 42, 7, engine), {"engine": engine}))
+    for size in ([10, 1000] if quick else [10, 100, 1000, 10000]):
+        targets = [rng.uniform(-5, 8) for _ in range(size)]
+        cases.append(BenchmarkCase("calibrator", "find_tsb_batch", lambda targets=targets:
+                                   progression_calibrator.find_tsb_for_metrics(
+                                       np.array(targets), "CTL Ramp", 42, 7),
+                                   {"batch": size}, items=size, needs_numpy=True))
+
+    # --- EWMA contributions ---
+    for cutoff_pct in ([1, 0.01] if quick else [1, 0.1, 0.01, 0.0001]):
+        rows = len(contribution_analyzer.ewma_contributions(42, cutoff_pct))
+        cases.append(BenchmarkCase("contributions", "table", lambda cutoff_pct=cutoff_pct:
+                                   contribution_analyzer.ewma_contributions(42, cutoff_pct),
+                                   {"cutoff_pct": cutoff_pct, "rows": rows}, items=max(rows, 1)))
+    cases.append(BenchmarkCase("contributions", "table_multi", lambda:
+                               contribution_analyzer.ewma_contributions((42, 28, 7), 0.1)))
+
+    # --- HRSS ---
+    cases.append(BenchmarkCase("hrss", "average_hr", lambda:
+                               hrss.calculate_hrss(190, 50, 170, 60, 150)))
+    for size in ([3600, 100000] if quick else [3600, 36000, 100000, 1000000]):
+        stream_rng = random.Random(SEED + size)
+        stream = [float(stream_rng.randint(90, 180)) for _ in range(size)]
+        if np is not None:
+            stream = np.array(stream)
+        cases.append(BenchmarkCase("hrss", "stream", lambda stream=stream:
+                                   hrss.calculate_hrss_from_stream(190, 50, 170, stream),
+                                   {"samples": size}, items=size, needs_numpy=True))
+        cases.append(BenchmarkCase("hrss", "stream_fractional", lambda stream=stream:
+                                   hrss.calculate_hrss_from_stream(190, 50, 170, stream + 0.5),
+                                   {"samples": size}, items=size, needs_numpy=True))
+    profiles = {"a": (190, 50, 170, 'male'), "b": (180, 60, 160, 'female')}
+    for size in ([100, 10000] if quick else [100, 1000, 10000, 100000]):
+        ids = [rng.choice("ab") for _ in range(size)]
+        durations = [rng.uniform(20, 240) for _ in range(size)]
+        avg_hrs = [rng.uniform(100, 175) for _ in range(size)]
+        cases.append(BenchmarkCase("hrss", "batch", lambda ids=ids, durations=durations, avg_hrs=avg_hrs:
+                                   hrss.calculate_hrss_batch(profiles, ids, durations, avg_hrs),
+                                   {"batch": size}, items=size, needs_numpy=True))
+        cases.append(BenchmarkCase("hrss", "average_hr_loop", lambda ids=ids, durations=durations, avg_hrs=avg_hrs:
+                                   [hrss.calculate_hrss(*profiles[i][:3], d, h, profiles[i][3])
+                                    for i, d, h in zip(ids, durations, avg_hrs)],
+                                   {"batch": size}, items=size))
+    return cases
+
+def time_case(case, repeats=DEFAULT_REPEATS, min_time=DEFAULT_MIN_TIME):
+    """
+    Times a case: calls per repeat are chosen so one repeat takes at least
+    min_time, and the best and median per-call times over the repeats are
+    reported (the best being the least disturbed by other load).
+    """
+    timer = timeit.Timer(case.func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    per_call = [t / number for t in timer.repeat(repeat=repeats, number=number)]
+    best = min(per_call)
+    return {
+        "key": case.key,
+        "group": case.group,
+        "name": case.name,
+        "params": case.params,
+        "items": case.items,
+        "calls": number,
+        "repeats": repeats,
+        "seconds_per_call": best,
+        "median_seconds_per_call": statistics.median(per_call),
+        "items_per_second": case.items / best if best > 0 else None,
+    }
+
+def environment():
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__ if np is not None else None,
+    }
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Ratios of current to baseline time per case present in both runs.
+
+    Returns a list of (key, baseline seconds, current seconds, ratio, regressed).
+    """
+    baseline_times = {r["key"]: r["seconds_per_call"] for r in baseline.get("results", [])}
+    comparison = []
+    for result in results:
+        before = baseline_times.get(result["key"])
+        if before:
+            ratio = result["seconds_per_call"] / before
+            comparison.append((result["key"], before, result["seconds_per_call"], ratio, ratio > threshold))
+    return comparison
+
+def _format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the fitness calculators.")
+    parser.add_argument("--output", metavar="FILE", help="Write the results as JSON ('-' for stdout).")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="Compare against a results file saved earlier with --save-baseline.")
+    parser.add_argument("--save-baseline", metavar="FILE", help="Save the results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown ratio flagged as a regression (default 1.25).")
+    parser.add_argument("--filter", metavar="TEXT", help="Only run cases whose key contains TEXT.")
+    parser.add_argument("--quick", action="store_true", help="Smaller scaling sweeps.")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME,
+                        help="Minimum seconds per repeat (default 0.2).")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except OSError as e:
+            parser.error(f"cannot read the baseline {args.baseline} ({e.strerror}); "
+                         f"create it first with --save-baseline {args.baseline}")
+
+    results = []
+    for case in build_cases(quick=args.quick):
+        if args.filter and args.filter not in case.key:
+            continue
+        if case.needs_numpy and np is None:
+            print(f"{case.key:<60} skipped (needs NumPy)", file=sys.stderr)
+            continue
+        result = time_case(case, args.repeats, args.min_time)
+        results.append(result)
+        throughput = f"  {result['items_per_second']:,.0f} items/s" if case.items > 1 else ""
+        print(f"{case.key:<60} {_format_seconds(result['seconds_per_call']):>10}{throughput}", file=sys.stderr)
+
+    report = {"environment": environment(), "results": results}
+    for path in (args.output, args.save_baseline):
+        if path == '-':
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        elif path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        comparison = compare_to_baseline(results, baseline, args.threshold)
+        print(f"\n--- Compared with {args.baseline} ---", file=sys.stderr)
+        for key, before, after, ratio, regressed in comparison:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{key:<60} {_format_seconds(before):>10} -> {_format_seconds(after):>10} "
+                  f"({ratio:.2f}x){flag}", file=sys.stderr)
+        if any(regressed for *_, regressed in comparison):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
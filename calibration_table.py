@@ -0,0 +1,206 @@
+# filename: calibration_table.py
+
+"""
+Precomputed calibration table for progression_calibrator.py.
+
+`python calibration_table.py` simulates the calibrator's three metrics
+(average weekly TSS, CTL ramp rate and weekly TSS change) over a dense TSB
+grid for every integer CTL/ATL period pair and writes them to a flat binary
+file. At runtime the file is memory-mapped rather than parsed, so opening it
+is instant and a lookup only touches the few pages it needs.
+
+The calibrator does not take its answers from the table: interpolation is
+only approximate where the TSS clamp binds, so it uses the grid segment that
+holds a target as the bracket of its live root search. A table built for a
+different starting CTL than the caller's is rejected when it is opened.
+"""
+
+import argparse
+import functools
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibration_table.bin')
+
+TABLE_MAGIC = b'FCAL'
+TABLE_VERSION = 1
+# magic, version, byte order of the data, CTL/ATL period ranges (inclusive),
+# TSB grid start/step/count and the starting CTL used for the simulations.
+HEADER_FORMAT = '<4sHc1xiiiiddId'
+HEADER_SIZE = 64
+NUM_METRICS = 3
+
+class CalibrationTable:
+    """
+    Read-only view of a calibration table file.
+
+    Values are laid out as [ctl_days][atl_days][tsb][metric], with metric
+    ordered like the _simulate_and_get_metrics tuple.
+    """
+
+    def __init__(self, path=DEFAULT_TABLE_PATH, start_ctl=None):
+        """Maps the table at `path`; with start_ctl, ValueError unless it was built for that starting CTL."""
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            header = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        except struct.error:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a calibration table")
+        (magic, version, byteorder, self.ctl_min, self.ctl_max, self.atl_min, self.atl_max,
+         self.tsb_min, self.tsb_step, self.num_tsb, self.start_ctl) = header
+        expected_size = HEADER_SIZE + self._pair_stride() * self._num_pairs() * 8
+        if (magic != TABLE_MAGIC or version != TABLE_VERSION
+                or byteorder.decode() != sys.byteorder[0] or len(self._mmap) != expected_size):
+            self._mmap.close()
+            raise ValueError(f"{path} is not a compatible calibration table; rebuild it")
+        if start_ctl is not None and self.start_ctl != start_ctl:
+            self._mmap.close()
+            raise ValueError(f"{path} was built for a starting CTL of {self.start_ctl:g}, not {start_ctl:g}; "
+                             f"rebuild it with start_ctl={start_ctl:g}")
+
+        self._values = memoryview(self._mmap)[HEADER_SIZE:].cast('d')
+
+    def _num_pairs(self):
+        return (self.ctl_max - self.ctl_min + 1) * (self.atl_max - self.atl_min + 1)
+
+    def _pair_stride(self):
+        return self.num_tsb * NUM_METRICS
+
+    @property
+    def tsb_max(self):
+        return self.tsb_min + (self.num_tsb - 1) * self.tsb_step
+
+    def covers(self, ctl_days, atl_days):
+        """True if the table holds this CTL/ATL period pair."""
+        return (ctl_days == int(ctl_days) and atl_days == int(atl_days)
+                and self.ctl_min <= ctl_days <= self.ctl_max
+                and self.atl_min <= atl_days <= self.atl_max)
+
+    def _pair_offset(self, ctl_days, atl_days):
+        pair = (int(ctl_days) - self.ctl_min) * (self.atl_max - self.atl_min + 1) + int(atl_days) - self.atl_min
+        return pair * self._pair_stride()
+
+    def tsb_for_metric(self, target_value, metric_index, ctl_days, atl_days):
+        """
+        TSB that produces `target_value` for the metric at `metric_index`.
+
+        The metrics are monotone in TSB only while the max(0, tss) clamp is
+        inactive (and rise or fall depending on which period is longer), so
+        the pair's column is scanned for the segment that straddles the
+        target. Returns None when the pair is not in the table, or when no
+        segment or more than one does (target out of range, or no unique
+        answer); callers then fall back to the live solver.
+        """
+        if not self.covers(ctl_days, atl_days):
+            return None
+        base = self._pair_offset(ctl_days, atl_days) + metric_index
+        column = self._values[base:base + self._pair_stride():NUM_METRICS].tolist()
+
+        crossing = None
+        for i in range(self.num_tsb - 1):
+            value_low, value_high = column[i], column[i + 1]
+            if value_low == value_high or not min(value_low, value_high) <= target_value <= max(value_low, value_high):
+                continue
+            if crossing is None:
+                crossing = i
+            elif not (crossing == i - 1 and value_low == target_value):
+                # A target exactly on a grid point is shared by two segments
+                return None
+
+        if crossing is None:
+            return None
+        value_low, value_high = column[crossing], column[crossing + 1]
+        fraction = (target_value - value_low) / (value_high - value_low)
+        return self.tsb_min + (crossing + fraction) * self.tsb_step
+
+    def close(self):
+        self._values.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+@functools.lru_cache(maxsize=None)
+def load_default_table(start_ctl=60.0):
+    """
+    The table at DEFAULT_TABLE_PATH, mapped once per process; None if it is
+    missing, stale or built for another starting CTL (it is then ignored).
+    """
+    try:
+        return CalibrationTable(DEFAULT_TABLE_PATH, start_ctl=start_ctl)
+    except (OSError, ValueError):
+        return None
+
+def build_table(path=DEFAULT_TABLE_PATH, ctl_range=(7, 90), atl_range=(2, 21),
+                tsb_min=-100.0, tsb_max=30.0, tsb_step=0.5, start_ctl=60.0, engine=None):
+    """
+    Computes the metrics for every (ctl_days, atl_days, tsb) in the grid and
+    writes them to `path`, one period pair at a time.
+
+    `engine` is passed to progression_calibrator._get_metrics; the default
+    analytic engine matches the simulation and makes the build take seconds.
+    """
+    from progression_calibrator import _get_metrics
+
+    num_tsb = int(round((tsb_max - tsb_min) / tsb_step)) + 1
+    if num_tsb < 2:
+        raise ValueError("The TSB grid needs at least two points")
+    tsb_grid = [tsb_min + i * tsb_step for i in range(num_tsb)]
+
+    header = struct.pack(HEADER_FORMAT, TABLE_MAGIC, TABLE_VERSION, sys.byteorder[0].encode(),
+                         ctl_range[0], ctl_range[1], atl_range[0], atl_range[1],
+                         tsb_min, tsb_step, num_tsb, start_ctl)
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        for ctl_days in range(ctl_range[0], ctl_range[1] + 1):
+            for atl_days in range(atl_range[0], atl_range[1] + 1):
+                pair_values = array('d')
+                for tsb in tsb_grid:
+                    pair_values.extend(_get_metrics(tsb, ctl_days, atl_days, start_ctl, engine=engine))
+                pair_values.tofile(f)
+    # Replace atomically so a running calibrator never maps a half-written file
+    os.replace(temp_path, path)
+    load_default_table.cache_clear()
+    return path
+
+def _parse_int_range(text):
+    start, _, stop = text.partition(':')
+    try:
+        return int(start), int(stop or start)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected START:STOP, got {text!r}")
+
+def main(argv=None):
+    """Command-line entry point: builds the calibration table."""
+    parser = argparse.ArgumentParser(description="Precompute the progression calibrator's bracketing table.")
+    parser.add_argument('--output', default=DEFAULT_TABLE_PATH, help="Table file to write.")
+    parser.add_argument('--ctl-days', type=_parse_int_range, default=(7, 90), metavar='START:STOP',
+                        help="Inclusive range of CTL periods (default 7:90).")
+    parser.add_argument('--atl-days', type=_parse_int_range, default=(2, 21), metavar='START:STOP',
+                        help="Inclusive range of ATL periods (default 2:21).")
+    parser.add_argument('--tsb-min', type=float, default=-100.0)
+    parser.add_argument('--tsb-max', type=float, default=30.0)
+    parser.add_argument('--tsb-step', type=float, default=0.5)
+    parser.add_argument('--engine', choices=('analytic', 'simulate'), default=None,
+                        help="Metrics engine used for the build (default: the calibrator's).")
+    args = parser.parse_args(argv)
+
+    path = build_table(args.output, args.ctl_days, args.atl_days,
+                       args.tsb_min, args.tsb_max, args.tsb_step, engine=args.engine)
+    with CalibrationTable(path) as table:
+        size_mb = (HEADER_SIZE + table._pair_stride() * table._num_pairs() * 8) / 1e6
+        print(f"Wrote {path}: CTL {table.ctl_min}-{table.ctl_max}, ATL {table.atl_min}-{table.atl_max}, "
+              f"TSB {table.tsb_min:g} to {table.tsb_max:g} ({table.num_tsb} points), {size_mb:.1f} MB")
+
+if __name__ == "__main__":
+    main()
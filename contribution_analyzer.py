@@ -1,6 +1,111 @@
 # filename: contribution_analyzer.py
 
 import math
+import numbers
+
+try:
+    import numpy as np
+except ImportError:  # the tables fall back to plain lists
+    np = None
+
+def contribution_pct(n_days, day_ago):
+    """Percentage of an n_days EWMA contributed by the TSS from `day_ago` days ago."""
+    return (100.0 / n_days) * (((n_days - 1.0) / n_days) ** day_ago)
+
+def contribution_cutoff_day(n_days, cutoff_pct):
+    """
+    Number of days (today included) whose contribution is at least cutoff_pct.
+
+    The contribution falls geometrically, so the count comes straight from a
+    logarithm; the boundary day is then checked directly so rounding in the
+    logarithm cannot shift it.
+    """
+    if n_days < 2:
+        raise ValueError("Period must be at least 2 days.")
+    if cutoff_pct <= 0:
+        raise ValueError("Cutoff must be a positive number.")
+    if contribution_pct(n_days, 0) < cutoff_pct:
+        return 0
+
+    decay_multiplier = (n_days - 1.0) / n_days
+    count = int(math.log(cutoff_pct * n_days / 100.0) / math.log(decay_multiplier)) + 1
+    while contribution_pct(n_days, count) >= cutoff_pct:
+        count += 1
+    while count > 0 and contribution_pct(n_days, count - 1) < cutoff_pct:
+        count -= 1
+    return count
+
+def ewma_weights(n_days, cutoff_pct):
+    """
+    Weights (fractions, today first) of every day contributing at least
+    cutoff_pct to an n_days EWMA: the truncated kernel of the CTL/ATL model.
+    """
+    decay_multiplier = (n_days - 1.0) / n_days
+    count = contribution_cutoff_day(n_days, cutoff_pct)
+    if np is not None:
+        return (1.0 / n_days) * (decay_multiplier ** np.arange(count))
+    return [(1.0 / n_days) * (decay_multiplier ** day_ago) for day_ago in range(count)]
+
+def _contribution_columns(n_days, cutoff_pct):
+    """
+    (day, pct, cum_pct) columns of the days contributing at least cutoff_pct
+    to an n_days EWMA, computed in one step with NumPy (lists without it).
+    """
+    decay_multiplier = (n_days - 1.0) / n_days
+    count = contribution_cutoff_day(n_days, cutoff_pct)
+    if np is None:
+        days = list(range(count))
+        return (days, [contribution_pct(n_days, day_ago) for day_ago in days],
+                [100.0 * (1.0 - decay_multiplier ** (day_ago + 1)) for day_ago in days])
+
+    days = np.arange(count)
+    decay = decay_multiplier ** days
+    return days.tolist(), ((100.0 / n_days) * decay).tolist(), (100.0 * (1.0 - decay_multiplier * decay)).tolist()
+
+def ewma_contributions(n_days, cutoff_pct):
+    """
+    Table of the days contributing at least cutoff_pct to an EWMA.
+
+    Each row is computed independently from the closed forms (the cumulative
+    percentage is a geometric series, 100 * (1 - ((N-1)/N)**(day+1))), so
+    there is no running sum to carry and no day limit.
+
+    Args:
+        n_days: The EWMA period, or several periods (e.g. (42, 7)).
+        cutoff_pct: Smallest contribution, in percent, to include.
+
+    Returns:
+        A list of {"period", "day", "pct", "cum_pct"} dicts, the rows of
+        each period in turn and in the order given.
+    """
+    periods = [n_days] if isinstance(n_days, numbers.Real) else list(n_days)
+    rows = []
+    for period in periods:
+        period = int(period) if isinstance(period, numbers.Integral) else float(period)
+        days, pct, cum_pct = _contribution_columns(period, cutoff_pct)
+        rows.extend({"period": period, "day": day_ago, "pct": day_pct, "cum_pct": day_cum_pct}
+                    for day_ago, day_pct, day_cum_pct in zip(days, pct, cum_pct))
+    return rows
+
+def _print_side_by_side(periods, rows, cutoff_pct):
+    """Prints the ewma_contributions rows of several periods next to each other."""
+    tables = {period: [row for row in rows if row["period"] == period] for period in periods}
+    print(f"\n--- Contribution Analysis for {', '.join(str(p) for p in periods)}-day Periods (Cutoff: {cutoff_pct}%) ---")
+    header = f"{'Day(s) Ago':<15}" + "".join(f" | {f'{p}d %':>10} {f'{p}d cum %':>12}" for p in periods)
+    print("-" * len(header))
+    print(header)
+    print("-" * len(header))
+    for day_ago in range(max(len(rows) for rows in tables.values())):
+        day_label = "0 (Today)" if day_ago == 0 else str(day_ago)
+        cells = []
+        for period in periods:
+            rows = tables[period]
+            if day_ago < len(rows):
+                cells.append(f" | {rows[day_ago]['pct']:>8.2f} % {rows[day_ago]['cum_pct']:>10.2f} %")
+            else:
+                cells.append(f" | {'':>10} {'':>12}")
+        print(f"{day_label:<15}" + "".join(cells))
+    print("-" * len(header))
 
 def analyze_ewma_contributions():
     """
@@ -12,9 +117,9 @@ def analyze_ewma_contributions():
     print("This script shows the % contribution of each day's TSS to a CTL or ATL value.")
 
     try:
-        n_days_str = input("Enter the time period in days for the average (e.g., 42 for CTL, 7 for ATL): ")
-        n_days = int(n_days_str)
-        if n_days < 2:
+        n_days_str = input("Enter the time period in days for the average (e.g., 42 for CTL, 7 for ATL, or 42,7 for both): ")
+        periods = [int(part) for part in n_days_str.split(",") if part.strip()]
+        if not periods or min(periods) < 2:
             print("Error: Period must be at least 2 days.")
             return
 
@@ -33,34 +138,13 @@ def analyze_ewma_contributions():
     # The contribution of Yesterday's TSS is (1/N) * ((N-1)/N)^1
     # The contribution of Day X ago is (1/N) * ((N-1)/N)^X
 
-    today_multiplier = 1.0 / n_days
-    decay_multiplier = (n_days - 1.0) / n_days
+    if len(periods) > 1:
+        _print_side_by_side(periods, ewma_contributions(periods, cutoff_pct), cutoff_pct)
+        return
 
-    day_ago = 0
-    cumulative_percentage = 0.0
-    contributions = []
-
-    while True:
-        # The weight of a given day's TSS contribution
-        contribution = today_multiplier * (decay_multiplier ** day_ago)
-        contribution_pct = contribution * 100.0
-        
-        # Stop if the contribution is too small
-        if contribution_pct < cutoff_pct:
-            break
-            
-        cumulative_percentage += contribution_pct
-        contributions.append({
-            "day": day_ago,
-            "pct": contribution_pct,
-            "cum_pct": cumulative_percentage
-        })
-        
-        day_ago += 1
-        # Safety break to prevent infinite loops with unusual inputs
-        if day_ago > 365: 
-            print("Stopping after 365 days to prevent an infinite loop.")
-            break
+    n_days = periods[0]
+    contributions = ewma_contributions(n_days, cutoff_pct)
+    cumulative_percentage = contributions[-1]["cum_pct"] if contributions else 0.0
 
     # --- Display Results ---
     print(f"\n--- Contribution Analysis for a {n_days}-day Period (Cutoff: {cutoff_pct}%) ---")
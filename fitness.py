@@ -1,5 +1,42 @@
+import argparse
+import csv
+import itertools
+import json
 import math
+import os
+import sys
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
+import instrumentation
+import load_kernels
+from load_model import LoadAggregator, brentq, expand_bracket
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by the batched/vectorized helpers
+    np = None
+
+MAX_SIMULATION_DAYS = 365 * 10
+# Days iter_days_to_target_ctl hands to the kernel per call
+ITER_CHUNK_DAYS = 256
+
+# One simulated day: TSS and ALB of the day, CTL/ATL at the end of it
+DayState = namedtuple('DayState', ['day', 'tss', 'ctl', 'atl', 'alb'])
+
+def _check_mode_settings(mode, tsb_final_target, alb_lower_bound, ramp_rate_per_week):
+    """Raises ValueError for an unknown mode or a missing (None) setting the mode needs."""
+    if mode == 'tsb':
+        if tsb_final_target is None or alb_lower_bound is None:
+            raise ValueError("TSB mode needs tsb_final_target and alb_lower_bound.")
+    elif mode == 'ramp_rate':
+        if ramp_rate_per_week is None:
+            raise ValueError("Ramp rate mode needs ramp_rate_per_week.")
+    else:
+        raise ValueError(f"Unknown mode: {mode!r}")
+
+@instrumentation.timed("fitness.calculate_days_to_target_ctl")
 def calculate_days_to_target_ctl(
     ctl_initial, atl_initial, ctl_final,
     ctl_days,
@@ -7,76 +44,1006 @@ def calculate_days_to_target_ctl(
     mode='tsb',
     tsb_final_target=None,
     alb_lower_bound=None,
-    ramp_rate_per_week=None
+    ramp_rate_per_week=None,
+    max_days=MAX_SIMULATION_DAYS,
+    kernel_backend=None
 ):
     """
     Calculates the daily training progression based on provided goals and constraints.
     Supports either TSB/ALB mode or TSS Ramp Rate mode.
+
+    The day loop runs in the shared load_kernels kernel; kernel_backend
+    ('python', 'numba' or 'auto') overrides load_kernels.KERNEL_BACKEND.
+    The histories are always lists. Simulations that need more than
+    max_days days report -1.
     """
     ctl_current = float(ctl_initial)
     atl_current = float(atl_initial)
 
-    # --- Calculate constants from the user-defined time periods ---
-    c = ctl_days
-    a = atl_days
-    kc = (c - 1) / c
-    ka = (a - 1) / a
-    tsb_tss_multiplier = (1/c) - (1/a)
+    _check_mode_settings(mode, tsb_final_target, alb_lower_bound, ramp_rate_per_week)
+    if ctl_final <= ctl_current and not (ctl_final < ctl_current):
+         return 0, [ctl_current], [atl_current], [], []
+
+    kernel_mode = load_kernels.MODE_TSB if mode == 'tsb' else load_kernels.MODE_RAMP_RATE
+
+    # The settings the mode does not use are passed to the kernel as 0
+    if mode == 'tsb':
+        ramp_rate_per_week = 0.0
+    else:
+        tsb_final_target = alb_lower_bound = 0.0
+
+    max_simulation_days = max_days
+    days_needed, ctl_history, atl_history, tss_history, daily_alb_actual_history = \
+        load_kernels.get_backend(kernel_backend).simulate_to_target(
+            ctl_current, atl_current, ctl_final, ctl_days, atl_days, kernel_mode,
+            tsb_final_target, alb_lower_bound, ramp_rate_per_week, max_simulation_days
+        )
 
-    # Initialize data loggers
+    ctl_history, atl_history, tss_history, daily_alb_actual_history = (
+        _as_list(values) for values in (ctl_history, atl_history, tss_history, daily_alb_actual_history))
+
+    if days_needed != -1:
+        instrumentation.count("fitness.days_simulated", days_needed)
+        return days_needed, ctl_history, atl_history, tss_history, daily_alb_actual_history
+
+    instrumentation.count("fitness.days_simulated", max_simulation_days)
+    _report_max_days_reached("calculate_days_to_target_ctl", max_simulation_days, ctl_history[-1], ctl_final, mode)
+    return -1, ctl_history, atl_history, tss_history, daily_alb_actual_history
+
+def _report_max_days_reached(function, max_days, ctl_reached, ctl_final, mode, scenarios=1):
+    """Reports a simulation that gave up before reaching its target as an instrumentation event."""
+    instrumentation.count("fitness.max_days_reached", scenarios)
+    instrumentation.event("fitness.max_days_reached", function=function, max_days=max_days,
+                          ctl_reached=ctl_reached, ctl_final=ctl_final, mode=mode, scenarios=scenarios)
+
+def iter_days_to_target_ctl(
+    ctl_initial, atl_initial, ctl_final,
+    ctl_days,
+    atl_days,
+    mode='tsb',
+    tsb_final_target=None,
+    alb_lower_bound=None,
+    ramp_rate_per_week=None,
+    kernel_backend=None
+):
+    """
+    Lazily yields a DayState for every simulated day of calculate_days_to_target_ctl.
+
+    Stops after the day the target is reached, or after MAX_SIMULATION_DAYS.
+    Nothing is yielded when the initial CTL already equals the target. The
+    days are simulated ITER_CHUNK_DAYS at a time by the shared load_kernels
+    kernel (kernel_backend as for calculate_days_to_target_ctl), so memory
+    stays bounded by the chunk.
+    """
+    _check_mode_settings(mode, tsb_final_target, alb_lower_bound, ramp_rate_per_week)
+    ctl_current = float(ctl_initial)
+    atl_current = float(atl_initial)
+
+    if ctl_final == ctl_current:
+        return
+
+    kernel_mode = load_kernels.MODE_TSB if mode == 'tsb' else load_kernels.MODE_RAMP_RATE
+    if mode == 'tsb':
+        ramp_rate_per_week = 0.0
+    else:
+        tsb_final_target = alb_lower_bound = 0.0
+    simulate_to_target = load_kernels.get_backend(kernel_backend).simulate_to_target
+
+    days_done = 0
+    while days_done < MAX_SIMULATION_DAYS:
+        chunk_days = min(ITER_CHUNK_DAYS, MAX_SIMULATION_DAYS - days_done)
+        days_needed, ctl_history, atl_history, tss_history, alb_history = simulate_to_target(
+            ctl_current, atl_current, ctl_final, ctl_days, atl_days, kernel_mode,
+            tsb_final_target, alb_lower_bound, ramp_rate_per_week, chunk_days
+        )
+        # One conversion per chunk (a no-op for the Python backend's lists)
+        ctl_history, atl_history, tss_history, alb_history = (
+            _as_list(values) for values in (ctl_history, atl_history, tss_history, alb_history))
+        for i in range(len(tss_history)):
+            yield DayState(days_done + i + 1, tss_history[i], ctl_history[i + 1], atl_history[i + 1], alb_history[i])
+        days_done += len(tss_history)
+
+        if days_needed != -1:
+            instrumentation.count("fitness.days_simulated", days_done)
+            return
+        # Not reached yet, so CTL is still on the same side of the target
+        ctl_current, atl_current = ctl_history[-1], atl_history[-1]
+
+    instrumentation.count("fitness.days_simulated", MAX_SIMULATION_DAYS)
+    _report_max_days_reached("iter_days_to_target_ctl", MAX_SIMULATION_DAYS, ctl_current, ctl_final, mode)
+
+def _as_list(values):
+    """A kernel output buffer as a list (NumPy arrays are converted)."""
+    return values.tolist() if hasattr(values, 'tolist') else values
+
+def summarize_days_to_target_ctl(
+    ctl_initial, atl_initial, ctl_final,
+    ctl_days,
+    atl_days,
+    mode='tsb',
+    tsb_final_target=None,
+    alb_lower_bound=None,
+    ramp_rate_per_week=None,
+    aggregator=None
+):
+    """
+    Runs the simulation keeping only O(1) state instead of full histories.
+
+    If a LoadAggregator is passed, every simulated day is fed into it (and
+    it is finished at the end), so weekly and rolling summaries come out of
+    the same pass.
+
+    Returns:
+        A dictionary with days_needed (-1 if the target was not reached),
+        the final CTL/ATL/TSB/ALB/Shape and the total and peak daily TSS.
+    """
+    ctl_current = float(ctl_initial)
+    atl_current = float(atl_initial)
+    last_alb = None
+    tss_total = 0.0
+    tss_peak = 0.0
     days = 0
-    ctl_history = [ctl_current]
-    atl_history = [atl_current]
-    tss_history = []
-    daily_alb_actual_history = []
 
-    max_simulation_days = 365 * 10
+    for state in iter_days_to_target_ctl(
+        ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode=mode,
+        tsb_final_target=tsb_final_target, alb_lower_bound=alb_lower_bound,
+        ramp_rate_per_week=ramp_rate_per_week
+    ):
+        days, ctl_current, atl_current, last_alb = state.day, state.ctl, state.atl, state.alb
+        tss_total += state.tss
+        if state.tss > tss_peak:
+            tss_peak = state.tss
+        if aggregator is not None:
+            aggregator.add_day(state.tss, ctl_current, atl_current)
 
-    if ctl_final <= ctl_current and not (ctl_final < ctl_current):
-         return 0, [ctl_current], [atl_current], [], []
+    if aggregator is not None:
+        aggregator.finish()
 
-    building_ctl = ctl_final > ctl_current
+    reached = _target_reached(ctl_initial, ctl_final, ctl_current)
+    return {
+        "days_needed": days if reached else -1,
+        "ctl_final": ctl_current,
+        "atl_final": atl_current,
+        "tsb_final": ctl_current - atl_current,
+        "alb_final": last_alb,
+        "shape_final": (2 * ctl_current) - atl_current,
+        "tss_total": tss_total,
+        "tss_peak": tss_peak,
+    }
+
+def calculate_days_to_target_ctl_compact(
+    ctl_initial, atl_initial, ctl_final,
+    ctl_days,
+    atl_days,
+    mode='tsb',
+    tsb_final_target=None,
+    alb_lower_bound=None,
+    ramp_rate_per_week=None
+):
+    """
+    Same simulation as calculate_days_to_target_ctl, with array-backed histories.
+
+    Returns:
+        (days_needed, history) where history is a DailyHistory holding every
+        day's CTL/ATL/TSS/ALB in one preallocated array('d').
+    """
+    history = DailyHistory(MAX_SIMULATION_DAYS)
+    history.append(float(ctl_initial), float(atl_initial), math.nan, math.nan)
+    for state in iter_days_to_target_ctl(
+        ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode=mode,
+        tsb_final_target=tsb_final_target, alb_lower_bound=alb_lower_bound,
+        ramp_rate_per_week=ramp_rate_per_week
+    ):
+        history.append(state.ctl, state.atl, state.tss, state.alb)
+    history.trim()
+
+    days = len(history) - 1
+    reached = days == 0 or _target_reached(ctl_initial, ctl_final, history.ctl[-1])
+    return (days if reached else -1), history
+
+def _target_reached(ctl_initial, ctl_final, ctl_current):
+    """Whether a simulation that started at ctl_initial has reached ctl_final."""
+    if ctl_final > ctl_initial:
+        return ctl_current >= ctl_final
+    return ctl_current <= ctl_final
+
+class DailyHistory:
+    """
+    Per-day CTL/ATL/TSS/ALB values stored row by row in a single array('d').
+
+    Row 0 is the starting state (its TSS and ALB are NaN); row N is the end
+    of day N. Columns are exposed as strided memoryviews, so reading them
+    does not copy the data.
+    """
+
+    FIELDS = ('ctl', 'atl', 'tss', 'alb')
+
+    def __init__(self, max_days):
+        width = len(self.FIELDS)
+        self._values = array('d', bytes(8 * width * (max_days + 1)))
+        self._rows = 0
+
+    def append(self, ctl, atl, tss, alb):
+        offset = self._rows * len(self.FIELDS)
+        values = self._values
+        values[offset] = ctl
+        values[offset + 1] = atl
+        values[offset + 2] = tss
+        values[offset + 3] = alb
+        self._rows += 1
+
+    def trim(self):
+        """Releases the unused part of the preallocated buffer."""
+        del self._values[self._rows * len(self.FIELDS):]
+
+    def __len__(self):
+        return self._rows
+
+    def row(self, day):
+        offset = day * len(self.FIELDS)
+        return tuple(self._values[offset:offset + len(self.FIELDS)])
+
+    def column(self, name):
+        index = self.FIELDS.index(name)
+        view = memoryview(self._values)[:self._rows * len(self.FIELDS)]
+        return view[index::len(self.FIELDS)]
+
+    @property
+    def ctl(self):
+        return self.column('ctl')
+
+    @property
+    def atl(self):
+        return self.column('atl')
+
+    @property
+    def tss(self):
+        """Daily TSS for days 1..N (row 0 has none)."""
+        return self.column('tss')[1:]
+
+    @property
+    def alb(self):
+        """Daily ALB for days 1..N (row 0 has none)."""
+        return self.column('alb')[1:]
+
+    def as_numpy(self):
+        """Zero-copy (rows, 4) NumPy view of the history."""
+        if np is None:
+            raise ImportError("DailyHistory.as_numpy requires NumPy.")
+        return np.frombuffer(self._values, dtype=float).reshape(self._rows, len(self.FIELDS))
+
+def calculate_days_to_target_ctl_batch(
+    ctl_initial, atl_initial, ctl_final,
+    ctl_days,
+    atl_days,
+    mode='tsb',
+    tsb_final_target=None,
+    alb_lower_bound=None,
+    ramp_rate_per_week=None,
+    record_history=True,
+    max_days=MAX_SIMULATION_DAYS
+):
+    """
+    Vectorized version of calculate_days_to_target_ctl for many scenarios.
+
+    Every numeric argument may be a scalar or an array; they are broadcast
+    against each other and each resulting element is one scenario (all
+    scenarios share the same mode). Scenarios are advanced together one day
+    at a time with NumPy and dropped from the working set as soon as they
+    reach their target, using the same arithmetic as the scalar loop so the
+    results match it exactly. A smaller max_days gives up earlier on
+    scenarios that take too long (they report -1).
+
+    Returns:
+        days_needed: int array (-1 where the target was not reached).
+        ctl_history, atl_history, tss_history, alb_history: lists with one
+        NumPy array per scenario, laid out like the scalar histories. They
+        are None when record_history is False.
+    """
+    if np is None:
+        raise ImportError("calculate_days_to_target_ctl_batch requires NumPy.")
+    _check_mode_settings(mode, tsb_final_target, alb_lower_bound, ramp_rate_per_week)
+
+    def as_param(value):
+        # Only the settings the mode does not use can be None here
+        return np.asarray(0.0 if value is None else value, dtype=float)
+
+    raw_params = [as_param(value) for value in (
+        ctl_initial, atl_initial, ctl_final, ctl_days, atl_days,
+        tsb_final_target, alb_lower_bound, ramp_rate_per_week
+    )]
+    shape = np.broadcast_shapes(*(p.shape for p in raw_params))
+    n_scenarios = math.prod(shape)
+
+    def per_scenario(values):
+        return np.broadcast_to(values, shape).ravel()
+
+    def shared_or_per_scenario(values):
+        # Values shared by every scenario (typically the model constants in a
+        # parameter sweep) stay scalars, so the day loop never compacts them.
+        return values.reshape(()) if values.size == 1 else per_scenario(values)
+
+    ctl_0, atl_0, target = [per_scenario(p) for p in raw_params[:3]]
+    c, a, tsb_goal, alb_bound, ramp = [shared_or_per_scenario(p) for p in raw_params[3:]]
+
+    kc = (c - 1) / c
+    ka = (a - 1) / a
+    inv_c = 1 / c
+    inv_a = 1 / a
+    tsb_tss_multiplier = inv_c - inv_a
+    use_multiplier = np.abs(tsb_tss_multiplier) > 1e-9
+    safe_multiplier = np.where(use_multiplier, tsb_tss_multiplier, 1.0)
+    ramp_tss_offset = (ramp / 7) * c
+
+    max_simulation_days = max_days
+    days_needed = np.full(n_scenarios, -1, dtype=int)
+    days_needed[target == ctl_0] = 0
+
+    # Working set: compacted copies of the per-scenario values the day step needs
+    active = np.flatnonzero(target != ctl_0)
+    ctl_current = ctl_0[active]
+    atl_current = atl_0[active]
+    working = {
+        'target': target,
+        # +1 when building CTL, -1 when reducing it: reached <=> (ctl - target) * direction >= 0
+        'direction': np.where(target > ctl_0, 1.0, -1.0),
+        'kc': kc, 'ka': ka, 'inv_c': inv_c, 'inv_a': inv_a,
+        'use_multiplier': use_multiplier, 'multiplier': safe_multiplier,
+        'tsb_goal': tsb_goal, 'alb_bound': alb_bound, 'ramp_offset': ramp_tss_offset,
+    }
+    for name, values in working.items():
+        if values.ndim:
+            working[name] = values[active]
+
+    day_records = []
+    days_stepped = 0
 
     for day_iter in range(max_simulation_days):
-        days = day_iter
+        if active.size == 0:
+            break
+        days_stepped += 1
+        w = working
 
         if mode == 'tsb':
-            # 1. Calculate TSS needed to aim for tsb_final_target
-            if abs(tsb_tss_multiplier) > 1e-9:
-                numerator = tsb_final_target - (ctl_current * kc) + (atl_current * ka)
-                tss_for_tsb_goal = numerator / tsb_tss_multiplier
+            numerator = w['tsb_goal'] - (ctl_current * w['kc']) + (atl_current * w['ka'])
+            if w['use_multiplier'].ndim:
+                tss_for_tsb_goal = np.where(w['use_multiplier'], numerator / w['multiplier'], atl_current)
+            elif w['use_multiplier']:
+                tss_for_tsb_goal = numerator / w['multiplier']
             else:
                 tss_for_tsb_goal = atl_current
+            tss_cap_from_alb = atl_current - w['alb_bound']
+            tss_needed = np.minimum(tss_for_tsb_goal, tss_cap_from_alb)
+        elif mode == 'ramp_rate':
+            tss_needed = ctl_current + w['ramp_offset']
+        else:
+            raise ValueError(f"Unknown mode: {mode!r}")
 
-            # 2. Calculate TSS cap based on the improved ALB definition
-            tss_cap_from_alb = atl_current - alb_lower_bound
+        tss_needed = np.maximum(0, tss_needed)
+        actual_alb = atl_current - tss_needed
 
-            # 3. Determine final TSS for the day
-            tss_needed = min(tss_for_tsb_goal, tss_cap_from_alb)
-        elif mode == 'ramp_rate':
-            tss_needed = ctl_current + (ramp_rate_per_week / 7) * c
+        atl_current = (atl_current * w['ka']) + (tss_needed * w['inv_a'])
+        ctl_current = (ctl_current * w['kc']) + (tss_needed * w['inv_c'])
 
-        tss_needed = max(0, tss_needed)
+        if record_history:
+            day_records.append((active, ctl_current, atl_current, tss_needed, actual_alb))
 
-        actual_alb = atl_current - tss_needed
-        daily_alb_actual_history.append(actual_alb)
+        reached = (ctl_current - w['target']) * w['direction'] >= 0
+        if reached.any():
+            days_needed[active[reached]] = day_iter + 1
+            keep = ~reached
+            active = active[keep]
+            ctl_current, atl_current = ctl_current[keep], atl_current[keep]
+            for name, values in working.items():
+                if values.ndim:
+                    working[name] = values[keep]
+
+    if instrumentation.active() is not None:
+        instrumentation.count("fitness.batch.scenarios", n_scenarios)
+        instrumentation.count("fitness.batch.days_stepped", days_stepped)
+        instrumentation.count("fitness.days_simulated", int(np.where(days_needed == -1, max_days, days_needed).sum()))
+        unreached = int((days_needed == -1).sum())
+        if unreached:
+            _report_max_days_reached("calculate_days_to_target_ctl_batch", max_days, None, None, mode, unreached)
+
+    if not record_history:
+        return days_needed, None, None, None, None
+
+    histories = _split_batch_histories(n_scenarios, ctl_0, atl_0, day_records)
+    return (days_needed,) + histories
+
+def sweep_days_to_target_ctl(
+    ctl_initial, atl_initial, ctl_final,
+    ctl_days,
+    atl_days,
+    mode='tsb',
+    tsb_final_targets=None,
+    alb_lower_bounds=None,
+    ramp_rates=None,
+    max_days=MAX_SIMULATION_DAYS
+):
+    """
+    Evaluates days-to-target over a whole parameter grid in one vectorized pass.
 
-        atl_next = (atl_current * ka) + (tss_needed * (1/a))
-        ctl_next = (ctl_current * kc) + (tss_needed * (1/c))
+    In TSB mode every combination of tsb_final_targets and alb_lower_bounds
+    is simulated; in ramp rate mode every value of ramp_rates. The starting
+    point and model periods are shared by all cells, so kc, ka and the TSB
+    multiplier are computed once for the whole grid.
 
-        tss_history.append(tss_needed)
-        ctl_history.append(ctl_next)
-        atl_history.append(atl_next)
+    Returns:
+        A dense int array of days needed (-1 where the target is not reached
+        within max_days): shape (len(tsb_final_targets), len(alb_lower_bounds))
+        in TSB mode, (len(ramp_rates),) in ramp rate mode.
+    """
+    if np is None:
+        raise ImportError("sweep_days_to_target_ctl requires NumPy.")
 
-        ctl_current = ctl_next
-        atl_current = atl_next
+    if mode == 'tsb':
+        tsb_grid, alb_grid = np.meshgrid(
+            np.asarray(tsb_final_targets, dtype=float),
+            np.asarray(alb_lower_bounds, dtype=float),
+            indexing='ij'
+        )
+        grid_args = {'tsb_final_target': tsb_grid, 'alb_lower_bound': alb_grid}
+        shape = tsb_grid.shape
+    elif mode == 'ramp_rate':
+        ramp_grid = np.asarray(ramp_rates, dtype=float)
+        grid_args = {'ramp_rate_per_week': ramp_grid}
+        shape = ramp_grid.shape
+    else:
+        raise ValueError(f"Unknown mode: {mode!r}")
 
-        if (building_ctl and ctl_current >= ctl_final) or \
-           (not building_ctl and ctl_current <= ctl_final):
-            return days + 1, ctl_history, atl_history, tss_history, daily_alb_actual_history
+    days_needed = calculate_days_to_target_ctl_batch(
+        ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode=mode,
+        record_history=False, max_days=max_days, **grid_args
+    )[0]
+    return days_needed.reshape(shape)
 
-    print(f"\nReached maximum simulation days ({max_simulation_days}).")
-    return -1, ctl_history, atl_history, tss_history, daily_alb_actual_history
+@instrumentation.timed("fitness.solve_for_deadline")
+def solve_for_deadline(
+    ctl_initial, atl_initial, ctl_final,
+    days_available,
+    ctl_days,
+    atl_days,
+    mode='tsb',
+    alb_lower_bound=None,
+    tolerance=0.01
+):
+    """
+    Finds the least aggressive setting that reaches ctl_final within days_available.
+
+    In TSB mode this is the highest tsb_final_target (the lowest when reducing
+    CTL) that still meets the deadline under alb_lower_bound; in ramp rate
+    mode it is the ramp_rate_per_week closest to zero.
+
+    Candidates are scored by their closest approach to the target up to
+    the deadline (the running max/min of CTL), not by the CTL on the
+    deadline day: CTL can cross the target early and drift back before the
+    deadline. The score is continuous in the setting, so the boundary is
+    bracketed and located with Brent's method. Every candidate runs the
+    shared day kernel for at most days_available days, and results are
+    memoized so the final day-count check reuses the root finder's work.
+
+    Returns:
+        A dictionary with the setting ('tsb_final_target' or
+        'ramp_rate_per_week') and its days_needed, or None if no setting
+        within the search limits meets the deadline.
+    """
+    if days_available < 1:
+        raise ValueError("days_available must be at least 1.")
+    setting = 'tsb_final_target' if mode == 'tsb' else 'ramp_rate_per_week'
+    if ctl_final == ctl_initial:
+        return {setting: None, "days_needed": 0}
+
+    # +1 when building CTL. A more aggressive setting is a lower TSB or a
+    # higher ramp rate when building, and the opposite when reducing CTL.
+    direction = 1 if ctl_final > ctl_initial else -1
+    aggressive = -direction if mode == 'tsb' else direction
+    if mode == 'tsb' and alb_lower_bound is None:
+        raise ValueError("TSB mode needs alb_lower_bound.")
+    kernel_mode = load_kernels.MODE_TSB if mode == 'tsb' else load_kernels.MODE_RAMP_RATE
+    simulate_to_target = load_kernels.get_backend().simulate_to_target
+    solve_cache = {}
+
+    def solve(value):
+        # The whole window is simulated (the target is never "reached"), so
+        # the running max/min of CTL covers every day up to the deadline
+        if value not in solve_cache:
+            if mode == 'tsb':
+                settings = (value, alb_lower_bound, 0.0)
+            else:
+                settings = (0.0, 0.0, value)
+            ctl_history = simulate_to_target(
+                float(ctl_initial), float(atl_initial), direction * math.inf, ctl_days, atl_days,
+                kernel_mode, *settings, days_available
+            )[1]
+            progress = [direction * (ctl - ctl_final) for ctl in ctl_history[1:]]
+            days_needed = next((day for day, p in enumerate(progress, 1) if p >= 0), -1)
+            solve_cache[value] = (max(progress), days_needed)
+        return solve_cache[value]
+
+    def deadline_progress(value):
+        # Signed closest approach to the target by the deadline (>= 0: reached)
+        return solve(value)[0]
+
+    def meets_deadline(value):
+        return solve(value)[1] != -1
+
+    if mode == 'tsb':
+        bracket = expand_bracket(deadline_progress, -30.0, 0.0, limit_lower=-500.0, limit_upper=500.0)
+        if bracket is not None:
+            lower, upper, f_lower, f_upper = bracket
+            best = brentq(deadline_progress, lower, upper, xtol=tolerance, f_lower=f_lower, f_upper=f_upper)
+        else:
+            # No boundary within the limits: either nothing meets the deadline,
+            # or everything does and the least aggressive limit is the answer
+            best = -aggressive * 500.0
+            if not meets_deadline(best):
+                return None
+    elif mode == 'ramp_rate':
+        # CTL moves by ramp_rate/7 per day, so the boundary is known directly
+        best = 7 * (ctl_final - ctl_initial) / days_available
+    else:
+        raise ValueError(f"Unknown mode: {mode!r}")
+
+    # The root sits on the boundary; step towards the aggressive side until
+    # the day count (not just the CTL proxy) confirms the deadline is met.
+    step = tolerance
+    for _ in range(30):
+        if meets_deadline(best):
+            return {setting: best, "days_needed": solve(best)[1]}
+        best += aggressive * step
+        step *= 2
+    return None
+
+def _split_batch_histories(n_scenarios, ctl_0, atl_0, day_records):
+    """Regroups the per-day records of the batched engine into per-scenario arrays."""
+    if day_records:
+        scenario_ids = np.concatenate([record[0] for record in day_records])
+        columns = [np.concatenate([record[i] for record in day_records]) for i in range(1, 5)]
+    else:
+        scenario_ids = np.empty(0, dtype=int)
+        columns = [np.empty(0) for _ in range(4)]
+
+    # Records are appended day by day, so a stable sort by scenario keeps each
+    # scenario's days in chronological order.
+    order = np.argsort(scenario_ids, kind='stable')
+    counts = np.bincount(scenario_ids, minlength=n_scenarios)
+    split_points = np.cumsum(counts)[:-1]
+    ctl_days_split, atl_days_split, tss_split, alb_split = [
+        np.split(column[order], split_points) for column in columns
+    ]
+
+    ctl_history = [np.concatenate(([ctl_0[i]], ctl_days_split[i])) for i in range(n_scenarios)]
+    atl_history = [np.concatenate(([atl_0[i]], atl_days_split[i])) for i in range(n_scenarios)]
+    return ctl_history, atl_history, tss_split, alb_split
+
+@instrumentation.timed("fitness.solve_days_to_target_ctl_analytic")
+def solve_days_to_target_ctl_analytic(
+    ctl_initial, atl_initial, ctl_final,
+    ctl_days,
+    atl_days,
+    mode='tsb',
+    tsb_final_target=None,
+    alb_lower_bound=None,
+    ramp_rate_per_week=None,
+    max_days=MAX_SIMULATION_DAYS
+):
+    """
+    Solves calculate_days_to_target_ctl without stepping through every day.
+
+    In ramp rate mode each day's TSS is ctl_current + (ramp_rate_per_week/7)*c,
+    so CTL grows by exactly ramp_rate_per_week/7 per day and ATL follows a
+    first-order recurrence driven by a linear input. Both have closed forms,
+    which gives the day count and the final state in O(1).
+
+    In TSB mode every day falls in one of three regimes: holding the TSB
+    target, capped by the ALB lower bound, or resting (TSS clamped at 0).
+    Within a regime the CTL/ATL update is linear with a closed-form solution,
+    so the solver searches the closed form for the day the regime changes
+    (or the target is hit) and jumps straight there.
+
+    When the target lies within rounding distance of a day boundary, the
+    boundary day is settled by stepping the day loop for a few days from the
+    closed-form state two days earlier. Where the loop's own accumulated
+    rounding leaves it a hair short of the target on that day, the loop
+    reports one day more than this solver. The full loop is only used when the
+    closed form does not describe the loop's behaviour (the ramp rate TSS
+    clamp binds) or those few steps do not settle it.
+
+    A smaller max_days stops the solve earlier (days_needed is then -1 and
+    ctl_final/atl_final are the state at max_days).
+
+    Returns:
+        A dictionary with days_needed, ctl_final and atl_final plus the data
+        analytic_state_on_day needs to reconstruct any day's state.
+    """
+    ctl_current = float(ctl_initial)
+    atl_current = float(atl_initial)
+    constants = _model_constants(ctl_days, atl_days)
+
+    if mode == 'tsb':
+        constants['tsb_target'] = tsb_final_target
+        constants['alb_lower_bound'] = alb_lower_bound
+        if ctl_final == ctl_current:
+            return _analytic_solution(0, [], constants, ctl_current, atl_current)
+        solution = _solve_tsb_piecewise(ctl_current, atl_current, ctl_final, constants, max_days)
+        if solution is None:
+            return _loop_solution(
+                ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode,
+                tsb_final_target, alb_lower_bound, ramp_rate_per_week, constants, max_days
+            )
+        return solution
+    if mode != 'ramp_rate':
+        raise ValueError(f"Unknown mode: {mode!r}")
+
+    constants['ctl_per_day'] = ramp_rate_per_week / 7
+    constants['ramp_rate_per_week'] = ramp_rate_per_week
+
+    if ctl_final == ctl_current:
+        return _analytic_solution(0, [], constants, ctl_current, atl_current)
+
+    ctl_per_day = constants['ctl_per_day']
+    days_needed = -1
+    boundary_day = None
+    days_exact = (ctl_final - ctl_current) / ctl_per_day if ctl_per_day else math.inf
+    if days_exact > 0 and math.isfinite(days_exact):
+        nearest_day = round(days_exact)
+        boundary_gap = abs(ctl_current + nearest_day * ctl_per_day - ctl_final)
+        if 1 <= nearest_day <= max_days and boundary_gap <= 1e-9 * (1 + abs(ctl_final)):
+            boundary_day = nearest_day
+        else:
+            days_exact = math.ceil(days_exact)
+            if days_exact <= max_days:
+                days_needed = days_exact
+
+    if boundary_day is not None:
+        # The loop may reach the target one day either side of the boundary
+        days_simulated = min(boundary_day + 1, max_days)
+    else:
+        days_simulated = max_days if days_needed == -1 else days_needed
+
+    # TSS is linear in the day index, so checking both ends covers the clamp
+    tss_first = _regime_tss('ramp', ctl_current, atl_current, constants)
+    tss_last = tss_first + (days_simulated - 1) * ctl_per_day
+    if min(tss_first, tss_last) < 0:
+        return _loop_solution(
+            ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode,
+            tsb_final_target, alb_lower_bound, ramp_rate_per_week, constants, max_days
+        )
+
+    segments = [{
+        'regime': 'ramp', 'start_day': 0, 'end_day': days_simulated,
+        'ctl_start': ctl_current, 'atl_start': atl_current,
+    }]
+    if boundary_day is not None:
+        solution = _settle_boundary_day(segments, boundary_day, ctl_final, constants,
+                                        ctl_current, atl_current, mode, max_days)
+        if solution is None:
+            return _loop_solution(
+                ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode,
+                tsb_final_target, alb_lower_bound, ramp_rate_per_week, constants, max_days
+            )
+        return solution
+    return _analytic_solution(days_needed, segments, constants, ctl_current, atl_current)
+
+def analytic_state_on_day(solution, day):
+    """
+    Returns (ctl, atl, tss, alb) for a given day of an analytic solution.
+
+    ctl and atl are the values at the end of the day (day 0 is the starting
+    state); tss and alb belong to that day and are None for day 0.
+    """
+    histories = solution['histories']
+    if histories is not None:
+        ctl_history, atl_history, tss_history, alb_history = histories
+        if day == 0:
+            return ctl_history[0], atl_history[0], None, None
+        return ctl_history[day], atl_history[day], tss_history[day - 1], alb_history[day - 1]
+
+    segments = solution['segments']
+    last_day = segments[-1]['end_day'] if segments else 0
+    if not 0 <= day <= last_day:
+        raise ValueError(f"Day {day} is outside the simulated range 0-{last_day}.")
+    if day == 0:
+        return solution['ctl_initial'], solution['atl_initial'], None, None
+
+    constants = solution['constants']
+    for segment in segments:
+        if segment['start_day'] < day <= segment['end_day']:
+            break
+    regime = segment['regime']
+    ctl_before, atl_before = _advance_regime(
+        regime, day - 1 - segment['start_day'],
+        segment['ctl_start'], segment['atl_start'], constants
+    )
+    ctl_after, atl_after = _advance_regime(regime, 1, ctl_before, atl_before, constants)
+    tss = _regime_tss(regime, ctl_before, atl_before, constants)
+    return ctl_after, atl_after, tss, atl_before - tss
+
+def _model_constants(ctl_days, atl_days):
+    """Recurrence constants shared by the analytic solvers."""
+    c = ctl_days
+    a = atl_days
+    return {
+        'c': c,
+        'a': a,
+        'kc': (c - 1) / c,
+        'ka': (a - 1) / a,
+        'tsb_tss_multiplier': (1/c) - (1/a),
+    }
+
+def _regime_tss(regime, ctl_current, atl_current, constants):
+    """TSS chosen on a day that starts at (ctl_current, atl_current) in a regime."""
+    if regime == 'ramp':
+        return ctl_current + constants['ctl_per_day'] * constants['c']
+    if regime == 'tsb':
+        tsb_tss_multiplier = constants['tsb_tss_multiplier']
+        if abs(tsb_tss_multiplier) > 1e-9:
+            numerator = constants['tsb_target'] - (ctl_current * constants['kc']) + (atl_current * constants['ka'])
+            return numerator / tsb_tss_multiplier
+        return atl_current
+    if regime == 'alb':
+        return atl_current - constants['alb_lower_bound']
+    if regime == 'rest':
+        return 0
+    raise ValueError(f"Unknown regime: {regime!r}")
+
+def _tsb_mode_regime(ctl_current, atl_current, constants):
+    """The TSB-mode regime the day loop picks for a day starting in this state."""
+    tss_for_tsb_goal = _regime_tss('tsb', ctl_current, atl_current, constants)
+    tss_cap_from_alb = _regime_tss('alb', ctl_current, atl_current, constants)
+    if min(tss_for_tsb_goal, tss_cap_from_alb) < 0:
+        return 'rest'
+    return 'tsb' if tss_for_tsb_goal <= tss_cap_from_alb else 'alb'
+
+def _advance_regime(regime, days, ctl_current, atl_current, constants):
+    """Closed-form (CTL, ATL) after a number of days spent in one regime."""
+    if days == 0:
+        return ctl_current, atl_current
+    c, a, ka = constants['c'], constants['a'], constants['ka']
+
+    if regime == 'ramp':
+        # CTL rises linearly; ATL = linear particular solution + decaying transient
+        ctl_per_day = constants['ctl_per_day']
+        atl_offset = ctl_current + (c - a) * ctl_per_day
+        ctl_next = ctl_current + days * ctl_per_day
+        atl_next = atl_offset + days * ctl_per_day + (atl_current - atl_offset) * ka ** days
+        return ctl_next, atl_next
+
+    if regime == 'tsb':
+        tsb_tss_multiplier = constants['tsb_tss_multiplier']
+        if abs(tsb_tss_multiplier) > 1e-9:
+            # The first day lands on the TSB target; from then on CTL and ATL
+            # both move by the same fixed amount every day.
+            tss = _regime_tss('tsb', ctl_current, atl_current, constants)
+            ctl_day_one = (ctl_current * constants['kc']) + (tss * (1/c))
+            atl_day_one = (atl_current * ka) + (tss * (1/a))
+            daily_change = constants['tsb_target'] / (a * c * tsb_tss_multiplier)
+            return ctl_day_one + (days - 1) * daily_change, atl_day_one + (days - 1) * daily_change
+        # Equal periods: TSS equals ATL, so ATL stays put and CTL decays towards it
+        return atl_current + (ctl_current - atl_current) * constants['kc'] ** days, atl_current
+
+    if regime == 'alb':
+        # ATL moves linearly; CTL = linear particular solution + decaying transient
+        alb_lower_bound = constants['alb_lower_bound']
+        atl_per_day = -alb_lower_bound / a
+        ctl_offset = atl_current - alb_lower_bound - c * atl_per_day
+        ctl_next = ctl_offset + days * atl_per_day + (ctl_current - ctl_offset) * constants['kc'] ** days
+        return ctl_next, atl_current + days * atl_per_day
+
+    if regime == 'rest':
+        return ctl_current * constants['kc'] ** days, atl_current * ka ** days
+    raise ValueError(f"Unknown regime: {regime!r}")
+
+def _regime_turning_points(regime, ctl_current, atl_current, constants):
+    """
+    Day offsets around which a regime's trajectory may stop being monotone.
+
+    Capped by the ALB bound, CTL is a line plus one decaying exponential and
+    can turn once. When resting, the TSB-goal TSS is a difference of two
+    exponentials and can also turn once, and the ALB cap changes sign once.
+    Everything else in the switching conditions is monotone, and the TSB
+    regime is linear after its first day.
+    """
+    kc, ka = constants['kc'], constants['ka']
+    if regime == 'tsb':
+        return [1]
+
+    points = []
+    turning_point = None
+    if regime == 'alb' and 0 < kc < 1:
+        c, a = constants['c'], constants['a']
+        alb_lower_bound = constants['alb_lower_bound']
+        atl_per_day = -alb_lower_bound / a
+        transient = ctl_current - (atl_current - alb_lower_bound - c * atl_per_day)
+        if transient != 0:
+            ratio = -atl_per_day / (transient * math.log(kc))
+            if ratio > 0:
+                turning_point = math.log(ratio) / math.log(kc)
+    elif regime == 'rest' and 0 < kc < 1 and 0 < ka < 1 and atl_current != 0:
+        if kc != ka:
+            ratio = (kc * ctl_current * math.log(kc)) / (ka * atl_current * math.log(ka))
+            if ratio > 0:
+                turning_point = math.log(ratio) / math.log(ka / kc)
+        # Rest ends only while the ALB cap is non-negative, so the day ATL
+        # decays through the bound splits the search as well.
+        alb_ratio = constants['alb_lower_bound'] / atl_current
+        if alb_ratio > 0:
+            alb_crossing = math.log(alb_ratio) / math.log(ka)
+            if math.isfinite(alb_crossing):
+                points.extend([math.floor(alb_crossing), math.ceil(alb_crossing)])
+
+    if turning_point is not None and math.isfinite(turning_point):
+        points.extend([math.floor(turning_point), math.ceil(turning_point)])
+    return points
+
+def _solve_tsb_piecewise(ctl_current, atl_current, ctl_final, constants, max_days=MAX_SIMULATION_DAYS):
+    """
+    Regime-switching solve of TSB mode (see solve_days_to_target_ctl_analytic).
+
+    Returns None when the target falls within rounding distance of a day
+    boundary that a few loop steps (_settle_boundary_day) cannot settle,
+    and the caller has to run the whole loop.
+    """
+    ctl_initial, atl_initial = ctl_current, atl_current
+    building_ctl = ctl_final > ctl_current
+    tolerance = 1e-9 * (1 + abs(ctl_final))
+    segments = []
+    day = 0
+
+    def reached(ctl_value):
+        return ctl_value >= ctl_final if building_ctl else ctl_value <= ctl_final
+
+    while day < max_days:
+        regime = _tsb_mode_regime(ctl_current, atl_current, constants)
+
+        def segment_ends(offset):
+            ctl_value, atl_value = _advance_regime(regime, offset, ctl_current, atl_current, constants)
+            return reached(ctl_value) or _tsb_mode_regime(ctl_value, atl_value, constants) != regime
+
+        # Between turning points every switching condition (and CTL itself)
+        # is monotone, so the first day on which the target is hit or another
+        # regime takes over can be found by bisecting on the closed form.
+        max_length = max_days - day
+        checkpoints = [
+            offset for offset in _regime_turning_points(regime, ctl_current, atl_current, constants)
+            if 0 < offset < max_length
+        ]
+        last_open, length = 0, max_length
+        for checkpoint in sorted(set(checkpoints)) + [max_length]:
+            if segment_ends(checkpoint):
+                length = checkpoint
+                break
+            last_open = checkpoint
+        while length - last_open > 1:
+            middle = (last_open + length) // 2
+            if segment_ends(middle):
+                length = middle
+            else:
+                last_open = middle
+
+        segments.append({
+            'regime': regime, 'start_day': day, 'end_day': day + length,
+            'ctl_start': ctl_current, 'atl_start': atl_current,
+        })
+        ctl_before, _ = _advance_regime(regime, length - 1, ctl_current, atl_current, constants)
+        ctl_current, atl_current = _advance_regime(regime, length, ctl_current, atl_current, constants)
+        day += length
+
+        if reached(ctl_current):
+            if min(abs(ctl_current - ctl_final), abs(ctl_before - ctl_final)) <= tolerance:
+                if day < max_days:
+                    # The loop may reach the target a day later, still in this regime
+                    segments[-1]['end_day'] += 1
+                return _settle_boundary_day(segments, day, ctl_final, constants,
+                                            ctl_initial, atl_initial, 'tsb', max_days)
+            return _analytic_solution(day, segments, constants, ctl_initial, atl_initial)
+
+    return _analytic_solution(-1, segments, constants, ctl_initial, atl_initial)
+
+def _segments_state(segments, day, constants, ctl_initial, atl_initial):
+    """(CTL, ATL) at the end of `day` of a piecewise solution (day 0 is the start)."""
+    for segment in segments:
+        if segment['start_day'] < day <= segment['end_day']:
+            return _advance_regime(segment['regime'], day - segment['start_day'],
+                                   segment['ctl_start'], segment['atl_start'], constants)
+    return ctl_initial, atl_initial
+
+def _settle_boundary_day(segments, boundary_day, ctl_final, constants, ctl_initial, atl_initial,
+                         mode, max_days):
+    """
+    Settles a target that lands within rounding distance of boundary_day by
+    stepping the day loop from the closed-form state two days earlier.
+
+    segments must cover the day after boundary_day (where max_days allows).
+    Returns the solution, trimmed to the day the loop reaches the target, or
+    None when the loop does not reach it within those steps.
+    """
+    instrumentation.count("fitness.analytic.boundary_settles")
+    start_day = max(0, boundary_day - 2)
+    steps = min(boundary_day + 1, max_days) - start_day
+    ctl_start, atl_start = _segments_state(segments, start_day, constants, ctl_initial, atl_initial)
+    building_ctl = ctl_final > ctl_initial
+    if start_day and (ctl_start >= ctl_final if building_ctl else ctl_start <= ctl_final):
+        return None
+    days, ctl_history, atl_history, _, _ = load_kernels.get_backend('python').simulate_to_target(
+        ctl_start, atl_start, ctl_final, constants['c'], constants['a'],
+        load_kernels.MODE_TSB if mode == 'tsb' else load_kernels.MODE_RAMP_RATE,
+        constants.get('tsb_target') or 0.0, constants.get('alb_lower_bound') or 0.0,
+        constants.get('ramp_rate_per_week') or 0.0, steps
+    )
+    if days == -1:
+        return None
+
+    days_needed = start_day + days
+    trimmed = []
+    for segment in segments:
+        if segment['start_day'] < days_needed:
+            trimmed.append(dict(segment, end_day=min(segment['end_day'], days_needed)))
+    return _analytic_solution(days_needed, trimmed, constants, ctl_initial, atl_initial,
+                              final_state=(ctl_history[days], atl_history[days]))
+
+def _analytic_solution(days_needed, segments, constants, ctl_initial, atl_initial, histories=None,
+                       final_state=None):
+    """
+    Packs the result of an analytic solve into the dictionary callers receive.
+    final_state overrides the closed-form end state (e.g. a boundary settled by the loop).
+    """
+    if segments:
+        instrumentation.count("fitness.analytic.regime_switches", len(segments) - 1)
+    if final_state is not None:
+        ctl_final, atl_final = final_state
+    elif histories is not None:
+        ctl_final, atl_final = histories[0][-1], histories[1][-1]
+    elif segments:
+        last = segments[-1]
+        ctl_final, atl_final = _advance_regime(
+            last['regime'], last['end_day'] - last['start_day'],
+            last['ctl_start'], last['atl_start'], constants
+        )
+    else:
+        ctl_final, atl_final = ctl_initial, atl_initial
+
+    return {
+        'days_needed': days_needed,
+        'ctl_final': ctl_final,
+        'atl_final': atl_final,
+        'ctl_initial': ctl_initial,
+        'atl_initial': atl_initial,
+        'constants': constants,
+        'segments': segments,
+        'histories': histories,
+    }
+
+def _loop_solution(ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode,
+                   tsb_final_target, alb_lower_bound, ramp_rate_per_week, constants,
+                   max_days=MAX_SIMULATION_DAYS):
+    """Falls back to the day loop and wraps its histories as an analytic solution."""
+    instrumentation.count("fitness.analytic.loop_fallbacks")
+    days_needed, *histories = calculate_days_to_target_ctl(
+        ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode=mode,
+        tsb_final_target=tsb_final_target, alb_lower_bound=alb_lower_bound,
+        ramp_rate_per_week=ramp_rate_per_week, max_days=max_days
+    )
+    return _analytic_solution(
+        days_needed, [], constants, float(ctl_initial), float(atl_initial),
+        histories=tuple(histories)
+    )
+
+def weekly_summary(ctl_progression, atl_progression, tss_progression, days_needed):
+    """
+    Groups a simulated progression into weeks in a single pass.
+
+    Returns:
+        A list with one dictionary per (possibly partial) week holding the
+        day range, total TSS, end-of-week CTL/ATL/TSB/Shape and the CTL ramp
+        rate over the 7 days ending that week (see LoadAggregator).
+    """
+    aggregator = LoadAggregator(ctl_progression[0], atl_progression[0], windows=())
+    for i in range(days_needed):
+        aggregator.add_day(tss_progression[i], ctl_progression[i + 1], atl_progression[i + 1])
+    return aggregator.finish()
 
 def get_float_input(prompt_text, allow_empty_for_default=False, default_val=0.0):
     while True:
@@ -99,7 +1066,8 @@ def get_int_input(prompt_text, min_val=2):
         except ValueError:
             print("Invalid input. Please enter an integer.")
 
-if __name__ == "__main__":
+def run_interactive():
+    """Prompts for a single scenario and prints its progression."""
     ctl_period = get_int_input("CTL period in days: ", min_val=2)
     atl_period = get_int_input("ATL period in days: ", min_val=2)
     ctl_initial_val = get_float_input("\nInitial CTL: ")
@@ -144,7 +1112,7 @@ if __name__ == "__main__":
         final_ctl_val = ctl_progression[-1]
         final_atl_val = atl_progression[-1]
         final_tsb_achieved = final_ctl_val - final_atl_val
-        final_alb_achieved = daily_alb_values[-1] if daily_alb_values else "N/A"
+        final_alb_achieved = float(daily_alb_values[-1]) if len(daily_alb_values) else "N/A"
         # Calculate final Shape
         final_shape = (2 * final_ctl_val) - final_atl_val
 
@@ -160,9 +1128,9 @@ if __name__ == "__main__":
         # Print final Shape
         print(f"Final Shape (2*CTL - ATL): {final_shape:.2f}")
 
-        if tss_progression:
-            avg_tss = sum(tss_progression) / len(tss_progression) if tss_progression else 0
-            max_tss_overall = max(tss_progression) if tss_progression else 0
+        if len(tss_progression):
+            avg_tss = sum(tss_progression) / len(tss_progression)
+            max_tss_overall = max(tss_progression)
             print(f"Average TSS needed per day: {avg_tss:.2f}")
             print(f"Peak TSS during entire period: {max_tss_overall:.2f}")
 
@@ -191,35 +1159,304 @@ if __name__ == "__main__":
                       f"Shape={actual_daily_shape:.2f}")
             
             # --- UPDATED: Added 'Shape' to weekly summary ---
-            num_weeks = (days_needed + 6) // 7
             print("\n")
             print(f"{'Week':<5} | {'Days':<10} | {'Total TSS':<10} | {'End CTL':<10} | {'End ATL':<10} | {'End TSB':<10} | {'End Shape':<10} | {'Ramp Rate':<10}")
             print("-" * 95)
-            for week_idx in range(num_weeks):
-                week_num = week_idx + 1
-                start_day_tss_idx = week_idx * 7
-                end_day_tss_idx = min((week_idx + 1) * 7, days_needed)
-                
-                display_day_start = start_day_tss_idx + 1
-                display_day_end = end_day_tss_idx
-                
-                weekly_tss_values = tss_progression[start_day_tss_idx:end_day_tss_idx]
-                total_weekly_tss = sum(weekly_tss_values) if weekly_tss_values else 0
-                
-                ctl_end_of_week = ctl_progression[display_day_end] 
-                atl_end_of_week = atl_progression[display_day_end]
-                tsb_end_of_week = ctl_end_of_week - atl_end_of_week
-                # --- NEW: Calculate Shape for end of week ---
-                shape_end_of_week = (2 * ctl_end_of_week) - atl_end_of_week
-
-                ctl_7_days_prior_idx = max(0, display_day_end - 7)
-                ctl_7_days_prior = ctl_progression[ctl_7_days_prior_idx]
-                ramp_rate = ctl_end_of_week - ctl_7_days_prior
-
-                print(f"{week_num:<5} | {f'{display_day_start}-{display_day_end}':<10} | {total_weekly_tss:<10.0f} | "
-                      f"{ctl_end_of_week:<10.1f} | {atl_end_of_week:<10.1f} | {tsb_end_of_week:<10.1f} | "
-                      f"{shape_end_of_week:<10.1f} | {ramp_rate:<+10.1f}")
+            for week in weekly_summary(ctl_progression, atl_progression, tss_progression, days_needed):
+                day_range = f"{week['day_start']}-{week['day_end']}"
+                print(f"{week['week']:<5} | {day_range:<10} | {week['total_tss']:<10.0f} | "
+                      f"{week['ctl']:<10.1f} | {week['atl']:<10.1f} | {week['tsb']:<10.1f} | "
+                      f"{week['shape']:<10.1f} | {week['ramp_rate']:<+10.1f}")
             print("-" * 95)
 
     else:
-        print(f"Could not reach target CTL ({ctl_final_val}) under constraints.")
+        print(f"Could not reach target CTL ({ctl_final_val}) under constraints "
+              f"within {MAX_SIMULATION_DAYS} days.")
+
+# --- Batch mode ---
+
+BATCH_REPORT_FIELDS = {
+    "days": ["scenario", "day", "tss", "ctl", "atl", "tsb", "alb", "shape", "error"],
+    "weekly": ["scenario", "week", "day_start", "day_end", "total_tss", "ctl", "atl", "tsb", "shape", "ramp_rate",
+               "error"],
+    "summary": ["scenario", "days_needed", "ctl_final", "atl_final", "tsb_final", "alb_final",
+                "shape_final", "avg_tss", "peak_tss", "error"],
+}
+# Scenarios in flight per worker process in run_batch, in chunks of `chunksize`
+BATCH_WINDOW_PER_WORKER = 4
+
+def read_batch_scenarios(stream, input_format):
+    """
+    Lazily parses scenarios from a CSV (with header) or JSONL stream.
+
+    Each scenario uses the keyword arguments of calculate_days_to_target_ctl;
+    an optional "id" column labels the output rows (defaults to the 1-based
+    scenario number). As in interactive mode, alb_lower_bound defaults to -200.
+    A malformed row yields {"scenario", "error"} naming its line instead of
+    stopping the batch.
+    """
+    if input_format == 'csv':
+        reader = csv.DictReader(stream)
+        records = ((reader.line_num, record) for record in reader)
+    elif input_format == 'jsonl':
+        records = ((line_number, line) for line_number, line in enumerate(stream, start=1) if line.strip())
+    else:
+        raise ValueError(f"Unknown input format: {input_format!r}")
+
+    for number, (line_number, record) in enumerate(records, start=1):
+        try:
+            if input_format == 'jsonl':
+                record = json.loads(record)
+                if not isinstance(record, dict):
+                    raise ValueError(f"Scenario {number}: expected a JSON object.")
+            scenario = _parse_batch_scenario(record, number)
+        except ValueError as e:
+            label = (record.get("id") if isinstance(record, dict) else None) or number
+            scenario = {"scenario": label, "error": f"Line {line_number}: {e}"}
+        yield scenario
+
+def _parse_batch_scenario(record, number):
+    def optional_float(key, default=None):
+        value = record.get(key)
+        if value is None or value == '':
+            return default
+        return float(value)
+
+    try:
+        scenario = {
+            "scenario": record.get("id") or number,
+            "ctl_initial": float(record["ctl_initial"]),
+            "atl_initial": float(record["atl_initial"]),
+            "ctl_final": float(record["ctl_final"]),
+            "ctl_days": int(record["ctl_days"]),
+            "atl_days": int(record["atl_days"]),
+            "mode": record.get("mode") or 'tsb',
+            "tsb_final_target": optional_float("tsb_final_target"),
+            "alb_lower_bound": optional_float("alb_lower_bound", -200.0),
+            "ramp_rate_per_week": optional_float("ramp_rate_per_week"),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Scenario {number}: invalid or missing value ({e}).") from e
+
+    if scenario["ctl_days"] < 2 or scenario["atl_days"] < 2:
+        raise ValueError(f"Scenario {number}: CTL and ATL periods must be at least 2 days.")
+    if scenario["mode"] == 'tsb' and scenario["tsb_final_target"] is None:
+        raise ValueError(f"Scenario {number}: tsb mode needs tsb_final_target.")
+    if scenario["mode"] == 'ramp_rate' and scenario["ramp_rate_per_week"] is None:
+        raise ValueError(f"Scenario {number}: ramp_rate mode needs ramp_rate_per_week.")
+    if scenario["mode"] not in ('tsb', 'ramp_rate'):
+        raise ValueError(f"Scenario {number}: unknown mode {scenario['mode']!r}.")
+    return scenario
+
+def run_batch_scenario(scenario, report='summary'):
+    """Simulates one parsed scenario and returns its output rows for a report."""
+    label = scenario["scenario"]
+    sim_args = {k: v for k, v in scenario.items() if k != "scenario"}
+
+    if report == 'summary':
+        summary = summarize_days_to_target_ctl(**sim_args)
+        days = summary["days_needed"]
+        simulated_days = days if days != -1 else MAX_SIMULATION_DAYS
+        return [{
+            "scenario": label,
+            "days_needed": days,
+            "ctl_final": summary["ctl_final"],
+            "atl_final": summary["atl_final"],
+            "tsb_final": summary["tsb_final"],
+            "alb_final": summary["alb_final"],
+            "shape_final": summary["shape_final"],
+            "avg_tss": summary["tss_total"] / simulated_days if simulated_days else 0,
+            "peak_tss": summary["tss_peak"],
+        }]
+
+    if report == 'weekly':
+        aggregator = LoadAggregator(scenario["ctl_initial"], scenario["atl_initial"], windows=())
+        summarize_days_to_target_ctl(**sim_args, aggregator=aggregator)
+        return [dict(week, scenario=label) for week in aggregator.weeks]
+
+    _, history = calculate_days_to_target_ctl_compact(**sim_args)
+    ctl_progression, atl_progression = history.ctl, history.atl
+    tss_progression, daily_alb_values = history.tss, history.alb
+    simulated_days = len(tss_progression)
+
+    if report == 'days':
+        return [{
+            "scenario": label,
+            "day": i + 1,
+            "tss": tss_progression[i],
+            "ctl": ctl_progression[i + 1],
+            "atl": atl_progression[i + 1],
+            "tsb": ctl_progression[i + 1] - atl_progression[i + 1],
+            "alb": daily_alb_values[i],
+            "shape": (2 * ctl_progression[i + 1]) - atl_progression[i + 1],
+        } for i in range(simulated_days)]
+    raise ValueError(f"Unknown report: {report!r}")
+
+def _run_batch_chunk(scenarios, report):
+    """Process-pool entry point: the output rows of each scenario of a chunk."""
+    return [run_batch_scenario(scenario, report) for scenario in scenarios]
+
+def run_batch(scenarios, output, report='summary', output_format='csv', workers=None, chunksize=16):
+    """
+    Runs scenarios (optionally across a process pool) and streams their rows to output.
+
+    Results are written in input order. With workers=1 everything runs in
+    the current process; otherwise at most BATCH_WINDOW_PER_WORKER chunks
+    per worker are in flight, so the input is read as the results go out.
+    Scenarios that failed to parse are written as rows with only an error.
+
+    Returns:
+        The number of scenarios written as errors.
+    """
+    fields = BATCH_REPORT_FIELDS[report]
+    if output_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        write_rows = writer.writerows
+    elif output_format == 'jsonl':
+        def write_rows(rows):
+            output.writelines(json.dumps({k: row[k] for k in fields if k in row}) + "\n" for row in rows)
+    else:
+        raise ValueError(f"Unknown output format: {output_format!r}")
+
+    errors = 0
+
+    def write_chunk(results):
+        nonlocal errors
+        for rows in results:
+            if rows and "error" in rows[0]:
+                errors += 1
+            write_rows(rows)
+
+    if workers == 1:
+        for scenario in scenarios:
+            write_chunk([[scenario] if "error" in scenario else run_batch_scenario(scenario, report)])
+        return errors
+
+    max_pending = (workers or os.cpu_count() or 1) * BATCH_WINDOW_PER_WORKER
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in _batched(scenarios, chunksize):
+            valid = [scenario for scenario in chunk if "error" not in scenario]
+            pending.append((chunk, executor.submit(_run_batch_chunk, valid, report) if valid else None))
+            if len(pending) >= max_pending:
+                write_chunk(_merge_batch_chunk(*pending.popleft()))
+        while pending:
+            write_chunk(_merge_batch_chunk(*pending.popleft()))
+    return errors
+
+def _batched(iterable, size):
+    """Yields lists of up to `size` consecutive items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _merge_batch_chunk(chunk, future):
+    """Puts the rows of a chunk's valid scenarios back in input order around its errors."""
+    results = iter(future.result() if future is not None else ())
+    return [[scenario] if "error" in scenario else next(results) for scenario in chunk]
+
+def _parse_grid_range(text):
+    if np is None:
+        raise argparse.ArgumentTypeError("Sweep mode requires NumPy.")
+    try:
+        start, stop, count = text.split(":")
+        return np.linspace(float(start), float(stop), int(count))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected START:STOP:COUNT, got {text!r}.")
+
+def _run_sweep_cli(parser, args):
+    """Runs a parameter sweep from parsed arguments and writes the grid as CSV."""
+    base = [args.ctl_initial, args.atl_initial, args.ctl_final, args.ctl_days, args.atl_days]
+    if any(value is None for value in base):
+        parser.error("Sweep mode needs --ctl-initial, --atl-initial, --ctl-final, --ctl-days and --atl-days.")
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', buffering=1 << 16)
+    writer = csv.writer(output)
+    try:
+        if args.sweep_ramp is not None:
+            days = sweep_days_to_target_ctl(*base, mode='ramp_rate', ramp_rates=args.sweep_ramp,
+                                            max_days=args.max_days)
+            writer.writerow(["ramp_rate", "days_needed"])
+            writer.writerows(zip(args.sweep_ramp.tolist(), days.tolist()))
+        if args.sweep_tsb is not None or args.sweep_alb is not None:
+            if args.sweep_tsb is None or args.sweep_alb is None:
+                parser.error("A TSB/ALB sweep needs both --sweep-tsb and --sweep-alb.")
+            days = sweep_days_to_target_ctl(*base, mode='tsb', tsb_final_targets=args.sweep_tsb,
+                                            alb_lower_bounds=args.sweep_alb, max_days=args.max_days)
+            # Rows are TSB targets, columns ALB lower bounds
+            writer.writerow(["tsb\\alb"] + args.sweep_alb.tolist())
+            writer.writerows([tsb] + row for tsb, row in zip(args.sweep_tsb.tolist(), days.tolist()))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Projects the days needed to reach a target CTL. "
+                    "Runs interactively unless --batch is given."
+    )
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Read scenarios from a CSV or JSONL file ('-' for stdin).")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"],
+                        help="Scenario file format (default: from the file extension, csv for stdin).")
+    parser.add_argument("--output", metavar="FILE", default="-",
+                        help="Where to write results (default: stdout).")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--report", choices=["summary", "weekly", "days"], default="summary",
+                        help="Per-scenario summary, weekly ramp table or per-day table.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: CPU count; 1 runs in-process).")
+
+    sweep_group = parser.add_argument_group(
+        "sweep mode",
+        "Grid of days-to-target for one starting point. Ranges are START:STOP:COUNT; "
+        "write ranges that start with a minus sign with '=', e.g. --sweep-tsb=-20:0:3."
+    )
+    sweep_group.add_argument("--sweep-tsb", type=_parse_grid_range, metavar="RANGE",
+                             help="TSB targets (TSB/ALB grid; needs --sweep-alb).")
+    sweep_group.add_argument("--sweep-alb", type=_parse_grid_range, metavar="RANGE",
+                             help="ALB lower bounds (TSB/ALB grid; needs --sweep-tsb).")
+    sweep_group.add_argument("--sweep-ramp", type=_parse_grid_range, metavar="RANGE",
+                             help="Ramp rates in CTL per week.")
+    for name in ("ctl-initial", "atl-initial", "ctl-final"):
+        sweep_group.add_argument(f"--{name}", type=float)
+    for name in ("ctl-days", "atl-days"):
+        sweep_group.add_argument(f"--{name}", type=int)
+    sweep_group.add_argument("--max-days", type=int, default=MAX_SIMULATION_DAYS)
+    args = parser.parse_args(argv)
+
+    if args.sweep_tsb is not None or args.sweep_alb is not None or args.sweep_ramp is not None:
+        _run_sweep_cli(parser, args)
+        return
+
+    if args.batch is None:
+        run_interactive()
+        return
+
+    input_format = args.input_format
+    if input_format is None:
+        input_format = 'jsonl' if args.batch.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+    input_stream = sys.stdin if args.batch == '-' else open(args.batch, newline='')
+    output_stream = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', buffering=1 << 16)
+    try:
+        errors = run_batch(
+            read_batch_scenarios(input_stream, input_format), output_stream,
+            report=args.report, output_format=args.output_format, workers=args.workers
+        )
+        if errors:
+            print(f"{errors} scenario(s) could not be read; see the error column.", file=sys.stderr)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+        else:
+            output_stream.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+# filename: fitness_service.py
+
+"""
+Long-running local HTTP/JSON service for the calculators.
+
+    python fitness_service.py --port 8765
+
+Endpoints (POST a JSON object, get a JSON object back):
+
+    /days-to-target   Arguments of fitness.calculate_days_to_target_ctl;
+                      returns the batch-mode summary row.
+    /calibrate        ctl_days, atl_days and ONE of tsb, ctl_ramp or
+                      weekly_tss_change; returns all four values and
+                      whether the requested value is reachable.
+    /contributions    n_days (a period or a list of them) and cutoff_pct;
+                      returns the EWMA contribution rows of every period.
+    /hrss             max_hr, resting_hr, threshold_hr, gender and either
+                      duration_minutes + avg_hr or a heart_rates stream
+                      (with optional timestamps).
+
+GET /health answers {"status": "ok"} and GET /stats returns the service
+counters.
+
+The event loop only parses and validates requests; all computation runs in
+a process pool. Requests for an identical computation share one result:
+finished results come from an LRU cache whose entries expire after a TTL,
+and a request arriving while the same computation is in flight waits for
+it instead of starting another. Requests for one endpoint that arrive
+within a short window are sent to the pool as one micro-batch, and the
+days-to-target and HRSS batches run through the vectorized engines
+(calculate_days_to_target_ctl_batch, calculate_hrss_batch) when NumPy is
+installed. Batched answers are identical to those of single requests.
+"""
+
+import argparse
+import asyncio
+import collections
+import hashlib
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import contribution_analyzer
+import fitness
+import hrss
+import progression_calibrator
+
+try:
+    import numpy as np
+except ImportError:  # Batches are then computed one request at a time
+    np = None
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_BATCH_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH = 256
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_CACHE_TTL_SECONDS = 600.0
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_CONTRIBUTION_ROWS = 100000
+
+class RequestError(ValueError):
+    """A request the service cannot answer; reported to the client as HTTP 400."""
+
+# --- Request parsing (runs on the event loop, so it must stay cheap) ---
+
+_REQUIRED = object()
+
+def _number(body, key, default=_REQUIRED, convert=float):
+    value = body.get(key)
+    if value is None:
+        if default is _REQUIRED:
+            raise RequestError(f"Missing value: {key}")
+        return default
+    if isinstance(value, bool):
+        raise RequestError(f"Invalid value for {key}: {value!r}")
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        raise RequestError(f"Invalid value for {key}: {value!r}")
+
+def _parse_days_to_target(body):
+    scenario = {
+        "ctl_initial": _number(body, "ctl_initial"),
+        "atl_initial": _number(body, "atl_initial"),
+        "ctl_final": _number(body, "ctl_final"),
+        "ctl_days": _number(body, "ctl_days", convert=int),
+        "atl_days": _number(body, "atl_days", convert=int),
+        "mode": body.get("mode") or 'tsb',
+        "tsb_final_target": _number(body, "tsb_final_target", None),
+        # As in interactive and batch mode
+        "alb_lower_bound": _number(body, "alb_lower_bound", -200.0),
+        "ramp_rate_per_week": _number(body, "ramp_rate_per_week", None),
+    }
+    if scenario["ctl_days"] < 2 or scenario["atl_days"] < 2:
+        raise RequestError("CTL and ATL periods must be at least 2 days.")
+    if scenario["mode"] == 'tsb' and scenario["tsb_final_target"] is None:
+        raise RequestError("tsb mode needs tsb_final_target.")
+    if scenario["mode"] == 'ramp_rate' and scenario["ramp_rate_per_week"] is None:
+        raise RequestError("ramp_rate mode needs ramp_rate_per_week.")
+    if scenario["mode"] not in ('tsb', 'ramp_rate'):
+        raise RequestError(f"Unknown mode: {scenario['mode']!r}")
+    return scenario
+
+CALIBRATION_METRICS = {"tsb": "TSB", "ctl_ramp": "CTL Ramp", "weekly_tss_change": "Weekly TSS Change"}
+
+def _parse_calibrate(body):
+    provided = [key for key in CALIBRATION_METRICS if body.get(key) is not None]
+    if len(provided) != 1:
+        raise RequestError("Provide exactly ONE of tsb, ctl_ramp or weekly_tss_change.")
+    request = {
+        "ctl_days": _number(body, "ctl_days", convert=int),
+        "atl_days": _number(body, "atl_days", convert=int),
+        "metric": provided[0],
+        "value": _number(body, provided[0]),
+    }
+    if request["ctl_days"] < 2 or request["atl_days"] < 2:
+        raise RequestError("CTL and ATL periods must be at least 2 days.")
+    return request
+
+def _parse_contributions(body):
+    periods = body.get("n_days")
+    single = not isinstance(periods, list)
+    periods = [_number({"n_days": period}, "n_days", convert=int) for period in ([periods] if single else periods)]
+    cutoff_pct = _number(body, "cutoff_pct")
+    if not periods or min(periods) < 2:
+        raise RequestError("Periods must be at least 2 days.")
+    if not cutoff_pct > 0:
+        raise RequestError("Cutoff must be a positive number.")
+    if sum(contribution_analyzer.contribution_cutoff_day(period, cutoff_pct) for period in periods) > MAX_CONTRIBUTION_ROWS:
+        raise RequestError(f"The table would exceed {MAX_CONTRIBUTION_ROWS} rows; raise cutoff_pct.")
+    return {"n_days": periods[0] if single else periods, "cutoff_pct": cutoff_pct}
+
+def _parse_hrss(body):
+    request = {
+        "max_hr": _number(body, "max_hr", convert=int),
+        "resting_hr": _number(body, "resting_hr", convert=int),
+        "threshold_hr": _number(body, "threshold_hr", convert=int),
+        "gender": 'male' if str(body.get("gender") or 'male').lower() == 'male' else 'female',
+    }
+    if request["resting_hr"] >= request["max_hr"] or request["resting_hr"] >= request["threshold_hr"]:
+        raise RequestError("Resting HR must be lower than Max HR and Threshold HR.")
+
+    if body.get("heart_rates") is not None:
+        if np is None:
+            raise RequestError("Heart rate streams need NumPy on the server.")
+        try:
+            request["heart_rates"] = [float(value) for value in body["heart_rates"]]
+            timestamps = body.get("timestamps")
+            request["timestamps"] = None if timestamps is None else [float(value) for value in timestamps]
+        except (TypeError, ValueError):
+            raise RequestError("heart_rates and timestamps must be lists of numbers.")
+        if request["timestamps"] is not None and len(request["timestamps"]) != len(request["heart_rates"]):
+            raise RequestError("timestamps must have one entry per heart rate.")
+    else:
+        request["duration_minutes"] = _number(body, "duration_minutes")
+        request["avg_hr"] = _number(body, "avg_hr")
+    return request
+
+# --- Batch workers (run in the process pool) ---
+#
+# Each takes a list of parsed requests and returns one (ok, result or error
+# message) pair per request, so one bad request does not fail its batch.
+
+def _each(compute, requests):
+    results = []
+    for request in requests:
+        try:
+            results.append((True, compute(request)))
+        except (ValueError, ImportError) as e:
+            results.append((False, str(e)))
+    return results
+
+def _days_to_target_one(scenario):
+    row = fitness.run_batch_scenario(dict(scenario, scenario=None))[0]
+    del row["scenario"]
+    return row
+
+def _days_to_target_batch(scenarios):
+    if np is None or len(scenarios) == 1:
+        return _each(_days_to_target_one, scenarios)
+
+    results = [None] * len(scenarios)
+    by_mode = collections.defaultdict(list)
+    for index, scenario in enumerate(scenarios):
+        by_mode[scenario["mode"]].append(index)
+    for mode, indices in by_mode.items():
+        def column(name):
+            values = [scenarios[index][name] for index in indices]
+            return None if all(value is None for value in values) else np.array(
+                [np.nan if value is None else value for value in values])
+        days_needed, ctl_history, atl_history, tss_history, alb_history = fitness.calculate_days_to_target_ctl_batch(
+            column("ctl_initial"), column("atl_initial"), column("ctl_final"), column("ctl_days"),
+            column("atl_days"), mode=mode, tsb_final_target=column("tsb_final_target"),
+            alb_lower_bound=column("alb_lower_bound"), ramp_rate_per_week=column("ramp_rate_per_week")
+        )
+        for row, index in enumerate(indices):
+            days = int(days_needed[row])
+            ctl_final, atl_final = float(ctl_history[row][-1]), float(atl_history[row][-1])
+            # Summed in day order, exactly like summarize_days_to_target_ctl
+            tss_values = tss_history[row].tolist()
+            simulated_days = days if days != -1 else fitness.MAX_SIMULATION_DAYS
+            peak_tss = max(tss_values, default=0.0)
+            results[index] = (True, {
+                "days_needed": days,
+                "ctl_final": ctl_final,
+                "atl_final": atl_final,
+                "tsb_final": ctl_final - atl_final,
+                "alb_final": float(alb_history[row][-1]) if tss_values else None,
+                "shape_final": (2 * ctl_final) - atl_final,
+                "avg_tss": sum(tss_values) / simulated_days if simulated_days else 0,
+                "peak_tss": peak_tss if peak_tss > 0 else 0.0,
+            })
+    return results
+
+def _calibrate_one(request):
+    result = progression_calibrator.calibrate(
+        CALIBRATION_METRICS[request["metric"]], request["value"], request["ctl_days"], request["atl_days"])
+    return {"tsb": float(result.tsb), "weekly_tss_total": float(result.avg_weekly_tss_total),
+            "ctl_ramp": float(result.avg_ctl_ramp_rate), "weekly_tss_change": float(result.avg_weekly_tss_change),
+            "reachable": result.reachable}
+
+def _calibrate_batch(requests):
+    # Each solve is a closed-form solve or a handful of cached simulations, so a
+    # batch is simply solved request by request in one pool task.
+    return _each(_calibrate_one, requests)
+
+def _contributions_one(request):
+    return {"rows": contribution_analyzer.ewma_contributions(request["n_days"], request["cutoff_pct"])}
+
+def _contributions_batch(requests):
+    return _each(_contributions_one, requests)
+
+def _hrss_stream_one(request):
+    return hrss.calculate_hrss_from_stream(
+        request["max_hr"], request["resting_hr"], request["threshold_hr"],
+        request["heart_rates"], request["timestamps"], gender=request["gender"])
+
+def _hrss_average_one(request):
+    return hrss.calculate_hrss(
+        request["max_hr"], request["resting_hr"], request["threshold_hr"],
+        request["duration_minutes"], request["avg_hr"], gender=request["gender"])
+
+def _hrss_batch(requests):
+    results = [None] * len(requests)
+    streams = [index for index, request in enumerate(requests) if "heart_rates" in request]
+    averages = [index for index, request in enumerate(requests) if "heart_rates" not in request]
+    for index, result in zip(streams, _each(_hrss_stream_one, [requests[index] for index in streams])):
+        results[index] = result
+
+    if np is None or len(averages) <= 1:
+        for index, result in zip(averages, _each(_hrss_average_one, [requests[index] for index in averages])):
+            results[index] = result
+        return results
+
+    profiles, profile_ids = {}, []
+    for index in averages:
+        request = requests[index]
+        profile = hrss.HRProfile(request["max_hr"], request["resting_hr"], request["threshold_hr"], request["gender"])
+        profile_ids.append(profiles.setdefault(profile, len(profiles)))
+    batch = hrss.calculate_hrss_batch(
+        {profile_id: profile for profile, profile_id in profiles.items()}, profile_ids,
+        durations_minutes=[requests[index]["duration_minutes"] for index in averages],
+        avg_hrs=[requests[index]["avg_hr"] for index in averages], round_digits=2)
+    for row, index in enumerate(averages):
+        results[index] = (True, {name: float(values[row]) for name, values in batch.items()})
+    return results
+
+ENDPOINTS = {
+    "/days-to-target": (_parse_days_to_target, _days_to_target_batch),
+    "/calibrate": (_parse_calibrate, _calibrate_batch),
+    "/contributions": (_parse_contributions, _contributions_batch),
+    "/hrss": (_parse_hrss, _hrss_batch),
+}
+
+# --- Caching, coalescing and micro-batching ---
+
+class ResultCache:
+    """LRU cache of results whose entries also expire ttl seconds after being stored."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL_SECONDS, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The cached result, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+class MicroBatcher:
+    """
+    Collects items submitted within `window` seconds (or until max_batch
+    are waiting) and hands them to run_batch together. run_batch is a
+    coroutine function taking the list of items and returning one
+    (ok, result or error message) pair per item.
+    """
+
+    def __init__(self, run_batch, window, max_batch):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._pending = []
+        self._timer = None
+        self._running = set()
+
+    def submit(self, item):
+        """Queues an item; returns a future for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RequestError(value))
+
+class FitnessService:
+    """
+    The calculators behind a result cache, in-flight coalescing and one
+    MicroBatcher per endpoint, with the work done in a process pool.
+    """
+
+    def __init__(self, workers=None, batch_window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch=DEFAULT_MAX_BATCH,
+                 cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL_SECONDS):
+        # Spawned rather than forked: a forked worker would inherit the open
+        # client sockets and keep their connections from closing.
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self.cache = ResultCache(cache_size, cache_ttl)
+        self.counters = collections.Counter()
+        self._inflight = {}
+        self._batchers = {
+            path: MicroBatcher(self._pool_runner(worker), batch_window_ms / 1000.0, max_batch)
+            for path, (_, worker) in ENDPOINTS.items()
+        }
+
+    def _pool_runner(self, worker):
+        async def run(items):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, worker, items)
+        return run
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle(self, path, body):
+        """Result of one request to an endpoint. Raises RequestError for bad requests."""
+        parse, _ = ENDPOINTS[path]
+        if not isinstance(body, dict):
+            raise RequestError("The request body must be a JSON object.")
+        request = parse(body)
+        self.counters["requests"] += 1
+
+        canonical = json.dumps([path, request], sort_keys=True)
+        key = hashlib.sha256(canonical.encode()).hexdigest()
+        result = self.cache.get(key)
+        if result is not None:
+            self.counters["cache_hits"] += 1
+            return result
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+        else:
+            future = self._batchers[path].submit(request)
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+        # Shielded so a client hanging up does not cancel the shared computation
+        return await asyncio.shield(future)
+
+    def _finished(self, key, future):
+        self._inflight.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+    def stats(self):
+        return {
+            **self.counters,
+            "cached_results": len(self.cache),
+            "in_flight": len(self._inflight),
+            "batches": {path: {"batches": batcher.batches, "requests": batcher.items}
+                        for path, batcher in self._batchers.items()},
+        }
+
+# --- HTTP ---
+
+async def _dispatch(service, method, path, raw_body):
+    """Returns (HTTPStatus, JSON-serializable payload) for one request."""
+    if path == "/health":
+        return HTTPStatus.OK, {"status": "ok"}
+    if path == "/stats":
+        return HTTPStatus.OK, service.stats()
+    if path not in ENDPOINTS:
+        return HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint: {path}"}
+    if method != "POST":
+        return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Use POST with a JSON body."}
+    try:
+        body = json.loads(raw_body or b"{}")
+    except ValueError:
+        return HTTPStatus.BAD_REQUEST, {"error": "The request body is not valid JSON."}
+    try:
+        return HTTPStatus.OK, await service.handle(path, body)
+    except RequestError as e:
+        return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+    except Exception as e:
+        print(f"Error handling {path}: {e!r}", file=sys.stderr)
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal error."}
+
+async def _read_request(reader):
+    """(method, path, headers, body) of the next request, or None at end of stream."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, target, version = request_line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    return method, target.split('?', 1)[0], keep_alive, body
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+async def _handle_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                writer.write(_response(HTTPStatus.BAD_REQUEST, {"error": "Malformed request."}, False))
+                break
+            if request is None:
+                break
+            method, path, keep_alive, body = request
+            status, payload = await _dispatch(service, method, path, body)
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Serves requests until cancelled."""
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(service, reader, writer), host, port)
+    addresses = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"Serving on {addresses}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service for the fitness calculators.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help="How long requests wait to be batched together.")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="Requests that trigger a batch without waiting for the window.")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="Results kept in the cache (0 disables it).")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL_SECONDS,
+                        help="Seconds a cached result stays valid.")
+    args = parser.parse_args(argv)
+
+    service = FitnessService(args.workers, args.batch_window_ms, args.max_batch, args.cache_size, args.cache_ttl)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    main()
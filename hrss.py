@@ -1,4 +1,71 @@
+import functools
 import math
+from collections import namedtuple
+from typing import Iterable, Mapping, Optional, Sequence, Tuple
+
+import instrumentation
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for heart rate streams
+    np = None
+
+# Sampling interval assumed when a stream has no timestamps (1 Hz devices)
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 1.0
+# Longer pauses between samples (auto-pause, dropouts) count as one nominal sample
+DEFAULT_MAX_GAP_SECONDS = 10.0
+# Integer readings up to this bpm are scored through the cached weight table
+LUT_MAX_BPM = 255
+TRIMP_TABLE_CACHE_SIZE = 1024
+
+TrimpWeightTable = namedtuple('TrimpWeightTable', ['trimp_per_minute', 'one_hour_threshold_trimp'])
+HRProfile = namedtuple('HRProfile', ['max_hr', 'resting_hr', 'threshold_hr', 'gender'], defaults=['male'])
+
+def _trimp_constant(gender: str) -> float:
+    """Gender-specific constant of the TRIMP formula."""
+    return 1.92 if gender.lower() == 'male' else 1.67
+
+def _one_hour_threshold_trimp(max_hr: int, resting_hr: int, threshold_hr: int, k: float) -> float:
+    """TRIMP of 60 minutes at threshold HR, the 100-point HRSS benchmark."""
+    if max_hr > resting_hr:
+        threshold_hrr = (threshold_hr - resting_hr) / (max_hr - resting_hr)
+    else:
+        threshold_hrr = 0
+    return 60 * threshold_hrr * 0.64 * math.exp(k * threshold_hrr)
+
+@functools.lru_cache(maxsize=TRIMP_TABLE_CACHE_SIZE)
+def _cached_trimp_weight_table(max_hr: int, resting_hr: int, threshold_hr: int, gender: str) -> TrimpWeightTable:
+    k = _trimp_constant(gender)
+    hrr = np.maximum(0.0, (np.arange(LUT_MAX_BPM + 1) - resting_hr) / (max_hr - resting_hr))
+    trimp_per_minute = hrr * 0.64 * np.exp(k * hrr)
+    trimp_per_minute.flags.writeable = False  # Shared by every caller of the cache
+    return TrimpWeightTable(trimp_per_minute, _one_hour_threshold_trimp(max_hr, resting_hr, threshold_hr, k))
+
+def trimp_weight_table(max_hr: int, resting_hr: int, threshold_hr: int, gender: str = 'male') -> TrimpWeightTable:
+    """
+    Per-athlete TRIMP lookup table: the TRIMP of one minute at each integer
+    bpm from 0 to LUT_MAX_BPM, plus the one-hour threshold benchmark.
+    Tables are kept in an LRU cache keyed on the athlete's HR profile.
+    """
+    if np is None:
+        raise ImportError("trimp_weight_table requires NumPy.")
+    gender = 'male' if gender.lower() == 'male' else 'female'
+    cache_before = _cached_trimp_weight_table.cache_info() if instrumentation.active() else None
+    table = _cached_trimp_weight_table(max_hr, resting_hr, threshold_hr, gender)
+    instrumentation.cache_stats("hrss.trimp_table", _cached_trimp_weight_table, cache_before)
+    return table
+
+def bpm_histogram(heart_rates, durations=None):
+    """
+    Seconds spent at each integer bpm (index = bpm, length LUT_MAX_BPM + 1)
+    for integer readings in 0..LUT_MAX_BPM; durations default to 1 s each.
+    """
+    bpm = np.asarray(heart_rates).astype(np.intp)
+    return np.bincount(bpm, weights=durations, minlength=LUT_MAX_BPM + 1)
+
+def trimp_from_histogram(histogram_seconds, table: TrimpWeightTable) -> float:
+    """Activity TRIMP of a bpm_histogram: one dot product with the weight table."""
+    return float(np.dot(histogram_seconds, table.trimp_per_minute)) / 60.0
 
 def calculate_hrss(
     max_hr: int,
@@ -12,7 +79,8 @@ def calculate_hrss(
     Calculates the Heart Rate Stress Score (HRSS) for a given activity.
 
     This calculation is a simplification as it uses the average heart rate for the
-    entire activity rather than a second-by-second heart rate data stream.
+    entire activity rather than a second-by-second heart rate data stream; see
+    calculate_hrss_from_stream for recorded streams.
 
     Args:
         max_hr: The user's maximum heart rate.
@@ -77,6 +145,328 @@ def calculate_hrss(
         "hrss": round(hrss, 2)
     }
 
+class HRSSAccumulator:
+    """
+    Streaming HRSS over a heart rate recording fed in chunks.
+
+    Each sample's HR is held until the next sample, so its TRIMP is
+    dt_minutes * HRR * 0.64 * exp(k * HRR) with HRR clamped at 0. Gaps
+    longer than max_gap_seconds count as one nominal sample, as does the
+    final sample. Missing readings (NaN or non-positive HR) carry no load
+    and no time. Only the last sample of a chunk is held back (its duration
+    depends on the next timestamp), so memory stays bounded by the chunk
+    size however long the activity is.
+    """
+
+    def __init__(
+        self,
+        max_hr: int,
+        resting_hr: int,
+        threshold_hr: int,
+        gender: str = 'male',
+        sample_interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_SECONDS,
+        max_gap_seconds: float = DEFAULT_MAX_GAP_SECONDS
+    ) -> None:
+        if np is None:
+            raise ImportError("HRSSAccumulator requires NumPy.")
+        if resting_hr >= max_hr or resting_hr >= threshold_hr:
+            raise ValueError("Resting HR must be lower than Max HR and Threshold HR.")
+        self.max_hr = max_hr
+        self.resting_hr = resting_hr
+        self.threshold_hr = threshold_hr
+        self.k = _trimp_constant(gender)
+        self._table = trimp_weight_table(max_hr, resting_hr, threshold_hr, gender)
+        self.sample_interval_seconds = sample_interval_seconds
+        self.max_gap_seconds = max_gap_seconds
+
+        self.activity_trimp = 0.0
+        self.duration_seconds = 0.0
+        self._weighted_hr = 0.0
+        self._samples_seen = 0
+        self._pending: Optional[Tuple[float, float]] = None  # (heart rate, timestamp)
+
+    def _sample_sums(self, heart_rates, durations) -> Tuple[float, float, float]:
+        """
+        (TRIMP, seconds, HR * seconds) summed over samples with a valid reading.
+
+        Integer readings (what devices record) are counted into a bpm
+        histogram and scored with the cached weight table; only fractional
+        or out-of-range readings evaluate exp() per sample.
+        """
+        valid = np.isfinite(heart_rates) & (heart_rates > 0)
+        tabulated = valid & (heart_rates <= LUT_MAX_BPM) & (heart_rates == np.floor(heart_rates))
+        recorder = instrumentation.active()
+        if recorder is not None:
+            lut_samples = int(tabulated.sum())
+            recorder.count("hrss.samples", int(heart_rates.size))
+            recorder.count("hrss.lut_samples", lut_samples)
+            recorder.count("hrss.exp_samples", int(valid.sum()) - lut_samples)
+
+        histogram = bpm_histogram(heart_rates[tabulated], durations[tabulated])
+        trimp = trimp_from_histogram(histogram, self._table)
+        seconds = float(histogram.sum())
+        weighted_hr = float(np.dot(histogram, np.arange(histogram.size)))
+
+        if not tabulated.all():
+            others = valid & ~tabulated
+            heart_rates = heart_rates[others]
+            durations = durations[others]
+            hrr = np.maximum(0.0, (heart_rates - self.resting_hr) / (self.max_hr - self.resting_hr))
+            minutes = durations / 60.0
+            trimp += float(np.sum(minutes * hrr * 0.64 * np.exp(self.k * hrr)))
+            seconds += float(np.sum(durations))
+            weighted_hr += float(np.sum(heart_rates * durations))
+        return trimp, seconds, weighted_hr
+
+    def _add_samples(self, heart_rates, durations) -> None:
+        trimp, seconds, weighted_hr = self._sample_sums(heart_rates, durations)
+        self.activity_trimp += trimp
+        self.duration_seconds += seconds
+        self._weighted_hr += weighted_hr
+
+    def add(self, heart_rates: Iterable[float], timestamps: Optional[Iterable[float]] = None) -> None:
+        """
+        Adds the next chunk of samples.
+
+        Args:
+            heart_rates: HR readings in bpm.
+            timestamps: Matching times in seconds, increasing across chunks;
+                without them samples are sample_interval_seconds apart.
+        """
+        heart_rates = np.asarray(heart_rates, dtype=float).ravel()
+        if timestamps is None:
+            start = self._pending[1] + self.sample_interval_seconds if self._pending else 0.0
+            timestamps = start + self.sample_interval_seconds * np.arange(heart_rates.size)
+        else:
+            timestamps = np.asarray(timestamps, dtype=float).ravel()
+            if timestamps.size != heart_rates.size:
+                raise ValueError("heart_rates and timestamps must have the same length.")
+        if heart_rates.size == 0:
+            return
+        self._samples_seen += heart_rates.size
+
+        if self._pending is not None:
+            heart_rates = np.concatenate(([self._pending[0]], heart_rates))
+            timestamps = np.concatenate(([self._pending[1]], timestamps))
+
+        durations = np.diff(timestamps)
+        if np.any(durations < 0):
+            raise ValueError("Timestamps must not decrease.")
+        durations = np.where(durations > self.max_gap_seconds, self.sample_interval_seconds, durations)
+        self._add_samples(heart_rates[:-1], durations)
+        self._pending = (float(heart_rates[-1]), float(timestamps[-1]))
+
+    def result(self, round_digits: Optional[int] = 2) -> dict:
+        """
+        HRSS of everything added so far, with the last sample counted as
+        one nominal interval. Can be called at any point of the stream.
+        round_digits=None keeps full precision (otherwise avg_hr has one
+        decimal).
+        """
+        activity_trimp = self.activity_trimp
+        duration_seconds = self.duration_seconds
+        weighted_hr = self._weighted_hr
+        if self._pending is not None:
+            trimp, seconds, pending_weighted_hr = self._sample_sums(
+                np.array([self._pending[0]]), np.array([self.sample_interval_seconds]))
+            activity_trimp += trimp
+            duration_seconds += seconds
+            weighted_hr += pending_weighted_hr
+
+        one_hour_threshold_trimp = self._table.one_hour_threshold_trimp
+        hrss = (activity_trimp / one_hour_threshold_trimp) * 100 if one_hour_threshold_trimp > 0 else 0
+
+        def rounded(value, digits=round_digits):
+            return value if round_digits is None else round(value, digits)
+        return {
+            "activity_trimp": rounded(activity_trimp),
+            "one_hour_threshold_trimp": rounded(one_hour_threshold_trimp),
+            "hrss": rounded(hrss),
+            "duration_minutes": rounded(duration_seconds / 60),
+            "avg_hr": rounded(weighted_hr / duration_seconds, 1) if duration_seconds > 0 else 0,
+            "samples": self._samples_seen
+        }
+
+def calculate_hrss_from_stream(
+    max_hr: int,
+    resting_hr: int,
+    threshold_hr: int,
+    heart_rates: Iterable[float],
+    timestamps: Optional[Iterable[float]] = None,
+    gender: str = 'male',
+    sample_interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_SECONDS,
+    max_gap_seconds: float = DEFAULT_MAX_GAP_SECONDS
+) -> dict:
+    """
+    Calculates HRSS from a recorded heart rate stream, integrating TRIMP
+    sample by sample (vectorized with NumPy) instead of using the average HR.
+
+    Args:
+        max_hr, resting_hr, threshold_hr, gender: As for calculate_hrss.
+        heart_rates: HR samples in bpm, e.g. a 1 Hz device stream.
+        timestamps: Sample times in seconds; None for evenly spaced samples.
+        sample_interval_seconds: Nominal spacing of the samples.
+        max_gap_seconds: Longer gaps count as one nominal sample.
+
+    Returns:
+        The calculate_hrss dictionary plus the counted duration, the
+        time-weighted average HR and the number of samples.
+    """
+    accumulator = HRSSAccumulator(max_hr, resting_hr, threshold_hr, gender,
+                                  sample_interval_seconds, max_gap_seconds)
+    accumulator.add(heart_rates, timestamps)
+    return accumulator.result()
+
+def calculate_hrss_from_chunks(
+    max_hr: int,
+    resting_hr: int,
+    threshold_hr: int,
+    chunks: Iterable[Tuple[Iterable[float], Optional[Iterable[float]]]],
+    gender: str = 'male',
+    sample_interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_SECONDS,
+    max_gap_seconds: float = DEFAULT_MAX_GAP_SECONDS
+) -> dict:
+    """
+    calculate_hrss_from_stream for recordings too long to hold in memory.
+
+    Args:
+        chunks: Iterable of (heart_rates, timestamps) pieces of the stream, in
+            order; timestamps may be None for evenly spaced samples.
+    """
+    accumulator = HRSSAccumulator(max_hr, resting_hr, threshold_hr, gender,
+                                  sample_interval_seconds, max_gap_seconds)
+    for heart_rates, timestamps in chunks:
+        accumulator.add(heart_rates, timestamps)
+    return accumulator.result()
+
+def _as_hr_profile(value, profile_id) -> HRProfile:
+    """An HRProfile from an HRProfile, a matching tuple/list or a mapping of its fields."""
+    if isinstance(value, Mapping):
+        try:
+            return HRProfile(**value)
+        except TypeError as e:
+            raise TypeError(f"Profile {profile_id!r}: {e}") from None
+    if isinstance(value, (tuple, list)):
+        return HRProfile(*value)
+    raise TypeError(f"Profile {profile_id!r} must be an HRProfile, a matching tuple or a mapping, "
+                    f"not {type(value).__name__}")
+
+def _profile_arrays(profiles: Mapping, profile_ids) -> Tuple:
+    """
+    Validates each referenced profile once and gathers its constants.
+
+    Returns (activity index -> unique profile index, then per unique profile:
+    resting HR, HR reserve, TRIMP constant, one-hour threshold TRIMP and the
+    weight tables).
+    """
+    unique_ids, profile_index = np.unique(np.asarray(profile_ids), return_inverse=True)
+    resting, reserve, k, threshold_trimp, tables = [], [], [], [], []
+    for profile_id in unique_ids.tolist():
+        try:
+            profile = _as_hr_profile(profiles[profile_id], profile_id)
+        except KeyError:
+            raise ValueError(f"Unknown HR profile: {profile_id!r}")
+        if profile.resting_hr >= profile.max_hr or profile.resting_hr >= profile.threshold_hr:
+            raise ValueError(f"Profile {profile_id!r}: Resting HR must be lower than Max HR and Threshold HR.")
+        table = trimp_weight_table(*profile)
+        resting.append(profile.resting_hr)
+        reserve.append(profile.max_hr - profile.resting_hr)
+        k.append(_trimp_constant(profile.gender))
+        threshold_trimp.append(table.one_hour_threshold_trimp)
+        tables.append(table.trimp_per_minute)
+    return (profile_index.ravel(), np.array(resting, dtype=float), np.array(reserve, dtype=float),
+            np.array(k), np.array(threshold_trimp), np.stack(tables))
+
+def calculate_hrss_batch(
+    profiles: Mapping,
+    profile_ids: Sequence,
+    durations_minutes: Optional[Sequence[float]] = None,
+    avg_hrs: Optional[Sequence[float]] = None,
+    stream_heart_rates: Optional[Sequence[float]] = None,
+    stream_offsets: Optional[Sequence[int]] = None,
+    sample_interval_seconds: float = DEFAULT_SAMPLE_INTERVAL_SECONDS,
+    round_digits: Optional[int] = None
+) -> dict:
+    """
+    HRSS for many activities at once, from columnar arrays.
+
+    Each activity is described either by its duration and average HR (as in
+    calculate_hrss) or by a slice of one concatenated HR stream: activity i
+    owns stream_heart_rates[stream_offsets[i]:stream_offsets[i + 1]], evenly
+    spaced sample_interval_seconds apart. Profiles are validated and their
+    threshold TRIMP computed once per distinct profile, and all activities
+    are then scored in one vectorized pass (integer stream readings through
+    the cached weight tables).
+
+    Args:
+        profiles: Mapping of profile id -> HRProfile (or a matching tuple,
+            or a mapping of its fields).
+        profile_ids: Profile id of each activity.
+        durations_minutes, avg_hrs: Columns for the average-HR mode.
+        stream_heart_rates, stream_offsets: Columns for the stream mode
+            (len(stream_offsets) == number of activities + 1).
+        round_digits: Round the results like calculate_hrss does (2);
+            None keeps full precision, e.g. to feed the load engine.
+
+    Returns:
+        Dictionary of arrays: activity_trimp, one_hour_threshold_trimp, hrss.
+    """
+    if np is None:
+        raise ImportError("calculate_hrss_batch requires NumPy.")
+    profile_index, resting, reserve, k, threshold_trimp, tables = _profile_arrays(profiles, profile_ids)
+    n_activities = profile_index.size
+
+    if avg_hrs is not None:
+        if durations_minutes is None or stream_heart_rates is not None:
+            raise ValueError("Pass durations_minutes with avg_hrs, or a stream with offsets, not both.")
+        durations_minutes = np.asarray(durations_minutes, dtype=float)
+        avg_hrs = np.asarray(avg_hrs, dtype=float)
+        if durations_minutes.shape != (n_activities,) or avg_hrs.shape != (n_activities,):
+            raise ValueError("Every column must have one entry per activity.")
+        hrr = np.maximum(0.0, (avg_hrs - resting[profile_index]) / reserve[profile_index])
+        activity_trimp = durations_minutes * hrr * 0.64 * np.exp(k[profile_index] * hrr)
+
+    elif stream_heart_rates is not None and stream_offsets is not None:
+        heart_rates = np.asarray(stream_heart_rates, dtype=float)
+        stream_offsets = np.asarray(stream_offsets, dtype=np.intp)
+        if stream_offsets.shape != (n_activities + 1,) or stream_offsets[-1] != heart_rates.size:
+            raise ValueError("stream_offsets must hold n_activities + 1 offsets ending at the stream length.")
+        lengths = np.diff(stream_offsets)
+        if np.any(lengths < 0):
+            raise ValueError("stream_offsets must not decrease.")
+        activity_of_sample = np.repeat(np.arange(n_activities), lengths)
+        sample_profile = profile_index[activity_of_sample]
+
+        valid = np.isfinite(heart_rates) & (heart_rates > 0)
+        tabulated = valid & (heart_rates <= LUT_MAX_BPM) & (heart_rates == np.floor(heart_rates))
+        trimp_per_minute = np.zeros(heart_rates.size)
+        trimp_per_minute[tabulated] = tables[sample_profile[tabulated], heart_rates[tabulated].astype(np.intp)]
+        others = valid & ~tabulated
+        if others.any():
+            hrr = np.maximum(0.0, (heart_rates[others] - resting[sample_profile[others]]) / reserve[sample_profile[others]])
+            trimp_per_minute[others] = hrr * 0.64 * np.exp(k[sample_profile[others]] * hrr)
+        activity_trimp = np.bincount(activity_of_sample, weights=trimp_per_minute,
+                                     minlength=n_activities) * (sample_interval_seconds / 60.0)
+    else:
+        raise ValueError("Pass either durations_minutes and avg_hrs, or stream_heart_rates and stream_offsets.")
+
+    one_hour_threshold_trimp = threshold_trimp[profile_index]
+    positive = one_hour_threshold_trimp > 0
+    hrss = np.zeros(n_activities)
+    hrss[positive] = activity_trimp[positive] / one_hour_threshold_trimp[positive] * 100
+
+    results = {
+        "activity_trimp": activity_trimp,
+        "one_hour_threshold_trimp": one_hour_threshold_trimp,
+        "hrss": hrss
+    }
+    if round_digits is not None:
+        results = {name: np.round(values, round_digits) for name, values in results.items()}
+    instrumentation.count("hrss.batch_activities", n_activities)
+    if stream_heart_rates is not None:
+        instrumentation.count("hrss.samples", int(heart_rates.size))
+    return results
+
 def get_user_input():
     """Prompts the user for required data and validates it."""
     inputs = {}
@@ -0,0 +1,147 @@
+# filename: instrumentation.py
+
+"""
+Opt-in counters, timers and events for the hot paths of the fitness scripts.
+
+Nothing is recorded unless a Recorder is active:
+
+    with instrumentation.record() as recorder:
+        calculate_days_to_target_ctl(...)
+    print(recorder.to_json())
+
+Instrumented code calls count/add_time/event (or uses timer/timed). When no
+recorder is active these return after a single context-variable lookup, and
+hot loops report their totals once per call rather than once per day, so
+the overhead is negligible when instrumentation is off. The active recorder
+is held in a ContextVar, so threads and asyncio tasks each see their own.
+Worker processes of a process pool record nothing unless they open a
+recorder themselves.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import time
+
+DEFAULT_MAX_EVENTS = 1000
+
+_active = contextvars.ContextVar('fitness_instrumentation_recorder', default=None)
+
+class Recorder:
+    """
+    Accumulates counters (name -> number), timers (name -> calls, total and
+    max seconds) and structured events such as a simulation giving up.
+    Events beyond max_events are counted but not kept.
+    """
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        self.counters = {}
+        self.timers = {}
+        self.events = []
+        self.max_events = max_events
+        self.dropped_events = 0
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = {"calls": 1, "total_seconds": seconds, "max_seconds": seconds}
+        else:
+            timer["calls"] += 1
+            timer["total_seconds"] += seconds
+            if seconds > timer["max_seconds"]:
+                timer["max_seconds"] = seconds
+
+    def event(self, name, **fields):
+        if len(self.events) < self.max_events:
+            self.events.append({"event": name, "time": time.time(), **fields})
+        else:
+            self.dropped_events += 1
+
+    def to_dict(self):
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "timers": {name: dict(timer) for name, timer in sorted(self.timers.items())},
+            "events": list(self.events),
+            "dropped_events": self.dropped_events,
+        }
+
+    def to_json(self, **json_options):
+        return json.dumps(self.to_dict(), **json_options)
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+@contextlib.contextmanager
+def record(recorder=None):
+    """Activates a Recorder (a new one by default) for the enclosed block and yields it."""
+    recorder = recorder if recorder is not None else Recorder()
+    token = _active.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _active.reset(token)
+
+def active():
+    """The active Recorder, or None when instrumentation is off."""
+    return _active.get()
+
+def count(name, value=1):
+    recorder = _active.get()
+    if recorder is not None:
+        recorder.count(name, value)
+
+def add_time(name, seconds):
+    recorder = _active.get()
+    if recorder is not None:
+        recorder.add_time(name, seconds)
+
+def event(name, **fields):
+    recorder = _active.get()
+    if recorder is not None:
+        recorder.event(name, **fields)
+
+@contextlib.contextmanager
+def timer(name):
+    """Times the enclosed block under `name` when a recorder is active."""
+    recorder = _active.get()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add_time(name, time.perf_counter() - start)
+
+def timed(name):
+    """Decorator form of timer(); the wrapped function runs untouched when off."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _active.get()
+            if recorder is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.add_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def cache_stats(name, cached_function, before):
+    """
+    Records the hits and misses of a functools.lru_cache'd function since
+    `before` (its earlier cache_info()) as `<name>.cache_hits/_misses`.
+    """
+    recorder = _active.get()
+    if recorder is None or before is None:
+        return
+    after = cached_function.cache_info()
+    recorder.count(f"{name}.cache_hits", after.hits - before.hits)
+    recorder.count(f"{name}.cache_misses", after.misses - before.misses)
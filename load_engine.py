@@ -0,0 +1,199 @@
+# filename: load_engine.py
+
+"""
+CTL/ATL/TSB/Shape from an actual daily TSS history.
+
+compute_load_series runs the kc/ka recurrence used throughout fitness.py
+over whole TSS arrays (one athlete, or thousands stacked as rows) in a
+single vectorized pass. LoadState keeps one athlete's running CTL/ATL so a
+new day's load is folded in with append_day in O(1), instead of
+recomputing the history every time an activity arrives.
+compute_load_series_truncated is the bulk-recomputation variant: it keeps
+only the days that contribute meaningfully (the truncated kernel from
+contribution_analyzer.ewma_weights) and convolves with it by FFT.
+"""
+
+import math
+from collections import namedtuple
+
+import instrumentation
+from contribution_analyzer import ewma_weights
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by compute_load_series
+    np = None
+
+DEFAULT_CTL_DAYS = 42
+DEFAULT_ATL_DAYS = 7
+DEFAULT_BLOCK_SIZE = 64
+# Days contributing less than this percentage are dropped by the truncated engine
+DEFAULT_CUTOFF_PCT = 0.001
+
+LoadPoint = namedtuple('LoadPoint', ['day', 'tss', 'ctl', 'atl', 'tsb', 'shape'])
+LoadSeries = namedtuple('LoadSeries', ['ctl', 'atl', 'tsb', 'shape'])
+
+class LoadState:
+    """
+    Running CTL/ATL for one athlete.
+
+    Each append_day applies the same update as the simulations in
+    fitness.py (load = load * (N-1)/N + tss / N), so feeding it a history
+    day by day reproduces compute_load_series (up to rounding).
+    """
+
+    def __init__(self, ctl=0.0, atl=0.0, ctl_days=DEFAULT_CTL_DAYS, atl_days=DEFAULT_ATL_DAYS, day=0):
+        if ctl_days < 1 or atl_days < 1:
+            raise ValueError("CTL and ATL periods must be at least 1 day")
+        self.ctl = float(ctl)
+        self.atl = float(atl)
+        self.ctl_days = ctl_days
+        self.atl_days = atl_days
+        self.day = day
+        self._kc = (ctl_days - 1) / ctl_days
+        self._ka = (atl_days - 1) / atl_days
+
+    @classmethod
+    def from_history(cls, tss_history, ctl_initial=0.0, atl_initial=0.0,
+                     ctl_days=DEFAULT_CTL_DAYS, atl_days=DEFAULT_ATL_DAYS):
+        """State at the end of a daily TSS history, ready for further appends."""
+        state = cls(ctl_initial, atl_initial, ctl_days, atl_days)
+        for tss in tss_history:
+            state.append_day(tss)
+        return state
+
+    @property
+    def tsb(self):
+        return self.ctl - self.atl
+
+    @property
+    def shape(self):
+        return (2 * self.ctl) - self.atl
+
+    def append_day(self, tss):
+        """Folds in the next day's TSS (0 for a rest day). Returns that day's LoadPoint."""
+        self.ctl = (self.ctl * self._kc) + (tss * (1 / self.ctl_days))
+        self.atl = (self.atl * self._ka) + (tss * (1 / self.atl_days))
+        self.day += 1
+        return LoadPoint(self.day, tss, self.ctl, self.atl, self.tsb, self.shape)
+
+    def append_days(self, tss_values):
+        """append_day for each value in turn. Returns the list of LoadPoints."""
+        return [self.append_day(tss) for tss in tss_values]
+
+    def copy(self):
+        return LoadState(self.ctl, self.atl, self.ctl_days, self.atl_days, self.day)
+
+    def __repr__(self):
+        return (f"LoadState(ctl={self.ctl:.2f}, atl={self.atl:.2f}, ctl_days={self.ctl_days}, "
+                f"atl_days={self.atl_days}, day={self.day})")
+
+def _ewma_scan(tss, period, initial, block_size):
+    """
+    load[t] = load[t-1] * (N-1)/N + tss[t] / N along the last axis of a 2-D array.
+
+    The days are cut into blocks: one matrix product gives every block's
+    response starting from zero load, and the carried-in load of each block
+    then only adds `initial * k**(j+1)`, so the sequential part is one
+    vectorized step per block rather than per day.
+    """
+    n_rows, n_days = tss.shape
+    if n_days == 0:
+        return np.empty((n_rows, 0))
+    block_size = min(block_size, n_days)
+    n_blocks = math.ceil(n_days / block_size)
+    decay = (period - 1) / period
+
+    # Zero padding at the end does not change the earlier days
+    padded = np.zeros((n_rows, n_blocks * block_size))
+    padded[:, :n_days] = tss
+    blocks = padded.reshape(n_rows, n_blocks, block_size)
+
+    lag = np.arange(block_size)[:, None] - np.arange(block_size)[None, :]
+    kernel = np.where(lag >= 0, decay ** np.maximum(lag, 0), 0.0) / period
+    responses = blocks @ kernel.T
+    carry_decay = decay ** np.arange(1, block_size + 1)
+
+    load = initial.astype(float).copy()
+    for block in range(n_blocks):
+        responses[:, block, :] += load[:, None] * carry_decay
+        load = responses[:, block, -1]
+    return responses.reshape(n_rows, -1)[:, :n_days]
+
+def compute_load_series(tss, ctl_initial=0.0, atl_initial=0.0, ctl_days=DEFAULT_CTL_DAYS,
+                        atl_days=DEFAULT_ATL_DAYS, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    CTL/ATL/TSB/Shape series for daily TSS histories.
+
+    Args:
+        tss: Daily TSS, shape (days,) for one athlete or (athletes, days).
+            Missing days must be filled with 0.
+        ctl_initial, atl_initial: Load before the first day; scalars or one
+            value per athlete.
+        ctl_days, atl_days: Model time constants, shared by all athletes.
+        block_size: Days per block of the vectorized scan.
+
+    Returns:
+        LoadSeries of arrays shaped like `tss`, each entry being the value
+        at the end of that day (the last column therefore seeds a LoadState
+        for incremental updates).
+    """
+    if np is None:
+        raise ImportError("compute_load_series requires NumPy.")
+    if ctl_days < 1 or atl_days < 1:
+        raise ValueError("CTL and ATL periods must be at least 1 day")
+
+    tss = np.asarray(tss, dtype=float)
+    if tss.ndim not in (1, 2):
+        raise ValueError("tss must have shape (days,) or (athletes, days)")
+    rows = np.atleast_2d(tss)
+    ctl_start = np.broadcast_to(np.asarray(ctl_initial, dtype=float), rows.shape[:1])
+    atl_start = np.broadcast_to(np.asarray(atl_initial, dtype=float), rows.shape[:1])
+
+    instrumentation.count("load_engine.athlete_days", rows.size)
+    ctl = _ewma_scan(rows, ctl_days, ctl_start, block_size).reshape(tss.shape)
+    atl = _ewma_scan(rows, atl_days, atl_start, block_size).reshape(tss.shape)
+    return LoadSeries(ctl, atl, ctl - atl, (2 * ctl) - atl)
+
+def _truncated_ewma(tss, period, initial, cutoff_pct):
+    """
+    FFT convolution of each row with the truncated EWMA kernel. The starting
+    load decays as initial * k**(t+1) and is added back exactly.
+    """
+    n_rows, n_days = tss.shape
+    kernel = np.asarray(ewma_weights(period, cutoff_pct))
+    if n_days == 0 or kernel.size == 0:
+        return np.zeros((n_rows, n_days))
+
+    n_fft = 1 << (n_days + kernel.size - 2).bit_length()
+    spectrum = np.fft.rfft(tss, n_fft, axis=-1) * np.fft.rfft(kernel, n_fft)
+    load = np.fft.irfft(spectrum, n_fft, axis=-1)[:, :n_days]
+    decay = (period - 1) / period
+    return load + initial[:, None] * decay ** np.arange(1, n_days + 1)
+
+def compute_load_series_truncated(tss, ctl_initial=0.0, atl_initial=0.0, ctl_days=DEFAULT_CTL_DAYS,
+                                  atl_days=DEFAULT_ATL_DAYS, cutoff_pct=DEFAULT_CUTOFF_PCT):
+    """
+    Approximate compute_load_series for bulk recomputation jobs.
+
+    Each day's load only counts the days contributing at least cutoff_pct
+    percent (see contribution_analyzer.ewma_contributions); the dropped tail
+    weighs ((N-1)/N)**L for a kernel of L days, e.g. about 0.04% of CTL for
+    42 days at the default cutoff. The convolution runs by FFT, so the cost
+    grows as n log n in the history length. Arguments and result are as for
+    compute_load_series; the periods must be at least 2 days.
+    """
+    if np is None:
+        raise ImportError("compute_load_series_truncated requires NumPy.")
+
+    tss = np.asarray(tss, dtype=float)
+    if tss.ndim not in (1, 2):
+        raise ValueError("tss must have shape (days,) or (athletes, days)")
+    rows = np.atleast_2d(tss)
+    ctl_start = np.broadcast_to(np.asarray(ctl_initial, dtype=float), rows.shape[:1])
+    atl_start = np.broadcast_to(np.asarray(atl_initial, dtype=float), rows.shape[:1])
+
+    instrumentation.count("load_engine.athlete_days_truncated", rows.size)
+    ctl = _truncated_ewma(rows, ctl_days, ctl_start, cutoff_pct).reshape(tss.shape)
+    atl = _truncated_ewma(rows, atl_days, atl_start, cutoff_pct).reshape(tss.shape)
+    return LoadSeries(ctl, atl, ctl - atl, (2 * ctl) - atl)
@@ -0,0 +1,205 @@
+# filename: load_kernels.py
+
+"""
+Day-by-day CTL/ATL kernels shared by fitness.py and progression_calibrator.py.
+
+The simulations that cannot be reduced to a closed form (the clamped,
+ALB-capped progressions) step the same recurrence one day at a time. The
+kernels below hold that loop once, written in the plain subset of Python
+that Numba compiles: scalar arguments and preallocated output buffers.
+
+Two backends run them:
+
+* 'python': the functions as written, on lists. Always available.
+* 'numba': the same functions compiled with numba.njit, on NumPy arrays.
+  Numba is imported and the kernels compiled on first use only, so
+  importing this module (and the scripts) stays fast.
+
+Each backend returns its output buffers as they are (lists or NumPy
+arrays, trimmed to the simulated days) rather than converting them;
+fitness converts them to lists before handing them on.
+
+KERNEL_BACKEND selects the default, 'python'. Compiling the Numba kernels
+costs about half a second per process, more than most single runs take,
+so Numba is opt-in: set 'numba', or 'auto' to use it when it is installed,
+for long-running processes and large batches. Both backends perform the
+same floating-point operations in the same order, so their results agree.
+"""
+
+import functools
+from collections import namedtuple
+
+# 'auto', 'python' or 'numba'
+KERNEL_BACKEND = 'python'
+
+MODE_TSB = 0
+MODE_RAMP_RATE = 1
+
+KernelBackend = namedtuple('KernelBackend', ['name', 'simulate_to_target', 'simulate_constant_tsb'])
+
+def _progression_kernel(ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode,
+                        tsb_final_target, alb_lower_bound, ramp_rate_per_week, max_days,
+                        ctl_out, atl_out, tss_out, alb_out):
+    """
+    Steps the fitness.py progression until CTL reaches ctl_final. Fills
+    ctl_out/atl_out (max_days + 1 entries, starting with the initial load)
+    and tss_out/alb_out (max_days). Returns the days needed, or -1.
+    """
+    c = ctl_days
+    a = atl_days
+    kc = (c - 1) / c
+    ka = (a - 1) / a
+    inv_c = 1 / c
+    inv_a = 1 / a
+    tsb_tss_multiplier = inv_c - inv_a
+    use_multiplier = abs(tsb_tss_multiplier) > 1e-9
+    ramp_tss_offset = (ramp_rate_per_week / 7) * c
+
+    ctl_current = ctl_initial
+    atl_current = atl_initial
+    ctl_out[0] = ctl_current
+    atl_out[0] = atl_current
+    building_ctl = ctl_final > ctl_current
+
+    for day in range(max_days):
+        if mode == MODE_TSB:
+            if use_multiplier:
+                numerator = tsb_final_target - (ctl_current * kc) + (atl_current * ka)
+                tss_needed = numerator / tsb_tss_multiplier
+            else:
+                tss_needed = atl_current
+            tss_cap_from_alb = atl_current - alb_lower_bound
+            if tss_cap_from_alb < tss_needed:
+                tss_needed = tss_cap_from_alb
+        else:
+            tss_needed = ctl_current + ramp_tss_offset
+        # Same as max(0, tss_needed), NaN included
+        if not tss_needed > 0:
+            tss_needed = 0.0
+
+        alb_out[day] = atl_current - tss_needed
+        tss_out[day] = tss_needed
+        atl_current = (atl_current * ka) + (tss_needed * inv_a)
+        ctl_current = (ctl_current * kc) + (tss_needed * inv_c)
+        ctl_out[day + 1] = ctl_current
+        atl_out[day + 1] = atl_current
+
+        if building_ctl:
+            if ctl_current >= ctl_final:
+                return day + 1
+        elif ctl_current <= ctl_final:
+            return day + 1
+    return -1
+
+def _constant_tsb_kernel(tsb_target, ctl_days, atl_days, start_ctl, num_weeks,
+                         weekly_tss_out, week_end_ctl_out):
+    """
+    Holds TSB at tsb_target for num_weeks weeks, starting from a CTL of
+    start_ctl already on target. Fills weekly_tss_out (num_weeks totals) and
+    week_end_ctl_out (the starting CTL, then CTL at the end of every week).
+    """
+    c = ctl_days
+    a = atl_days
+    kc = (c - 1) / c
+    ka = (a - 1) / a
+    inv_c = 1 / c
+    inv_a = 1 / a
+    tsb_tss_multiplier = inv_c - inv_a
+    use_multiplier = abs(tsb_tss_multiplier) > 1e-9
+
+    ctl_current = start_ctl
+    atl_current = ctl_current - tsb_target
+    week_end_ctl_out[0] = ctl_current
+
+    for week in range(num_weeks):
+        week_tss = 0.0
+        for _ in range(7):
+            if use_multiplier:
+                numerator = tsb_target - (ctl_current * kc) + (atl_current * ka)
+                tss_needed = numerator / tsb_tss_multiplier
+            else:
+                tss_needed = atl_current
+            if not tss_needed > 0:
+                tss_needed = 0.0
+
+            atl_current = (atl_current * ka) + (tss_needed * inv_a)
+            ctl_current = (ctl_current * kc) + (tss_needed * inv_c)
+            week_tss += tss_needed
+        weekly_tss_out[week] = week_tss
+        week_end_ctl_out[week + 1] = ctl_current
+
+def _python_simulate_to_target(ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode,
+                               tsb_final_target, alb_lower_bound, ramp_rate_per_week, max_days):
+    ctl_out = [0.0] * (max_days + 1)
+    atl_out = [0.0] * (max_days + 1)
+    tss_out = [0.0] * max_days
+    alb_out = [0.0] * max_days
+    days = _progression_kernel(ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode,
+                               tsb_final_target, alb_lower_bound, ramp_rate_per_week, max_days,
+                               ctl_out, atl_out, tss_out, alb_out)
+    simulated = max_days if days == -1 else days
+    del ctl_out[simulated + 1:], atl_out[simulated + 1:], tss_out[simulated:], alb_out[simulated:]
+    return days, ctl_out, atl_out, tss_out, alb_out
+
+def _python_simulate_constant_tsb(tsb_target, ctl_days, atl_days, start_ctl, num_weeks):
+    weekly_tss = [0.0] * num_weeks
+    week_end_ctl = [0.0] * (num_weeks + 1)
+    _constant_tsb_kernel(tsb_target, ctl_days, atl_days, start_ctl, num_weeks, weekly_tss, week_end_ctl)
+    return weekly_tss, week_end_ctl
+
+@functools.lru_cache(maxsize=None)
+def _numba_backend():
+    """Compiles the kernels with Numba (on first call only). Raises ImportError without Numba."""
+    import numba
+    import numpy as np
+
+    progression_kernel = numba.njit(cache=True)(_progression_kernel)
+    constant_tsb_kernel = numba.njit(cache=True)(_constant_tsb_kernel)
+
+    def simulate_to_target(ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode,
+                           tsb_final_target, alb_lower_bound, ramp_rate_per_week, max_days):
+        ctl_out = np.empty(max_days + 1)
+        atl_out = np.empty(max_days + 1)
+        tss_out = np.empty(max_days)
+        alb_out = np.empty(max_days)
+        days = progression_kernel(float(ctl_initial), float(atl_initial), float(ctl_final),
+                                  float(ctl_days), float(atl_days), mode, float(tsb_final_target),
+                                  float(alb_lower_bound), float(ramp_rate_per_week), max_days,
+                                  ctl_out, atl_out, tss_out, alb_out)
+        simulated = max_days if days == -1 else days
+        return days, ctl_out[:simulated + 1], atl_out[:simulated + 1], tss_out[:simulated], alb_out[:simulated]
+
+    def simulate_constant_tsb(tsb_target, ctl_days, atl_days, start_ctl, num_weeks):
+        weekly_tss = np.empty(num_weeks)
+        week_end_ctl = np.empty(num_weeks + 1)
+        constant_tsb_kernel(float(tsb_target), float(ctl_days), float(atl_days), float(start_ctl),
+                            num_weeks, weekly_tss, week_end_ctl)
+        return weekly_tss, week_end_ctl
+
+    return KernelBackend('numba', simulate_to_target, simulate_constant_tsb)
+
+PYTHON_BACKEND = KernelBackend('python', _python_simulate_to_target, _python_simulate_constant_tsb)
+
+@functools.lru_cache(maxsize=None)
+def _auto_backend():
+    # Cached so a missing Numba costs one failed import, not one per call
+    try:
+        return _numba_backend()
+    except ImportError:
+        return PYTHON_BACKEND
+
+def get_backend(name=None):
+    """
+    The kernel backend called `name` (defaults to KERNEL_BACKEND).
+
+    'auto' falls back to the pure Python kernels when Numba is not
+    installed; asking for 'numba' explicitly raises ImportError instead.
+    """
+    name = name or KERNEL_BACKEND
+    if name == 'python':
+        return PYTHON_BACKEND
+    if name == 'numba':
+        return _numba_backend()
+    if name == 'auto':
+        return _auto_backend()
+    raise ValueError(f"Unknown kernel backend: {name!r}")
@@ -0,0 +1,195 @@
+# filename: load_model.py
+
+"""
+Shared building blocks for the CTL/ATL training load model used by
+fitness.py and progression_calibrator.py.
+"""
+
+import math
+from collections import deque
+
+import instrumentation
+
+class LoadAggregator:
+    """
+    Incrementally aggregates a progression while it is being simulated.
+
+    Feed it one day at a time with add_day. Completed weeks (total TSS,
+    end-of-week CTL/ATL/TSB/Shape and the CTL ramp over the last 7 days)
+    are appended to `weeks`, and rolling TSS sums over the configured
+    windows are kept up to date, so summaries need neither a second pass
+    over the history nor slice copies. Call finish() once the simulation
+    ends to flush a trailing partial week.
+    """
+
+    def __init__(self, ctl_initial, atl_initial, windows=(7, 28, 42)):
+        self.windows = tuple(sorted(set(windows)))
+        self.weeks = []
+        self.day = 0
+        self.ctl = float(ctl_initial)
+        self.atl = float(atl_initial)
+        self._week_tss = 0
+        self._window_sums = {window: 0.0 for window in self.windows}
+        self._recent_tss = deque(maxlen=max(self.windows, default=1))
+        # CTL at the end of the last 8 days (today and 7 days prior)
+        self._recent_ctl = deque([self.ctl], maxlen=8)
+
+    def add_day(self, tss, ctl, atl):
+        """Records one simulated day: its TSS and the CTL/ATL at the end of it."""
+        self.day += 1
+        self.ctl = ctl
+        self.atl = atl
+        self._week_tss += tss
+        self._recent_ctl.append(ctl)
+
+        recent_tss = self._recent_tss
+        for window in self.windows:
+            if len(recent_tss) >= window:
+                self._window_sums[window] -= recent_tss[-window]
+            self._window_sums[window] += tss
+        recent_tss.append(tss)
+
+        if self.day % 7 == 0:
+            self._close_week()
+
+    def finish(self):
+        """Closes a trailing partial week, if any. Returns the list of weeks."""
+        if self.day % 7 != 0:
+            self._close_week()
+        return self.weeks
+
+    def rolling_totals(self):
+        """Total TSS over each rolling window, ending today."""
+        return dict(self._window_sums)
+
+    def rolling_averages(self):
+        """Average daily TSS over each rolling window (or the days so far, if fewer)."""
+        return {
+            window: (total / min(window, self.day) if self.day else 0.0)
+            for window, total in self._window_sums.items()
+        }
+
+    def _close_week(self):
+        day_start = (len(self.weeks) * 7) + 1
+        ctl_7_days_prior = self._recent_ctl[0]
+        self.weeks.append({
+            "week": len(self.weeks) + 1,
+            "day_start": day_start,
+            "day_end": self.day,
+            "total_tss": self._week_tss,
+            "ctl": self.ctl,
+            "atl": self.atl,
+            "tsb": self.ctl - self.atl,
+            "shape": (2 * self.ctl) - self.atl,
+            "ramp_rate": self.ctl - ctl_7_days_prior,
+        })
+        self._week_tss = 0
+
+def _counting(f, recorder, name):
+    """Wraps f so every evaluation is counted under `name`."""
+    def counted(x):
+        recorder.count(name)
+        return f(x)
+    return counted
+
+def brentq(f, lower, upper, xtol=1e-6, maxiter=100, f_lower=None, f_upper=None):
+    """
+    Finds a root of f in [lower, upper] with Brent's method.
+
+    f must change sign over the bracket. Each iteration takes an inverse
+    quadratic interpolation or secant step when it is safe and falls back
+    to bisection otherwise, so convergence is superlinear on smooth
+    functions but never slower than bisection. Already known end-point
+    values can be passed as f_lower/f_upper to save two evaluations.
+
+    Returns:
+        The root, to within xtol.
+    """
+    recorder = instrumentation.active()
+    if recorder is not None:
+        recorder.count("load_model.brentq_calls")
+        f = _counting(f, recorder, "load_model.brentq_evaluations")
+
+    x_prev, x_curr = lower, upper
+    f_prev = f(x_prev) if f_lower is None else f_lower
+    f_curr = f(x_curr) if f_upper is None else f_upper
+    if f_prev == 0:
+        return x_prev
+    if f_curr == 0:
+        return x_curr
+    if (f_prev > 0) == (f_curr > 0):
+        raise ValueError("brentq needs a bracket over which f changes sign.")
+
+    x_block, f_block = x_prev, f_prev
+    step_prev = step_curr = x_curr - x_prev
+
+    for _ in range(maxiter):
+        if (f_prev > 0) != (f_curr > 0):
+            x_block, f_block = x_prev, f_prev
+            step_prev = step_curr = x_curr - x_prev
+        if abs(f_block) < abs(f_curr):
+            x_prev, x_curr, x_block = x_curr, x_block, x_curr
+            f_prev, f_curr, f_block = f_curr, f_block, f_curr
+
+        delta = xtol / 2
+        step_bisect = (x_block - x_curr) / 2
+        if f_curr == 0 or abs(step_bisect) < delta:
+            return x_curr
+
+        if abs(step_prev) > delta and abs(f_curr) < abs(f_prev):
+            if x_prev == x_block:
+                # Secant step
+                step_try = -f_curr * (x_curr - x_prev) / (f_curr - f_prev)
+            else:
+                # Inverse quadratic interpolation
+                slope_prev = (f_prev - f_curr) / (x_prev - x_curr)
+                slope_block = (f_block - f_curr) / (x_block - x_curr)
+                step_try = -f_curr * (f_block * slope_block - f_prev * slope_prev) / \
+                    (slope_block * slope_prev * (f_block - f_prev))
+            if 2 * abs(step_try) < min(abs(step_prev), 3 * abs(step_bisect) - delta):
+                step_prev, step_curr = step_curr, step_try
+            else:
+                step_prev = step_curr = step_bisect
+        else:
+            step_prev = step_curr = step_bisect
+
+        x_prev, f_prev = x_curr, f_curr
+        if abs(step_curr) > delta:
+            x_curr += step_curr
+        else:
+            x_curr += math.copysign(delta, step_bisect)
+        f_curr = f(x_curr)
+
+    return x_curr
+
+def expand_bracket(f, lower, upper, limit_lower=-math.inf, limit_upper=math.inf, max_expansions=30):
+    """
+    Widens [lower, upper] until f changes sign over it.
+
+    The interval is doubled on the side whose end point has the smaller
+    |f|, without crossing the limits.
+
+    Returns:
+        (lower, upper, f_lower, f_upper), or None if no sign change was found.
+    """
+    recorder = instrumentation.active()
+    if recorder is not None:
+        f = _counting(f, recorder, "load_model.bracket_evaluations")
+
+    f_lower, f_upper = f(lower), f(upper)
+    for _ in range(max_expansions):
+        if (f_lower > 0) != (f_upper > 0) or f_lower == 0 or f_upper == 0:
+            return lower, upper, f_lower, f_upper
+        width = upper - lower
+        can_lower, can_upper = lower > limit_lower, upper < limit_upper
+        if not (can_lower or can_upper):
+            break
+        if can_lower and (abs(f_lower) < abs(f_upper) or not can_upper):
+            lower = max(limit_lower, lower - width)
+            f_lower = f(lower)
+        else:
+            upper = min(limit_upper, upper + width)
+            f_upper = f(upper)
+    if (f_lower > 0) != (f_upper > 0) or f_lower == 0 or f_upper == 0:
+        return lower, upper, f_lower, f_upper
+    return None
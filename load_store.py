@@ -0,0 +1,227 @@
+# filename: load_store.py
+
+"""
+Per-athlete TSS history with (CTL, ATL) checkpoints, for cheap retroactive edits.
+
+An AthleteLoadHistory keeps the daily TSS and a snapshot of the load every
+`checkpoint_interval` days, so the state on any day is at most one interval
+of replay away. Because the load recurrence is linear, changing an old day's
+TSS by `delta` shifts every later load by `delta / N * k**(days since)`;
+edits apply that correction to the later checkpoints and the current state
+instead of recomputing the history. LoadStore saves histories as one
+compact binary file per athlete.
+"""
+
+import os
+import re
+import struct
+from array import array
+
+import instrumentation
+from load_engine import DEFAULT_ATL_DAYS, DEFAULT_CTL_DAYS, LoadState
+
+DEFAULT_CHECKPOINT_INTERVAL = 28
+
+STORE_MAGIC = b'FLST'
+STORE_VERSION = 1
+# magic, version, ctl_days, atl_days, checkpoint interval, number of days,
+# then the daily TSS and the flattened (ctl, atl) checkpoints as doubles.
+HEADER_FORMAT = '<4sHxxIIIIdd'
+
+class AthleteLoadHistory:
+    """
+    Daily TSS plus checkpoints of one athlete's load.
+
+    Checkpoint j is the (CTL, ATL) at the end of day j * checkpoint_interval
+    - 1, checkpoint 0 being the starting load. Days are numbered from 0.
+    """
+
+    def __init__(self, ctl_initial=0.0, atl_initial=0.0, ctl_days=DEFAULT_CTL_DAYS,
+                 atl_days=DEFAULT_ATL_DAYS, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        if checkpoint_interval < 1:
+            raise ValueError("checkpoint_interval must be at least 1 day")
+        # The store packs the periods as integers
+        if not (float(ctl_days).is_integer() and float(atl_days).is_integer()):
+            raise ValueError(f"CTL and ATL periods must be whole days, got {ctl_days!r} and {atl_days!r}")
+        self.checkpoint_interval = checkpoint_interval
+        self.tss = array('d')
+        self.checkpoints = array('d', [float(ctl_initial), float(atl_initial)])
+        self.current = LoadState(ctl_initial, atl_initial, int(ctl_days), int(atl_days))
+
+    @property
+    def ctl_days(self):
+        return self.current.ctl_days
+
+    @property
+    def atl_days(self):
+        return self.current.atl_days
+
+    @property
+    def num_days(self):
+        return len(self.tss)
+
+    def _checkpoint_state(self, index):
+        day = index * self.checkpoint_interval
+        return LoadState(self.checkpoints[2 * index], self.checkpoints[2 * index + 1],
+                         self.ctl_days, self.atl_days, day)
+
+    def _check_day(self, day):
+        if not 0 <= day < len(self.tss):
+            raise IndexError(f"Day {day} is outside the history (0-{len(self.tss) - 1})")
+
+    def append_day(self, tss):
+        """Adds the next day's TSS in O(1). Returns that day's LoadPoint."""
+        self.tss.append(tss)
+        point = self.current.append_day(tss)
+        if len(self.tss) % self.checkpoint_interval == 0:
+            self.checkpoints.extend((self.current.ctl, self.current.atl))
+        return point
+
+    def state_on(self, day):
+        """LoadPoint at the end of `day`, replayed from the nearest earlier checkpoint."""
+        self._check_day(day)
+        state = self._checkpoint_state(day // self.checkpoint_interval)
+        point = None
+        for past_day in range(state.day, day + 1):
+            point = state.append_day(self.tss[past_day])
+        return point._replace(day=day)
+
+    def series(self, start=0, stop=None):
+        """LoadPoints for days start..stop-1, replaying from the checkpoint before `start`."""
+        stop = len(self.tss) if stop is None else min(stop, len(self.tss))
+        if start >= stop:
+            return []
+        self._check_day(start)
+        state = self._checkpoint_state(start // self.checkpoint_interval)
+        points = []
+        for day in range(state.day, stop):
+            point = state.append_day(self.tss[day])
+            if day >= start:
+                points.append(point._replace(day=day))
+        return points
+
+    def set_tss(self, day, tss):
+        """
+        Replaces the TSS of an existing day (0 deletes its load) and corrects
+        every later checkpoint and the current state in closed form.
+        """
+        self._check_day(day)
+        delta = tss - self.tss[day]
+        if delta == 0:
+            return
+        self.tss[day] = tss
+
+        kc, ka = self.current._kc, self.current._ka
+        ctl_step, atl_step = delta / self.ctl_days, delta / self.atl_days
+        first_later = day // self.checkpoint_interval + 1
+        instrumentation.count("load_store.corrections")
+        instrumentation.count("load_store.checkpoints_corrected", len(self.checkpoints) // 2 - first_later)
+        for index in range(first_later, len(self.checkpoints) // 2):
+            days_since = index * self.checkpoint_interval - 1 - day
+            self.checkpoints[2 * index] += ctl_step * kc ** days_since
+            self.checkpoints[2 * index + 1] += atl_step * ka ** days_since
+        days_since = len(self.tss) - 1 - day
+        self.current.ctl += ctl_step * kc ** days_since
+        self.current.atl += atl_step * ka ** days_since
+
+    def add_tss(self, day, tss):
+        """Adds load to an existing day, e.g. a late-uploaded second activity."""
+        self._check_day(day)
+        self.set_tss(day, self.tss[day] + tss)
+
+    def apply_edits(self, edits):
+        """
+        Applies many {day: new_tss} edits at once, e.g. a backfill.
+
+        Each closed-form correction touches every later checkpoint, so when
+        that adds up to more work than replaying the days after the earliest
+        edit, the new values are written and the tail is replayed instead.
+        """
+        if not edits:
+            return
+        for day in edits:
+            self._check_day(day)
+        earliest = min(edits)
+        later_checkpoints = len(self.checkpoints) // 2 - earliest // self.checkpoint_interval
+        if len(edits) * later_checkpoints <= len(self.tss) - earliest:
+            for day, tss in edits.items():
+                self.set_tss(day, tss)
+            return
+
+        instrumentation.count("load_store.bulk_replays")
+        for day, tss in edits.items():
+            self.tss[day] = tss
+        self.replay_from(earliest)
+
+    def replay_from(self, day=0):
+        """Recomputes the checkpoints and current state from the checkpoint before `day`."""
+        index = day // self.checkpoint_interval
+        del self.checkpoints[2 * (index + 1):]
+        state = self._checkpoint_state(index)
+        instrumentation.count("load_store.days_replayed", len(self.tss) - state.day)
+        for past_day in range(state.day, len(self.tss)):
+            state.append_day(self.tss[past_day])
+            if state.day % self.checkpoint_interval == 0:
+                self.checkpoints.extend((state.ctl, state.atl))
+        self.current = state
+
+    def to_bytes(self):
+        header = struct.pack(HEADER_FORMAT, STORE_MAGIC, STORE_VERSION, self.ctl_days, self.atl_days,
+                             self.checkpoint_interval, len(self.tss), self.checkpoints[0], self.checkpoints[1])
+        return header + self.tss.tobytes() + self.checkpoints.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        header_size = struct.calcsize(HEADER_FORMAT)
+        try:
+            (magic, version, ctl_days, atl_days, checkpoint_interval, num_days,
+             ctl_initial, atl_initial) = struct.unpack_from(HEADER_FORMAT, data, 0)
+        except struct.error:
+            raise ValueError("Not a load history file")
+        num_checkpoints = num_days // checkpoint_interval + 1
+        expected_size = header_size + 8 * (num_days + 2 * num_checkpoints)
+        if magic != STORE_MAGIC or version != STORE_VERSION or len(data) != expected_size:
+            raise ValueError("Not a compatible load history file")
+
+        history = cls(ctl_initial, atl_initial, ctl_days, atl_days, checkpoint_interval)
+        values = array('d')
+        values.frombytes(data[header_size:])
+        history.tss = values[:num_days]
+        history.checkpoints = values[num_days:]
+        # The current state is one partial interval past the last checkpoint
+        state = history._checkpoint_state(num_checkpoints - 1)
+        for day in range(state.day, num_days):
+            state.append_day(history.tss[day])
+        history.current = state
+        return history
+
+class LoadStore:
+    """Directory of AthleteLoadHistory files, one `<athlete_id>.load` per athlete."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, athlete_id):
+        athlete_id = str(athlete_id)
+        if not re.fullmatch(r'[A-Za-z0-9_.-]+', athlete_id) or athlete_id.startswith('.'):
+            raise ValueError(f"Invalid athlete id: {athlete_id!r}")
+        return os.path.join(self.directory, athlete_id + '.load')
+
+    def __contains__(self, athlete_id):
+        return os.path.exists(self._path(athlete_id))
+
+    def load(self, athlete_id, **new_history_options):
+        """The athlete's saved history, or a new empty one built with the given options."""
+        try:
+            with open(self._path(athlete_id), 'rb') as f:
+                return AthleteLoadHistory.from_bytes(f.read())
+        except FileNotFoundError:
+            return AthleteLoadHistory(**new_history_options)
+
+    def save(self, athlete_id, history):
+        path = self._path(athlete_id)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(history.to_bytes())
+        os.replace(temp_path, path)
@@ -0,0 +1,214 @@
+# filename: plan_robustness.py
+
+"""
+Monte Carlo robustness of a days-to-target training plan.
+
+calculate_days_to_target_ctl prescribes a TSS for every day assuming it is
+hit exactly. Here the plan is replayed by thousands of simulated athletes
+who skip a day with probability skip_probability and otherwise land within
+a relative tss_noise (standard deviation) of the prescribed TSS. Once the
+plan runs out they keep training at its last day's TSS, up to max_days.
+
+Trajectories are simulated a chunk at a time: each chunk draws its
+(chunk_size x days) TSS matrix from the seeded RNG, runs it through
+load_engine.compute_load_series and keeps only three numbers per
+trajectory (days to target, peak ATL and minimum TSB, both measured up to
+the day the target is reached), so memory stays bounded by the chunk size.
+
+    python plan_robustness.py --ctl-initial 50 --atl-initial 50 --ctl-final 80 \\
+        --tsb-final-target -10 --trajectories 100000 --skip-probability 0.15
+"""
+
+import argparse
+from collections import namedtuple
+
+import instrumentation
+from fitness import calculate_days_to_target_ctl
+from load_engine import DEFAULT_ATL_DAYS, DEFAULT_CTL_DAYS, compute_load_series
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is required for the simulation itself
+    np = None
+
+DEFAULT_TRAJECTORIES = 10000
+DEFAULT_CHUNK_SIZE = 4096
+DEFAULT_SKIP_PROBABILITY = 0.1
+DEFAULT_TSS_NOISE = 0.1
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Per-trajectory results; days_to_target is -1 where the target was not reached
+RobustnessResult = namedtuple('RobustnessResult', ['plan_days', 'max_days', 'days_to_target', 'peak_atl', 'min_tsb'])
+
+def iter_trajectory_chunks(planned_tss, ctl_initial, atl_initial, ctl_final,
+                           ctl_days=DEFAULT_CTL_DAYS, atl_days=DEFAULT_ATL_DAYS,
+                           n_trajectories=DEFAULT_TRAJECTORIES, skip_probability=DEFAULT_SKIP_PROBABILITY,
+                           tss_noise=DEFAULT_TSS_NOISE, max_days=None, seed=None,
+                           chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Simulates stochastic executions of a plan, one chunk at a time.
+
+    Args:
+        planned_tss: The prescribed daily TSS (e.g. the tss history of
+            calculate_days_to_target_ctl).
+        skip_probability: Chance of missing any given day (0 TSS).
+        tss_noise: Standard deviation of the executed TSS relative to the
+            prescription (0.1 = +/-10%); executed TSS never goes below 0.
+        max_days: Days simulated per trajectory (default: twice the plan).
+        seed: RNG seed; runs with the same seed and chunk_size repeat exactly.
+
+    Yields:
+        (days_to_target, peak_atl, min_tsb) arrays for each chunk.
+    """
+    if np is None:
+        raise ImportError("iter_trajectory_chunks requires NumPy.")
+    if not 0 <= skip_probability <= 1:
+        raise ValueError("skip_probability must be between 0 and 1")
+    if tss_noise < 0:
+        raise ValueError("tss_noise cannot be negative")
+
+    planned_tss = np.asarray(planned_tss, dtype=float)
+    max_days = 2 * planned_tss.size if max_days is None else max_days
+    if max_days < 1:
+        raise ValueError("The plan must have at least one day")
+    # After the plan ends, the athlete keeps training at its last day's TSS
+    schedule = np.empty(max_days)
+    schedule[:min(max_days, planned_tss.size)] = planned_tss[:max_days]
+    schedule[planned_tss.size:] = planned_tss[-1] if planned_tss.size else 0.0
+
+    direction = 1.0 if ctl_final > ctl_initial else -1.0
+    n_chunks = -(-n_trajectories // chunk_size)
+    for chunk, chunk_seed in enumerate(np.random.SeedSequence(seed).spawn(n_chunks)):
+        rng = np.random.default_rng(chunk_seed)
+        rows = min(chunk_size, n_trajectories - chunk * chunk_size)
+
+        factors = 1.0 + tss_noise * rng.standard_normal((rows, max_days))
+        np.maximum(factors, 0.0, out=factors)
+        factors[rng.random((rows, max_days)) < skip_probability] = 0.0
+        load = compute_load_series(schedule * factors, ctl_initial, atl_initial, ctl_days, atl_days)
+        del factors
+
+        reached_on = (load.ctl - ctl_final) * direction >= 0
+        reached = reached_on.any(axis=1)
+        first_day = np.where(reached, reached_on.argmax(axis=1), max_days - 1)
+        # Fatigue is measured over the build itself, up to the day the target is hit
+        in_build = np.arange(max_days)[None, :] <= first_day[:, None]
+        peak_atl = np.where(in_build, load.atl, -np.inf).max(axis=1)
+        min_tsb = np.where(in_build, load.tsb, np.inf).min(axis=1)
+        instrumentation.count("plan_robustness.trajectory_days", rows * max_days)
+        yield np.where(reached, first_day + 1, -1), peak_atl, min_tsb
+
+def simulate_plan_robustness(planned_tss, ctl_initial, atl_initial, ctl_final,
+                             ctl_days=DEFAULT_CTL_DAYS, atl_days=DEFAULT_ATL_DAYS, **options):
+    """
+    Runs iter_trajectory_chunks (same arguments) to completion.
+
+    Returns:
+        A RobustnessResult holding one entry per trajectory.
+    """
+    planned_days = len(planned_tss)
+    chunks = list(iter_trajectory_chunks(planned_tss, ctl_initial, atl_initial, ctl_final,
+                                         ctl_days, atl_days, **options))
+    max_days = options.get("max_days") or 2 * planned_days
+    if not chunks:
+        return RobustnessResult(planned_days, max_days, np.empty(0, dtype=int), np.empty(0), np.empty(0))
+    days, peak_atl, min_tsb = (np.concatenate(columns) for columns in zip(*chunks))
+    return RobustnessResult(planned_days, max_days, days, peak_atl, min_tsb)
+
+def plan_robustness(ctl_initial, atl_initial, ctl_final, ctl_days=DEFAULT_CTL_DAYS, atl_days=DEFAULT_ATL_DAYS,
+                    mode='tsb', tsb_final_target=None, alb_lower_bound=None, ramp_rate_per_week=None,
+                    **options):
+    """
+    Builds the plan with calculate_days_to_target_ctl and stress-tests it
+    with simulate_plan_robustness (options as for iter_trajectory_chunks).
+    """
+    days_needed, _, _, planned_tss, _ = calculate_days_to_target_ctl(
+        ctl_initial, atl_initial, ctl_final, ctl_days, atl_days, mode=mode,
+        tsb_final_target=tsb_final_target, alb_lower_bound=alb_lower_bound,
+        ramp_rate_per_week=ramp_rate_per_week
+    )
+    if days_needed <= 0:
+        raise ValueError("The plan never reaches the target CTL (or starts on it); there is nothing to test.")
+    return simulate_plan_robustness(planned_tss, ctl_initial, atl_initial, ctl_final,
+                                    ctl_days, atl_days, **options)
+
+def summarize_robustness(result, percentiles=DEFAULT_PERCENTILES):
+    """
+    Distribution summary of a RobustnessResult: the chance of reaching the
+    target by the end of the plan and at all, and the percentiles of days
+    to target (over the trajectories that reached it), peak ATL and minimum TSB.
+    """
+    reached = result.days_to_target != -1
+    n_trajectories = result.days_to_target.size
+
+    def distribution(values):
+        if values.size == 0:
+            return None
+        quantiles = np.percentile(values, percentiles)
+        return {"mean": float(values.mean()),
+                **{f"p{percentile:g}": float(value) for percentile, value in zip(percentiles, quantiles)}}
+
+    return {
+        "trajectories": n_trajectories,
+        "plan_days": result.plan_days,
+        "max_days": result.max_days,
+        "p_reached_on_plan": float(np.mean(reached & (result.days_to_target <= result.plan_days))) if n_trajectories else 0.0,
+        "p_reached": float(np.mean(reached)) if n_trajectories else 0.0,
+        "days_to_target": distribution(result.days_to_target[reached]),
+        "peak_atl": distribution(result.peak_atl),
+        "min_tsb": distribution(result.min_tsb),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo robustness of a days-to-target plan against skipped days and TSS noise."
+    )
+    parser.add_argument("--ctl-initial", type=float, required=True)
+    parser.add_argument("--atl-initial", type=float, required=True)
+    parser.add_argument("--ctl-final", type=float, required=True)
+    parser.add_argument("--ctl-days", type=int, default=DEFAULT_CTL_DAYS)
+    parser.add_argument("--atl-days", type=int, default=DEFAULT_ATL_DAYS)
+    parser.add_argument("--tsb-final-target", type=float, help="TSB mode: the TSB to hold.")
+    parser.add_argument("--alb-lower-bound", type=float, default=-200.0, help="TSB mode: the ALB floor.")
+    parser.add_argument("--ramp-rate", type=float, help="Ramp rate mode: CTL gain per week.")
+    parser.add_argument("--trajectories", type=int, default=DEFAULT_TRAJECTORIES)
+    parser.add_argument("--skip-probability", type=float, default=DEFAULT_SKIP_PROBABILITY)
+    parser.add_argument("--tss-noise", type=float, default=DEFAULT_TSS_NOISE,
+                        help="Relative standard deviation of the executed TSS.")
+    parser.add_argument("--max-days", type=int, help="Days simulated per trajectory (default: twice the plan).")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if (args.tsb_final_target is None) == (args.ramp_rate is None):
+        parser.error("Give exactly one of --tsb-final-target or --ramp-rate.")
+    mode = 'tsb' if args.tsb_final_target is not None else 'ramp_rate'
+    try:
+        result = plan_robustness(
+            args.ctl_initial, args.atl_initial, args.ctl_final, args.ctl_days, args.atl_days,
+            mode=mode, tsb_final_target=args.tsb_final_target, alb_lower_bound=args.alb_lower_bound,
+            ramp_rate_per_week=args.ramp_rate, n_trajectories=args.trajectories,
+            skip_probability=args.skip_probability, tss_noise=args.tss_noise,
+            max_days=args.max_days, seed=args.seed, chunk_size=args.chunk_size
+        )
+    except ValueError as e:
+        parser.exit(1, f"Error: {e}\n")
+
+    summary = summarize_robustness(result)
+    print(f"Plan: {summary['plan_days']} days with perfect compliance; "
+          f"{summary['trajectories']} trajectories simulated over {summary['max_days']} days.")
+    print(f"Chance of reaching CTL {args.ctl_final:g} within the plan: {summary['p_reached_on_plan']:.1%}")
+    print(f"Chance of reaching it within {summary['max_days']} days:   {summary['p_reached']:.1%}")
+    print()
+    names = [name for name in summary["peak_atl"] if name != "mean"]
+    print(f"{'':<16} | {'Mean':>8} | " + " | ".join(f"{name:>8}" for name in names))
+    print("-" * (29 + 11 * len(names)))
+    for label, key in (("Days to target", "days_to_target"), ("Peak ATL", "peak_atl"), ("Minimum TSB", "min_tsb")):
+        stats = summary[key]
+        if stats is None:
+            print(f"{label:<16} | {'n/a':>8}")
+            continue
+        print(f"{label:<16} | {stats['mean']:>8.1f} | " + " | ".join(f"{stats[name]:>8.1f}" for name in names))
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,39 @@
 # filename: tsb-finder.py
 
+import functools
 import math
+from collections import namedtuple
 import platform
 import os
 
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by the cohort (batch) calibration
+    np = None
+
+import instrumentation
+import load_kernels
+from calibration_table import load_default_table
+from load_model import brentq, expand_bracket
+
+# Calibration block: 12 simulated weeks, metrics averaged over weeks 4-11
+NUM_WEEKS_SIMULATED = 12
+STABLE_PERIOD_START_WEEK = 4
+STABLE_PERIOD_END_WEEK = 11
+
+# TSB search: the default bracket (scanned for a sign change first) and the
+# limits it may be widened to
+DEFAULT_TSB_RANGE = (-100.0, 20.0)
+TSB_SEARCH_LIMIT = 1000.0
+
+# 'analytic' uses the closed-form metrics (falling back to the simulation
+# when the TSS clamp binds); 'simulate' always runs the day-by-day block.
+METRICS_ENGINE = 'analytic'
+
+Calibration = namedtuple('Calibration', [
+    'tsb', 'avg_weekly_tss_total', 'avg_ctl_ramp_rate', 'avg_weekly_tss_change', 'reachable'
+])
+
 def get_float_input(prompt_text):
     """
     Gets a float input from the user. Returns None if the user enters nothing.
@@ -17,66 +47,37 @@ def get_float_input(prompt_text):
         except ValueError:
             print("Invalid input. Please enter a numeric value or leave it blank.")
 
+@functools.lru_cache(maxsize=4096)
 def _simulate_and_get_metrics(tsb_target, ctl_days, atl_days, start_ctl=60.0):
     """
     Internal helper to simulate a block and return key metrics.
     
+    Results are cached on (tsb_target, ctl_days, atl_days, start_ctl).
+    
     Returns:
         - avg_weekly_tss_total: The average total TSS per week in a stable period.
         - avg_ctl_ramp_rate: The average weekly change in CTL.
         - avg_weekly_tss_change: The average weekly change in total TSS.
     """
-    ctl_current = start_ctl
-    atl_current = ctl_current - tsb_target 
-    
-    c = ctl_days
-    a = atl_days
-    kc = (c - 1) / c
-    ka = (a - 1) / a
-    tsb_tss_multiplier = (1/c) - (1/a)
-
-    weekly_tss_totals = []
-    daily_ctl_history = [ctl_current]
-    
-    num_days_to_simulate = 12 * 7 
-    current_week_tss = 0
+    weekly_tss_totals, week_end_ctl = load_kernels.get_backend().simulate_constant_tsb(
+        tsb_target, ctl_days, atl_days, start_ctl, NUM_WEEKS_SIMULATED
+    )
 
-    for day in range(1, num_days_to_simulate + 1):
-        if abs(tsb_tss_multiplier) > 1e-9:
-            numerator = tsb_target - (ctl_current * kc) + (atl_current * ka)
-            tss_needed = numerator / tsb_tss_multiplier
-        else:
-            tss_needed = atl_current
-
-        tss_needed = max(0, tss_needed)
-        current_week_tss += tss_needed
-        
-        atl_current = (atl_current * ka) + (tss_needed * (1/a))
-        ctl_current = (ctl_current * kc) + (tss_needed * (1/c))
-        daily_ctl_history.append(ctl_current)
-
-        if day % 7 == 0:
-            weekly_tss_totals.append(current_week_tss)
-            current_week_tss = 0
-            
     # --- Define Stable Period for Analysis ---
-    stable_period_start_week = 4
-    stable_period_end_week = 11
+    stable_period_start_week = STABLE_PERIOD_START_WEEK
+    stable_period_end_week = STABLE_PERIOD_END_WEEK
     
-    if len(daily_ctl_history) < stable_period_end_week * 7 or len(weekly_tss_totals) <= stable_period_start_week:
+    if len(weekly_tss_totals) < stable_period_end_week:
         return 0, 0, 0
 
     # --- Metric 1: Average Weekly CTL Ramp Rate ---
-    ctl_ramp_rates = []
-    for week_num in range(stable_period_start_week, stable_period_end_week + 1):
-        ctl_end = daily_ctl_history[week_num * 7]
-        ctl_start = daily_ctl_history[(week_num - 1) * 7]
-        ctl_ramp_rates.append(ctl_end - ctl_start)
+    ctl_ramp_rates = [week_end_ctl[week] - week_end_ctl[week - 1]
+                      for week in range(stable_period_start_week, stable_period_end_week + 1)]
     avg_ctl_ramp_rate = sum(ctl_ramp_rates) / len(ctl_ramp_rates) if ctl_ramp_rates else 0
     
     # --- Metric 2: Average Total Weekly TSS ---
     stable_weekly_tss = weekly_tss_totals[stable_period_start_week-1:stable_period_end_week]
-    avg_weekly_tss_total = sum(stable_weekly_tss) / len(stable_weekly_tss) if stable_weekly_tss else 0
+    avg_weekly_tss_total = sum(stable_weekly_tss) / len(stable_weekly_tss) if len(stable_weekly_tss) else 0
 
     # --- Metric 3: Average Weekly TSS Change (The Fix) ---
     tss_change_rates = []
@@ -87,31 +88,493 @@ def _simulate_and_get_metrics(tsb_target, ctl_days, atl_days, start_ctl=60.0):
 
     return avg_weekly_tss_total, avg_ctl_ramp_rate, avg_weekly_tss_change
 
-def _find_tsb_for_metric(target_value, metric_to_target, ctl_days, atl_days):
+def _analytic_metrics(tsb_target, ctl_days, atl_days, start_ctl=60.0):
     """
-    Generic binary search function to find the TSB for a given target metric.
+    Closed-form version of _simulate_and_get_metrics.
+
+    Holding TSB constant from a start that is already on target makes CTL a
+    straight line: daily TSS is CTL + tsb/(a*m) (m being the TSB multiplier)
+    and CTL rises by tsb/(a*c*m) per day. Weekly TSS totals therefore grow
+    linearly too, and all three metrics follow directly. With equal periods
+    TSS simply equals the (constant) ATL and CTL decays towards it.
+
+    Returns:
+        The same (avg_weekly_tss_total, avg_ctl_ramp_rate, avg_weekly_tss_change)
+        tuple, or None when the max(0, tss) clamp would bind during the block
+        and only the simulation describes it.
     """
-    print(f"\nSearching for TSB value that produces a target {metric_to_target} of {target_value:.1f}...")
-    
-    upper_bound_tsb, lower_bound_tsb = 20.0, -100.0
-
-    for i in range(15):
-        mid_tsb = (upper_bound_tsb + lower_bound_tsb) / 2
-        avg_tss_total, avg_ctl_ramp, avg_tss_change = _simulate_and_get_metrics(mid_tsb, ctl_days, atl_days)
-        
-        if metric_to_target == "CTL Ramp":
-            measured_value = avg_ctl_ramp
-        elif metric_to_target == "Weekly TSS Change":
-            measured_value = avg_tss_change
-        else: # Default to Total Weekly TSS
-            measured_value = avg_tss_total
-
-        if measured_value > target_value:
-            lower_bound_tsb = mid_tsb
+    c = ctl_days
+    a = atl_days
+    kc = (c - 1) / c
+    tsb_tss_multiplier = (1/c) - (1/a)
+    last_day = NUM_WEEKS_SIMULATED * 7 - 1
+    num_stable_weeks = STABLE_PERIOD_END_WEEK - STABLE_PERIOD_START_WEEK + 1
+
+    if abs(tsb_tss_multiplier) > 1e-9:
+        tss_offset = tsb_target / (a * tsb_tss_multiplier)
+        ctl_per_day = tsb_target / (a * c * tsb_tss_multiplier)
+        first_tss = start_ctl + tss_offset
+        if min(first_tss, first_tss + last_day * ctl_per_day) < 0:
+            return None
+
+        # Week w totals 7*first_tss + ctl_per_day * (49*(w-1) + 21)
+        mean_weeks_elapsed = (STABLE_PERIOD_START_WEEK + STABLE_PERIOD_END_WEEK) / 2 - 1
+        avg_weekly_tss_total = 7 * first_tss + ctl_per_day * (49 * mean_weeks_elapsed + 21)
+        return avg_weekly_tss_total, 7 * ctl_per_day, 49 * ctl_per_day
+
+    atl_constant = start_ctl - tsb_target
+    if atl_constant < 0:
+        return None
+    ctl_start = start_ctl + (atl_constant - start_ctl) * (1 - kc ** ((STABLE_PERIOD_START_WEEK - 1) * 7))
+    ctl_end = start_ctl + (atl_constant - start_ctl) * (1 - kc ** (STABLE_PERIOD_END_WEEK * 7))
+    return 7 * atl_constant, (ctl_end - ctl_start) / num_stable_weeks, 0.0
+
+def _get_metrics(tsb_target, ctl_days, atl_days, start_ctl=60.0, engine=None):
+    """
+    Calibration metrics for a constant TSB from the selected engine.
+
+    engine is 'analytic' or 'simulate' (defaults to METRICS_ENGINE). The
+    analytic engine falls back to the simulation whenever the clamp binds.
+    """
+    engine = engine or METRICS_ENGINE
+    if engine == 'analytic':
+        metrics = _analytic_metrics(tsb_target, ctl_days, atl_days, start_ctl)
+        if metrics is not None:
+            return metrics
+        instrumentation.count("calibrator.analytic_fallbacks")
+    elif engine != 'simulate':
+        raise ValueError(f"Unknown metrics engine: {engine!r}")
+    return _simulate_and_get_metrics(tsb_target, ctl_days, atl_days, start_ctl)
+
+def _metric_index(metric_to_target):
+    """Position of the requested metric in a _simulate_and_get_metrics result."""
+    if metric_to_target == "CTL Ramp":
+        return 1
+    elif metric_to_target == "Weekly TSS Change":
+        return 2
+    else: # Default to Total Weekly TSS
+        return 0
+
+def _metric_value(metrics, metric_to_target):
+    """Picks the requested metric out of a _simulate_and_get_metrics result."""
+    return metrics[_metric_index(metric_to_target)]
+
+def _find_tsb_for_metric(target_value, metric_to_target, ctl_days, atl_days, tolerance=1e-3, engine=None):
+    """
+    Finds the TSB that produces a given target metric.
+
+    Without the TSS clamp every metric is an affine function of TSB, so with
+    the analytic engine (the default) the answer is first solved for
+    directly from two evaluations and accepted if the clamp stays inactive
+    there. Otherwise the root is bracketed and located with Brent's method
+    to within `tolerance` TSB points. With the analytic engine, pairs
+    covered by the precomputed calibration table (see calibration_table.py)
+    take their bracket from the table's grid segment, once the live metric
+    confirms the target lies within it. Elsewhere, since the metrics are not
+    monotone where the clamp binds, [-100, 20] is first scanned for a sign
+    change (see _range_scan_points) and only widened (up to +/-1000) when
+    it holds none. A target no TSB reaches gets the closest TSB evaluated.
+    Returns (tsb, reachable), reachable being False in that last case.
+    Simulations are served from the _simulate_and_get_metrics cache, so
+    re-simulating the winning TSB or repeating a calibration costs nothing.
+    """
+    engine = engine or METRICS_ENGINE
+
+    def metric_error(tsb):
+        return _metric_value(_get_metrics(tsb, ctl_days, atl_days, engine=engine), metric_to_target) - target_value
+
+    if engine == 'analytic':
+        tsb = _solve_affine_metric(target_value, metric_to_target, ctl_days, atl_days)
+        if tsb is not None:
+            instrumentation.count("calibrator.affine_solves")
+            return tsb, True
+
+    cache_before = _simulate_and_get_metrics.cache_info() if instrumentation.active() else None
+    evaluated = {}
+
+    def recorded_error(tsb):
+        evaluated[tsb] = metric_error(tsb)
+        return evaluated[tsb]
+
+    try:
+        bracket = None
+        if engine == 'analytic':
+            bracket = _table_bracket(recorded_error, target_value, metric_to_target, ctl_days, atl_days)
+        if bracket is not None:
+            instrumentation.count("calibrator.table_hits")
         else:
-            upper_bound_tsb = mid_tsb
-            
-    return (upper_bound_tsb + lower_bound_tsb) / 2
+            instrumentation.count("calibrator.brent_searches")
+            bracket = _scan_for_bracket(recorded_error, _range_scan_points(ctl_days, atl_days))
+        if bracket is None:
+            bracket = expand_bracket(recorded_error, *DEFAULT_TSB_RANGE,
+                                     limit_lower=-TSB_SEARCH_LIMIT, limit_upper=TSB_SEARCH_LIMIT)
+        if bracket is None:
+            # The closest point may sit on a narrow clamp peak between two scan points
+            closest = min(evaluated, key=lambda tsb: abs(evaluated[tsb]))
+            bracket = _refine_towards_root(recorded_error, closest, evaluated[closest], tolerance)
+        if bracket is None:
+            instrumentation.event("calibrator.target_unreachable", metric=metric_to_target,
+                                  target=target_value, ctl_days=ctl_days, atl_days=atl_days)
+            return min(evaluated, key=lambda tsb: abs(evaluated[tsb])), False
+
+        lower_bound_tsb, upper_bound_tsb, error_lower, error_upper = bracket
+        return brentq(metric_error, lower_bound_tsb, upper_bound_tsb, xtol=tolerance,
+                      f_lower=error_lower, f_upper=error_upper), True
+    finally:
+        instrumentation.cache_stats("calibrator.simulate", _simulate_and_get_metrics, cache_before)
+
+def _table_bracket(f, target_value, metric_to_target, ctl_days, atl_days, start_ctl=60.0):
+    """
+    The calibration table's grid segment holding the target, as a
+    (lower, upper, f_lower, f_upper) bracket of the live metric error f.
+    None without a table built for start_ctl and this pair, or when f does
+    not change sign over the segment (interpolation is only approximate
+    where the clamp binds).
+    """
+    table = load_default_table(start_ctl)
+    tsb = table and table.tsb_for_metric(target_value, _metric_index(metric_to_target), ctl_days, atl_days)
+    if tsb is None:
+        return None
+    lower = table.tsb_min + math.floor((tsb - table.tsb_min) / table.tsb_step) * table.tsb_step
+    lower = min(lower, table.tsb_max - table.tsb_step)
+    return _scan_for_bracket(f, [lower, lower + table.tsb_step])
+
+def _full_rest_tsb(ctl_days, atl_days, start_ctl=60.0):
+    """TSB past which the clamp holds TSS at 0 from the first day, so the metrics stop changing."""
+    if abs((1/ctl_days) - (1/atl_days)) > 1e-9:
+        return start_ctl * (1 - atl_days / ctl_days)
+    return start_ctl
+
+def _range_scan_points(ctl_days, atl_days, tsb_range=DEFAULT_TSB_RANGE):
+    """
+    TSBs at which to look for a sign change over tsb_range, extended to take
+    in the whole clamped stretch: the ends of each stretch where the TSS
+    clamp stays inactive (the metrics are affine, so monotone, there) and
+    every whole TSB point where it binds.
+    """
+    full_rest = _full_rest_tsb(ctl_days, atl_days)
+    lower = max(-TSB_SEARCH_LIMIT, min(tsb_range[0], math.floor(full_rest)))
+    upper = min(TSB_SEARCH_LIMIT, max(tsb_range[1], math.ceil(full_rest)))
+    grid = [lower + step for step in range(int(upper - lower) + 1)]
+    clamped = [_analytic_metrics(tsb, ctl_days, atl_days) is None for tsb in grid]
+    last = len(grid) - 1
+    return [tsb for i, tsb in enumerate(grid)
+            if clamped[i] or i in (0, last) or clamped[i - 1] or clamped[min(i + 1, last)]]
+
+def _scan_for_bracket(f, points):
+    """
+    Evaluates f at the given increasing points and returns the first
+    (lower, upper, f_lower, f_upper) interval over which it changes sign,
+    or None.
+    """
+    f_previous = f(points[0])
+    for previous, point in zip(points, points[1:]):
+        f_point = f(point)
+        if (f_previous > 0) != (f_point > 0) or f_previous == 0 or f_point == 0:
+            return previous, point, f_previous, f_point
+        f_previous = f_point
+    return None
+
+def _refine_towards_root(f, center, f_center, tolerance, half_width=1.0):
+    """
+    Golden-section search for the point nearest a root within half_width of
+    center, for an f that peaks (or dips) short of the root there. Returns a
+    sign-change bracket as soon as one turns up, or None.
+    """
+    sign = 1 if f_center > 0 else -1
+    lower, upper = center - half_width, center + half_width
+    ratio = (math.sqrt(5) - 1) / 2
+    left, right = upper - ratio * (upper - lower), lower + ratio * (upper - lower)
+    f_left, f_right = f(left), f(right)
+    while upper - lower > tolerance:
+        for point, f_point in ((left, f_left), (right, f_right)):
+            if f_point == 0 or (f_point > 0) != (f_center > 0):
+                return (min(center, point), max(center, point)) + \
+                    ((f_center, f_point) if center < point else (f_point, f_center))
+        if sign * f_left < sign * f_right:
+            upper, right, f_right = right, left, f_left
+            left = upper - ratio * (upper - lower)
+            f_left = f(left)
+        else:
+            lower, left, f_left = left, right, f_right
+            right = lower + ratio * (upper - lower)
+            f_right = f(right)
+    return None
+
+def _solve_affine_metric(target_value, metric_to_target, ctl_days, atl_days):
+    """Direct solve of the unclamped, affine metric; None if the clamp gets in the way."""
+    samples = [(tsb, _analytic_metrics(tsb, ctl_days, atl_days)) for tsb in (-10.0, 0.0)]
+    if any(metrics is None for _, metrics in samples):
+        return None
+    (tsb_a, metrics_a), (tsb_b, metrics_b) = samples
+    value_a = _metric_value(metrics_a, metric_to_target)
+    value_b = _metric_value(metrics_b, metric_to_target)
+    if value_a == value_b:
+        return None
+
+    tsb = tsb_a + (target_value - value_a) * (tsb_b - tsb_a) / (value_b - value_a)
+    if _analytic_metrics(tsb, ctl_days, atl_days) is None:
+        return None
+    return tsb
+
+def _simulate_metrics_batch(tsb_targets, ctl_days, atl_days, start_ctl=60.0):
+    """
+    NumPy version of _simulate_and_get_metrics over arrays of TSBs and model
+    constants (broadcast against each other). Every scenario is advanced one
+    day per step, so a whole cohort costs one 84-day simulation.
+
+    Returns:
+        (avg_weekly_tss_total, avg_ctl_ramp_rate, avg_weekly_tss_change) arrays.
+    """
+    tsb_targets, c, a, ctl_current = np.broadcast_arrays(
+        np.asarray(tsb_targets, dtype=float), np.asarray(ctl_days, dtype=float),
+        np.asarray(atl_days, dtype=float), np.asarray(start_ctl, dtype=float))
+    ctl_current = ctl_current.copy()
+    atl_current = ctl_current - tsb_targets
+
+    kc = (c - 1) / c
+    ka = (a - 1) / a
+    tsb_tss_multiplier = (1/c) - (1/a)
+    use_tsb_goal = np.abs(tsb_tss_multiplier) > 1e-9
+    safe_multiplier = np.where(use_tsb_goal, tsb_tss_multiplier, 1.0)
+
+    weekly_tss_totals = np.zeros((NUM_WEEKS_SIMULATED,) + ctl_current.shape)
+    # CTL at the start of the block and at the end of every week
+    week_end_ctl = np.empty((NUM_WEEKS_SIMULATED + 1,) + ctl_current.shape)
+    week_end_ctl[0] = ctl_current
+
+    for day in range(1, NUM_WEEKS_SIMULATED * 7 + 1):
+        numerator = tsb_targets - (ctl_current * kc) + (atl_current * ka)
+        tss_needed = np.where(use_tsb_goal, numerator / safe_multiplier, atl_current)
+        tss_needed = np.maximum(0, tss_needed)
+
+        atl_current = (atl_current * ka) + (tss_needed * (1/a))
+        ctl_current = (ctl_current * kc) + (tss_needed * (1/c))
+        weekly_tss_totals[(day - 1) // 7] += tss_needed
+        if day % 7 == 0:
+            week_end_ctl[day // 7] = ctl_current
+
+    first, last = STABLE_PERIOD_START_WEEK, STABLE_PERIOD_END_WEEK
+    avg_ctl_ramp_rate = (week_end_ctl[first:last + 1] - week_end_ctl[first - 1:last]).mean(axis=0)
+    avg_weekly_tss_total = weekly_tss_totals[first - 1:last].mean(axis=0)
+    avg_weekly_tss_change = np.diff(weekly_tss_totals[first - 1:last], axis=0).mean(axis=0)
+    return avg_weekly_tss_total, avg_ctl_ramp_rate, avg_weekly_tss_change
+
+def _clamp_binds_batch(tsb_targets, ctl_days, atl_days, start_ctl=60.0):
+    """Vectorized test of whether the TSS clamp binds in the block (where _analytic_metrics gives up)."""
+    c, a = ctl_days, atl_days
+    tsb_tss_multiplier = (1/c) - (1/a)
+    use_multiplier = np.abs(tsb_tss_multiplier) > 1e-9
+    safe_multiplier = np.where(use_multiplier, tsb_tss_multiplier, 1.0)
+    first_tss = start_ctl + tsb_targets / (a * safe_multiplier)
+    last_tss = first_tss + (NUM_WEEKS_SIMULATED * 7 - 1) * tsb_targets / (a * c * safe_multiplier)
+    return np.where(use_multiplier, np.minimum(first_tss, last_tss) < 0, start_ctl - tsb_targets < 0)
+
+def find_tsb_for_metrics(target_values, metrics_to_target, ctl_days, atl_days, tolerance=1e-3,
+                         start_ctl=60.0, metric_tolerance=1e-6):
+    """
+    Cohort version of _find_tsb_for_metric.
+
+    Targets, metric names ("CTL Ramp", "Weekly TSS Change" or total weekly
+    TSS) and model constants may be scalars or arrays and are broadcast
+    against each other. The searches run in lockstep: bracket expansion and
+    then bisection, each step one _simulate_metrics_batch call for every
+    scenario that is still unresolved, so a cohort costs about as many
+    vectorized passes as one athlete costs simulations. Bisection stops once
+    the bracket is narrower than `tolerance` TSB points and an end misses the
+    target by at most `metric_tolerance`. Like the scalar search, rows whose
+    default range does not straddle the target first scan the whole TSB
+    points of it where the clamp binds, rows still without a bracket get the
+    golden-section refine of _refine_towards_root around their closest
+    point, and targets no TSB reaches get the closest TSB evaluated.
+
+    Returns:
+        (tsb, avg_weekly_tss_total, avg_ctl_ramp_rate, avg_weekly_tss_change)
+        arrays, the metrics being those of the returned TSB.
+    """
+    if np is None:
+        raise ImportError("find_tsb_for_metrics requires NumPy.")
+
+    metric_indices = np.vectorize(_metric_index, otypes=[int])(np.asarray(metrics_to_target, dtype=object))
+    target_values, metric_indices, c, a, start_ctl = np.broadcast_arrays(
+        np.asarray(target_values, dtype=float), metric_indices, np.asarray(ctl_days, dtype=float),
+        np.asarray(atl_days, dtype=float), np.asarray(start_ctl, dtype=float))
+    shape = target_values.shape
+    target_values, metric_indices, c, a, start_ctl = (
+        x.ravel() for x in (target_values, metric_indices, c, a, start_ctl))
+
+    def metric_error(tsb, rows):
+        instrumentation.count("calibrator.batch_passes")
+        instrumentation.count("calibrator.batch_scenario_evaluations", rows.size)
+        metrics = np.stack(_simulate_metrics_batch(tsb, c[rows], a[rows], start_ctl[rows]))
+        return np.take_along_axis(metrics, metric_indices[rows][None, :], axis=0)[0] - target_values[rows]
+
+    limit_lower, limit_upper = -TSB_SEARCH_LIMIT, TSB_SEARCH_LIMIT
+    every_row = np.arange(target_values.size)
+    lower = np.full(target_values.size, DEFAULT_TSB_RANGE[0])
+    upper = np.full(target_values.size, DEFAULT_TSB_RANGE[1])
+    error_lower = metric_error(lower, every_row)
+    error_upper = metric_error(upper, every_row)
+    # Closest TSB evaluated so far, for targets no TSB reaches
+    lower_is_best = np.abs(error_lower) <= np.abs(error_upper)
+    best_tsb = np.where(lower_is_best, lower, upper)
+    best_error = np.where(lower_is_best, error_lower, error_upper)
+
+    def bracketed():
+        return ((error_lower > 0) != (error_upper > 0)) | (error_lower == 0) | (error_upper == 0)
+
+    def keep_best(tsb, error, rows):
+        closer = np.abs(error) < np.abs(best_error[rows])
+        best_tsb[rows[closer]] = tsb[closer]
+        best_error[rows[closer]] = error[closer]
+
+    # --- Scan the clamped stretch where the default range's ends do not straddle the target ---
+    scanning = np.flatnonzero(~bracketed())
+    if scanning.size:
+        c_scan, a_scan = c[scanning], a[scanning]
+        full_rest = np.where(np.abs((1/c_scan) - (1/a_scan)) > 1e-9,
+                             start_ctl[scanning] * (1 - a_scan / c_scan), start_ctl[scanning])
+        grid = np.arange(max(limit_lower, min(DEFAULT_TSB_RANGE[0], np.floor(full_rest.min()))),
+                         min(limit_upper, max(DEFAULT_TSB_RANGE[1], np.ceil(full_rest.max()))) + 1)
+        clamped = _clamp_binds_batch(grid[:, None], c_scan, a_scan, start_ctl[scanning])
+        # Sign changes can only hide where the clamp binds (the metrics are affine elsewhere)
+        scan_points = clamped.copy()
+        scan_points[1:] |= clamped[:-1]
+        scan_points[:-1] |= clamped[1:]
+        scan_points[-1] = True
+        previous_tsb, previous_error = lower[scanning], error_lower[scanning]
+        found = np.zeros(scanning.size, dtype=bool)
+        for point, include in zip(grid[1:], scan_points[1:]):
+            local = np.flatnonzero(include & ~found)
+            if local.size == 0:
+                continue
+            rows = scanning[local]
+            error_point = metric_error(np.full(local.size, point), rows)
+            keep_best(np.full(local.size, point), error_point, rows)
+            change = ((previous_error[local] > 0) != (error_point > 0)) | (error_point == 0)
+            hit = local[change]
+            lower[scanning[hit]], error_lower[scanning[hit]] = previous_tsb[hit], previous_error[hit]
+            upper[scanning[hit]], error_upper[scanning[hit]] = point, error_point[change]
+            found[hit] = True
+            previous_tsb[local], previous_error[local] = point, error_point
+
+    # --- Widen the brackets that do not straddle the target yet ---
+    for _ in range(30):
+        can_lower, can_upper = lower > limit_lower, upper < limit_upper
+        rows = np.flatnonzero(~bracketed() & (can_lower | can_upper))
+        if rows.size == 0:
+            break
+        width = upper[rows] - lower[rows]
+        move_lower = can_lower[rows] & ((np.abs(error_lower[rows]) < np.abs(error_upper[rows])) | ~can_upper[rows])
+        new_point = np.where(move_lower, np.maximum(limit_lower, lower[rows] - width),
+                             np.minimum(limit_upper, upper[rows] + width))
+        new_error = metric_error(new_point, rows)
+        keep_best(new_point, new_error, rows)
+        lower[rows] = np.where(move_lower, new_point, lower[rows])
+        error_lower[rows] = np.where(move_lower, new_error, error_lower[rows])
+        upper[rows] = np.where(move_lower, upper[rows], new_point)
+        error_upper[rows] = np.where(move_lower, error_upper[rows], new_error)
+
+    # --- The closest point may sit on a narrow clamp peak between two scan points ---
+    refining = np.flatnonzero(~bracketed())
+    if refining.size:
+        _refine_towards_root_batch(metric_error, keep_best, refining, best_tsb[refining],
+                                   best_error[refining], tolerance, lower, upper, error_lower, error_upper)
+
+    has_bracket = bracketed()
+    unreachable = ~has_bracket
+    tsb = best_tsb.copy()
+
+    # --- Bisect the bracketed ones in lockstep ---
+    searching = has_bracket & (error_lower != 0) & (error_upper != 0)
+    tsb[has_bracket & (error_lower == 0)] = lower[has_bracket & (error_lower == 0)]
+    tsb[has_bracket & (error_upper == 0)] = upper[has_bracket & (error_upper == 0)]
+    while True:
+        width = upper - lower
+        missing = np.minimum(np.abs(error_lower), np.abs(error_upper)) > metric_tolerance
+        # Floating-point spacing bounds how far a steep metric can be narrowed
+        rows = np.flatnonzero(searching & ((width > tolerance)
+                                           | (missing & (width > 1e-12 * (1 + np.abs(lower))))))
+        if rows.size == 0:
+            break
+        instrumentation.count("calibrator.batch_bisection_steps")
+        middle = (lower[rows] + upper[rows]) / 2
+        error_middle = metric_error(middle, rows)
+        same_side_as_lower = (error_middle > 0) == (error_lower[rows] > 0)
+        lower[rows] = np.where(same_side_as_lower, middle, lower[rows])
+        error_lower[rows] = np.where(same_side_as_lower, error_middle, error_lower[rows])
+        upper[rows] = np.where(same_side_as_lower, upper[rows], middle)
+        error_upper[rows] = np.where(same_side_as_lower, error_upper[rows], error_middle)
+        exact = error_middle == 0
+        lower[rows[exact]] = upper[rows[exact]] = middle[exact]
+    tsb[searching] = np.where(np.abs(error_lower[searching]) <= np.abs(error_upper[searching]),
+                              lower[searching], upper[searching])
+    # The unreachable ones keep the closest TSB evaluated
+    instrumentation.count("calibrator.batch_unreachable", int(unreachable.sum()))
+
+    metrics = _simulate_metrics_batch(tsb, c, a, start_ctl)
+    return (tsb.reshape(shape),) + tuple(metric.reshape(shape) for metric in metrics)
+
+def _refine_towards_root_batch(metric_error, keep_best, rows, center, error_center, tolerance,
+                               lower, upper, error_lower, error_upper, half_width=1.0):
+    """
+    _refine_towards_root for many rows in lockstep. Rows whose search turns
+    up a sign change get that bracket written into lower/upper/error_lower/
+    error_upper; every point evaluated goes through keep_best.
+    """
+    ratio = (math.sqrt(5) - 1) / 2
+    sign = np.where(error_center > 0, 1.0, -1.0)
+    low, high = center - half_width, center + half_width
+    left, right = high - ratio * (high - low), low + ratio * (high - low)
+    error_left, error_right = metric_error(left, rows), metric_error(right, rows)
+    keep_best(left, error_left, rows)
+    keep_best(right, error_right, rows)
+    active = np.ones(rows.size, dtype=bool)
+    while True:
+        for point, error_point in ((left, error_left), (right, error_right)):
+            found = active & ((error_point == 0) | ((error_point > 0) != (error_center > 0)))
+            point_above = point > center
+            target = rows[found]
+            lower[target] = np.where(point_above, center, point)[found]
+            upper[target] = np.where(point_above, point, center)[found]
+            error_lower[target] = np.where(point_above, error_center, error_point)[found]
+            error_upper[target] = np.where(point_above, error_point, error_center)[found]
+            active &= ~found
+        active &= high - low > tolerance
+        local = np.flatnonzero(active)
+        if local.size == 0:
+            return
+        # Keep the side closer to the root, as in the scalar search
+        shrink_high = sign[local] * error_left[local] < sign[local] * error_right[local]
+        new_low = np.where(shrink_high, low[local], left[local])
+        new_high = np.where(shrink_high, right[local], high[local])
+        new_point = np.where(shrink_high, new_high - ratio * (new_high - new_low),
+                             new_low + ratio * (new_high - new_low))
+        error_new = metric_error(new_point, rows[local])
+        keep_best(new_point, error_new, rows[local])
+        low[local], high[local] = new_low, new_high
+        left[local], error_left[local], right[local], error_right[local] = (
+            np.where(shrink_high, new_point, right[local]),
+            np.where(shrink_high, error_new, error_right[local]),
+            np.where(shrink_high, left[local], new_point),
+            np.where(shrink_high, error_left[local], error_new),
+        )
+
+def calibrate(metric_name, value, ctl_days, atl_days):
+    """
+    Translates one metric ("TSB", "CTL Ramp" or "Weekly TSS Change") into
+    the equivalent constant TSB and the calibration metrics it produces.
+
+    Returns:
+        A Calibration. reachable is False when no TSB produces the value;
+        the other fields then belong to the closest TSB found.
+    """
+    if metric_name == "TSB":
+        tsb, reachable = value, True
+    else:
+        tsb, reachable = _find_tsb_for_metric(value, metric_name, ctl_days, atl_days)
+
+    return Calibration(tsb, *_get_metrics(tsb, ctl_days, atl_days), reachable)
 
 def run_calibrator():
     """Runs one cycle of the calibration calculation."""
@@ -138,17 +601,14 @@ def run_calibrator():
         print("\nERROR: Please provide a value for exactly ONE of the three metrics.")
         return
 
-    # --- Calculations ---
-    final_tsb = 0
     input_metric_name, input_metric_value = list(provided_values.items())[0]
+    if input_metric_name != "TSB":
+        print(f"\nSearching for TSB value that produces a target {input_metric_name} of {input_metric_value:.1f}...")
+    result = calibrate(input_metric_name, input_metric_value, ctl_period_input, atl_period_input)
+    final_tsb, final_ctl_ramp, final_tss_change = result.tsb, result.avg_ctl_ramp_rate, result.avg_weekly_tss_change
+    if not result.reachable:
+        print("Target is outside the range this model can produce; using the closest TSB found.")
 
-    if input_metric_name == "TSB":
-        final_tsb = input_metric_value
-    else:
-        final_tsb = _find_tsb_for_metric(input_metric_value, input_metric_name, ctl_period_input, atl_period_input)
-    
-    final_weekly_tss_total, final_ctl_ramp, final_tss_change = _simulate_and_get_metrics(final_tsb, ctl_period_input, atl_period_input)
-    
     print("\n--- Calibration Complete ---")
     print(f"For a {ctl_period_input}/{atl_period_input} day model, the following values are equivalent:")
     print("\n")
@@ -0,0 +1,198 @@
+# filename: taper_planner.py
+
+"""
+Optimal build-and-taper plan for a target date.
+
+Finds the daily TSS sequence that maximizes Shape (2*CTL - ATL), or TSB at
+a CTL floor, at the end of the last day, subject to per-day TSS caps, the
+ALB lower bound (TSS <= yesterday's ATL - bound) and a maximum ramp rate
+(CTL may rise by at most rate/7 per day, as in fitness.py's ramp_rate mode).
+
+The final Shape/TSB is linear in each day's TSS, with a weight of
+alpha/c * kc**k - 1/a * ka**k for the day k days before the target date
+(alpha = 2 for Shape, 1 for TSB). That weight changes sign once: days far
+enough out gain from load and the last few days only add fatigue. All the
+constraints are upper bounds that can only loosen when earlier days carry
+more load, so training at the largest feasible TSS every day of the build
+and resting through the taper is exactly optimal; the taper length follows
+from the weights alone. A CTL floor adds a Lagrange multiplier to alpha,
+which can only shorten the taper: the plan keeps the longest taper that
+still ends at or above the floor, and trains partially on the day before it
+so CTL lands on the floor exactly. Everything is one forward pass over the
+horizon, so even 24-week plans take well under a millisecond.
+"""
+
+import argparse
+import datetime
+import math
+from collections import namedtuple
+
+from fitness import weekly_summary
+from load_engine import DEFAULT_ATL_DAYS, DEFAULT_CTL_DAYS
+
+OBJECTIVE_WEIGHTS = {'shape': 2.0, 'tsb': 1.0}
+
+TaperPlan = namedtuple('TaperPlan', [
+    'tss', 'ctl', 'atl', 'taper_days', 'ctl_final', 'atl_final', 'tsb_final', 'shape_final', 'floor_met'
+])
+
+def taper_length(days, ctl_days, atl_days, alpha):
+    """Number of final days whose TSS lowers alpha*CTL - ATL on the target date."""
+    kc = (ctl_days - 1) / ctl_days
+    ka = (atl_days - 1) / atl_days
+    count = 0
+    while count < days and alpha / ctl_days * kc ** count <= ka ** count / atl_days:
+        count += 1
+    return count
+
+def plan_taper(ctl_initial, atl_initial, days, ctl_days=DEFAULT_CTL_DAYS, atl_days=DEFAULT_ATL_DAYS,
+               objective='shape', ctl_floor=None, tss_caps=None, alb_lower_bound=None, max_ramp_rate=None):
+    """
+    Plans `days` days of training ending on the target date.
+
+    Args:
+        objective: 'shape' to maximize 2*CTL - ATL, or 'tsb' to maximize TSB.
+        ctl_floor: Lowest acceptable CTL on the target date (optional).
+        tss_caps: Maximum TSS per day, either one number or one per day
+            (None for no cap; 0 marks a rest day).
+        alb_lower_bound: Each day's ALB (yesterday's ATL - TSS) stays at or
+            above this bound.
+        max_ramp_rate: Largest CTL gain per week, enforced day by day.
+
+    Returns:
+        A TaperPlan: daily TSS, CTL/ATL histories (starting with the initial
+        load), the number of rest days at the end and the final values.
+        floor_met is False when no plan reaches ctl_floor; the plan then
+        builds as much CTL as the constraints allow.
+    """
+    if objective not in OBJECTIVE_WEIGHTS:
+        raise ValueError(f"Unknown objective: {objective!r}")
+    if days < 1:
+        raise ValueError("The plan needs at least one day")
+    if ctl_days < 2 or atl_days < 2:
+        raise ValueError("CTL and ATL periods must be at least 2 days")
+    if tss_caps is None or isinstance(tss_caps, (int, float)):
+        caps = [math.inf if tss_caps is None else float(tss_caps)] * days
+    else:
+        caps = [float(cap) for cap in tss_caps]
+        if len(caps) != days:
+            raise ValueError(f"tss_caps must have one entry per day ({days})")
+
+    c, a = ctl_days, atl_days
+    kc = (c - 1) / c
+    ka = (a - 1) / a
+    ramp_tss_offset = None if max_ramp_rate is None else (max_ramp_rate / 7) * c
+    taper_days = taper_length(days, c, a, OBJECTIVE_WEIGHTS[objective])
+
+    # --- The largest feasible TSS of every day, given maximal training before it ---
+    greedy_tss = []
+    greedy_ctl = [float(ctl_initial)]
+    greedy_atl = [float(atl_initial)]
+    for day in range(days):
+        limit = caps[day]
+        if alb_lower_bound is not None:
+            limit = min(limit, greedy_atl[-1] - alb_lower_bound)
+        if ramp_tss_offset is not None:
+            limit = min(limit, greedy_ctl[-1] + ramp_tss_offset)
+        if limit == math.inf:
+            # Fine inside the taper, where nothing is trained anyway
+            break
+        limit = max(0.0, limit)
+        greedy_tss.append(limit)
+        greedy_ctl.append((greedy_ctl[-1] * kc) + (limit * (1 / c)))
+        greedy_atl.append((greedy_atl[-1] * ka) + (limit * (1 / a)))
+
+    def final_ctl(rest_days):
+        if days - rest_days > len(greedy_tss):
+            raise ValueError("Unbounded plan: give TSS caps, an ALB lower bound or a maximum ramp rate.")
+        return greedy_ctl[days - rest_days] * kc ** rest_days
+
+    # --- A CTL floor shortens the taper to the longest one that still meets it ---
+    final_ctl(taper_days)  # raises if the build itself is unbounded
+    floor_met = True
+    boundary_tss = None
+    if ctl_floor is not None and final_ctl(taper_days) < ctl_floor:
+        while taper_days > 0 and final_ctl(taper_days) < ctl_floor:
+            taper_days -= 1
+        if final_ctl(taper_days) < ctl_floor:
+            floor_met = False
+        else:
+            # One more rest day misses the floor: train just enough on that day to land on it
+            boundary_day = days - taper_days - 1
+            boundary_tss = c * ((ctl_floor / kc ** taper_days) - (greedy_ctl[boundary_day] * kc))
+            boundary_tss = min(max(boundary_tss, 0.0), greedy_tss[boundary_day])
+
+    build_days = days - taper_days
+    tss = greedy_tss[:build_days] + [0.0] * taper_days
+    if boundary_tss is not None:
+        tss[build_days - 1] = boundary_tss
+
+    ctl_history = [float(ctl_initial)]
+    atl_history = [float(atl_initial)]
+    for tss_value in tss:
+        ctl_history.append((ctl_history[-1] * kc) + (tss_value * (1 / c)))
+        atl_history.append((atl_history[-1] * ka) + (tss_value * (1 / a)))
+    ctl_final, atl_final = ctl_history[-1], atl_history[-1]
+    return TaperPlan(tss, ctl_history, atl_history, taper_days, ctl_final, atl_final,
+                     ctl_final - atl_final, (2 * ctl_final) - atl_final, floor_met)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Daily TSS plan that peaks Shape (or TSB at a CTL floor) on a target date."
+    )
+    parser.add_argument("--ctl-initial", type=float, required=True)
+    parser.add_argument("--atl-initial", type=float, required=True)
+    horizon = parser.add_mutually_exclusive_group(required=True)
+    horizon.add_argument("--days", type=int, help="Days until (and including) the target date.")
+    horizon.add_argument("--target-date", type=datetime.date.fromisoformat,
+                         help="Target date (YYYY-MM-DD); the plan starts tomorrow.")
+    parser.add_argument("--ctl-days", type=int, default=DEFAULT_CTL_DAYS)
+    parser.add_argument("--atl-days", type=int, default=DEFAULT_ATL_DAYS)
+    parser.add_argument("--objective", choices=sorted(OBJECTIVE_WEIGHTS), default='shape')
+    parser.add_argument("--ctl-floor", type=float, help="Lowest acceptable CTL on the target date.")
+    parser.add_argument("--tss-cap", type=float, help="Maximum TSS on any day.")
+    parser.add_argument("--rest-weekday", type=int, action='append', default=[], choices=range(7),
+                        help="Weekday (0 = Monday) with no training; repeatable. Needs --target-date.")
+    parser.add_argument("--alb-lower-bound", type=float, help="Lowest allowed ALB (ATL - TSS).")
+    parser.add_argument("--max-ramp-rate", type=float, help="Largest CTL gain per week.")
+    args = parser.parse_args(argv)
+
+    if args.target_date is not None:
+        first_day = datetime.date.today() + datetime.timedelta(days=1)
+        days = (args.target_date - first_day).days + 1
+    else:
+        if args.rest_weekday:
+            parser.error("--rest-weekday needs --target-date.")
+        first_day, days = None, args.days
+    if days < 1:
+        parser.error("The target date must be after today.")
+    tss_caps = args.tss_cap
+    if args.rest_weekday:
+        tss_caps = [0.0 if (first_day + datetime.timedelta(days=day)).weekday() in args.rest_weekday
+                    else (math.inf if args.tss_cap is None else args.tss_cap) for day in range(days)]
+
+    try:
+        plan = plan_taper(args.ctl_initial, args.atl_initial, days, args.ctl_days, args.atl_days,
+                          objective=args.objective, ctl_floor=args.ctl_floor, tss_caps=tss_caps,
+                          alb_lower_bound=args.alb_lower_bound, max_ramp_rate=args.max_ramp_rate)
+    except ValueError as e:
+        parser.exit(1, f"Error: {e}\n")
+
+    print(f"{days}-day plan, {days - plan.taper_days} days of build and a {plan.taper_days}-day taper.")
+    print(f"Target date: CTL={plan.ctl_final:.1f}, ATL={plan.atl_final:.1f}, "
+          f"TSB={plan.tsb_final:.1f}, Shape={plan.shape_final:.1f}")
+    if not plan.floor_met:
+        print(f"CTL {args.ctl_floor:g} cannot be reached under these constraints; "
+              f"the plan builds as much CTL as it can.")
+    print()
+    print(f"{'Week':<5} | {'Days':<10} | {'Total TSS':<10} | {'End CTL':<10} | {'End ATL':<10} | {'End TSB':<10} | {'End Shape':<10} | {'Ramp Rate':<10}")
+    print("-" * 95)
+    for week in weekly_summary(plan.ctl, plan.atl, plan.tss, days):
+        day_range = f"{week['day_start']}-{week['day_end']}"
+        print(f"{week['week']:<5} | {day_range:<10} | {week['total_tss']:<10.0f} | "
+              f"{week['ctl']:<10.1f} | {week['atl']:<10.1f} | {week['tsb']:<10.1f} | "
+              f"{week['shape']:<10.1f} | {week['ramp_rate']:<+10.1f}")
+    print("-" * 95)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# filename: tests/test_progression_calibrator.py
+
+"""The cohort TSB solver must find every target the scalar solver finds."""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import progression_calibrator
+
+np = pytest.importorskip("numpy")
+
+METRICS = ("Total Weekly TSS", "CTL Ramp", "Weekly TSS Change")
+
+def _random_cases(count=400, seed=20240601):
+    rng = random.Random(seed)
+    # A CTL ramp target in a narrow clamp dip of the 20/19 model
+    cases = [(progression_calibrator._get_metrics(0.8205, 20, 19)[1], "CTL Ramp", 20, 19)]
+    for i in range(count):
+        ctl_days, atl_days = (20, 19) if i % 4 == 0 else (rng.randint(7, 90), rng.randint(2, 21))
+        metric = rng.randrange(len(METRICS))
+        value = progression_calibrator._get_metrics(rng.uniform(-60, 40), ctl_days, atl_days)[metric]
+        # Some targets are scaled off the curve, so a few have no exact answer
+        cases.append((value * rng.choice([1, 1, 1.05, 0.9]), METRICS[metric], ctl_days, atl_days))
+    return cases
+
+def test_batch_matches_scalar_solver():
+    cases = _random_cases()
+    targets, metrics, ctl_days, atl_days = (np.array(column) for column in zip(*cases))
+    batch = progression_calibrator.find_tsb_for_metrics(targets, metrics.astype(object), ctl_days, atl_days)
+
+    for i, (target, metric, c, a) in enumerate(cases):
+        index = METRICS.index(metric)
+        tsb, _ = progression_calibrator._find_tsb_for_metric(target, metric, c, a)
+        scalar_miss = abs(progression_calibrator._get_metrics(tsb, c, a)[index] - target)
+        batch_miss = abs(batch[1 + index][i] - target)
+        assert batch_miss <= max(scalar_miss, 1e-6) + 1e-3, (target, metric, c, a, tsb, batch[0][i])